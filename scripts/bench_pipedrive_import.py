@@ -0,0 +1,709 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+IMPORTER = Path(__file__).resolve().with_name("pipedrive_to_supabase.py")
+BENCH_DIR = Path(os.environ.get("PIPEDRIVE_BENCH_DIR", ROOT / ".pipedrive_bench"))
+
+# Rows per entity relative to the requested scale (the activities count).
+PROPORTIONS = {
+    "organizations": 0.1,
+    "people": 0.2,
+    "deals": 0.2,
+    "activities": 1.0,
+    "notes": 0.5,
+}
+
+HEADERS = {
+    "organizations": [
+        "ID",
+        "Nombre",
+        "Sub-sector",
+        "Ciudad/pueblo/población/localidad de Dirección",
+        "Propietario",
+        "Tipo de cliente",
+        "Relación",
+        "Potencial",
+        "Etiquetas",
+        "Dirección completa/combinada de Dirección",
+        "Estado/municipio de Dirección",
+        "País de Dirección",
+        "Código postal de Dirección",
+        "Calderas Instaladas",
+        "Quemadores instalados",
+        "Latitud de Dirección",
+        "Longitud de Dirección",
+        "Organización creada",
+        "Hora de actualización",
+    ],
+    "people": [
+        "ID",
+        "ID de la organización",
+        "Nombre",
+        "Cargo",
+        "Teléfono - Móvil",
+        "Teléfono - Trabajo",
+        "Correo electrónico - Trabajo",
+        "Correo electrónico - Personal",
+        "Área",
+        "Etiquetas",
+        "Persona creada",
+        "Hora de actualización",
+    ],
+    "deals": [
+        "ID",
+        "ID de la organización",
+        "ID de la persona de contacto",
+        "Título",
+        "Etapa",
+        "Estado",
+        "Valor",
+        "Moneda de Valor",
+        "Valor ponderado",
+        "Probabilidad",
+        "Embudo",
+        "Propietario",
+        "Origen de la fuente",
+        "Canal de la fuente",
+        "Motivo de la pérdida",
+        "Fecha prevista de cierre",
+        "Trato cerrado el",
+        "Último cambio de la etapa",
+        "Nombre del producto",
+        "Monto del producto",
+        "Cantidad de producto",
+        "Trato creado",
+        "Hora de actualización",
+    ],
+    "activities": [
+        "ID",
+        "ID de la organización",
+        "ID de la persona de contacto",
+        "ID del trato",
+        "Asunto",
+        "Tipo",
+        "Finalizada",
+        "Nota",
+        "Fecha de vencimiento",
+        "Hora de vencimiento",
+        "Hora en que se marcó como completada",
+        "Duración",
+        "Ubicación",
+        "Prioridad",
+        "Asignada al usuario",
+        "Descripción pública",
+        "Libre/ocupado",
+        "Hora de adición",
+        "Hora de actualización",
+    ],
+    "notes": [
+        "ID",
+        "ID de la organización",
+        "ID de la persona de contacto",
+        "ID del trato",
+        "Contenido",
+        "Usuario",
+        "La nota está anclada al trato",
+        "La nota está anclada a la organización",
+        "Hora de adición",
+        "Hora de actualización",
+    ],
+}
+
+OWNERS = ["María José Pérez", "Andrés Núñez", "Lucía Gómez", "Diego Íñiguez", "Carolina Salazar", "Jorge Andrade"]
+CITIES = ["Quito", "Guayaquil", "Cuenca", "Manta", "Ambato", "Loja", "Santo Domingo", "Machala"]
+PROVINCES = ["Pichincha", "Guayas", "Azuay", "Manabí", "Tungurahua", "Loja", "El Oro"]
+SECTORS = ["Petróleo y gas", "Alimentos", "Hospitales", "Hoteles", "Textil", "Minería", "Agroindustria"]
+TAGS = ["VIP", "Distribuidor", "Calderas", "Quemadores", "Mantenimiento", "Licitación"]
+STAGES = ["Prospección", "Calificado", "Propuesta enviada", "Negociación", "Cierre"]
+ACTIVITY_TYPES = ["Llamada", "Reunión", "Tarea", "Correo electrónico", "Visita técnica"]
+PRODUCTS = ["Caldera pirotubular 100 BHP", "Quemador dual gas/diésel", "Repuestos", "Servicio de mantenimiento"]
+WORDS = (
+    "revisión caldera quemador presión vapor mantenimiento cotización visita técnica cliente planta "
+    "combustible diésel gas instalación garantía repuesto válvula eficiencia consumo informe seguimiento"
+).split()
+
+
+def pick(rng, values, blank=0.0):
+    if blank and rng.random() < blank:
+        return None
+    return rng.choice(values)
+
+
+def moment(rng, start=datetime(2019, 1, 1), days=2400):
+    return start + timedelta(days=rng.randrange(days), seconds=rng.randrange(8 * 3600, 19 * 3600))
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def ref(rng, count, blank=0.2):
+    if rng.random() < blank:
+        return None
+    return rng.randint(1, max(1, count))
+
+
+def generate_rows(entity, counts, rng):
+    for external_id in range(1, counts[entity] + 1):
+        created = moment(rng)
+        updated = (created + timedelta(days=rng.randrange(400))).strftime("%Y-%m-%d %H:%M:%S")
+        created = created.strftime("%Y-%m-%d %H:%M:%S")
+        if entity == "organizations":
+            city = rng.choice(CITIES)
+            yield [
+                external_id,
+                f"{rng.choice(['Industrias', 'Hotel', 'Hospital', 'Comercial', 'Agrícola'])} {city} {external_id}",
+                pick(rng, SECTORS, 0.3),
+                city,
+                rng.choice(OWNERS),
+                pick(rng, ["Cliente final", "Distribuidor", "Integrador"], 0.4),
+                pick(rng, ["Activo", "Potencial", "Inactivo"], 0.3),
+                pick(rng, ["Alto", "Medio", "Bajo"], 0.5),
+                ", ".join(rng.sample(TAGS, rng.randint(0, 3))) or None,
+                f"Av. {rng.choice(['Amazonas', '10 de Agosto', 'de las Américas'])} N{rng.randint(1, 99)}-{rng.randint(1, 300)}, {city}",
+                rng.choice(PROVINCES),
+                "Ecuador",
+                pick(rng, [f"{rng.randint(10, 24)}0{rng.randint(100, 999)}"], 0.6),
+                pick(rng, ["1", "2", "3", "Ninguna"], 0.6),
+                pick(rng, ["1", "2", "4"], 0.7),
+                round(rng.uniform(-4.5, 1.5), 6),
+                round(rng.uniform(-81.0, -75.5), 6),
+                created,
+                updated,
+            ]
+        elif entity == "people":
+            first, last = rng.choice(OWNERS).split(" ", 1)
+            yield [
+                external_id,
+                ref(rng, counts["organizations"], 0.1),
+                f"{first} {last} {external_id}",
+                pick(rng, ["Gerente de planta", "Jefe de mantenimiento", "Compras", "Gerente general"], 0.3),
+                pick(rng, [f"09{rng.randint(10000000, 99999999)}"], 0.3),
+                pick(rng, [f"02 {rng.randint(2000000, 3999999)}"], 0.6),
+                f"contacto{external_id}@{rng.choice(['empresa', 'planta', 'grupo'])}.com.ec",
+                pick(rng, [f"persona{external_id}@gmail.com"], 0.8),
+                pick(rng, ["Producción", "Mantenimiento", "Compras", "Gerencia"], 0.5),
+                ", ".join(rng.sample(TAGS, rng.randint(0, 2))) or None,
+                created,
+                updated,
+            ]
+        elif entity == "deals":
+            value = round(rng.uniform(500, 250000), 2)
+            probability = rng.choice([10, 25, 50, 75, 90])
+            status = rng.choice(["Abierto", "Ganado", "Perdido"])
+            yield [
+                external_id,
+                ref(rng, counts["organizations"], 0.3),
+                ref(rng, counts["people"], 0.2),
+                f"{rng.choice(PRODUCTS)} - {external_id}",
+                rng.choice(STAGES),
+                status,
+                value,
+                "USD",
+                round(value * probability / 100, 2),
+                probability,
+                rng.choice(["Ventas", "Servicio técnico"]),
+                rng.choice(OWNERS),
+                pick(rng, ["Referido", "Web", "Feria", "Llamada en frío"], 0.4),
+                pick(rng, ["Orgánico", "Campaña", "Distribuidor"], 0.6),
+                rng.choice(["Precio", "Tiempo de entrega", "Competencia"]) if status == "Perdido" else None,
+                moment(rng).strftime("%Y-%m-%d"),
+                moment(rng).strftime("%Y-%m-%d") if status != "Abierto" else None,
+                updated,
+                pick(rng, PRODUCTS, 0.5),
+                pick(rng, [round(rng.uniform(100, 50000), 2)], 0.5),
+                pick(rng, [rng.randint(1, 10)], 0.5),
+                created,
+                updated,
+            ]
+        elif entity == "activities":
+            done = rng.random() < 0.6
+            due = moment(rng)
+            yield [
+                external_id,
+                ref(rng, counts["organizations"], 0.5),
+                ref(rng, counts["people"], 0.4),
+                ref(rng, counts["deals"], 0.3),
+                pick(rng, [sentence(rng, 4)], 0.1),
+                rng.choice(ACTIVITY_TYPES),
+                "Sí" if done else "No",
+                pick(rng, [f"<p>{sentence(rng, 25)} &amp; {sentence(rng, 10)}</p>"], 0.5),
+                due.strftime("%Y-%m-%d"),
+                pick(rng, [due.strftime("%H:%M")], 0.3),
+                (due + timedelta(hours=rng.randint(1, 72))).strftime("%Y-%m-%d %H:%M:%S") if done else None,
+                pick(rng, ["00:15", "00:30", "01:00", "02:00"], 0.4),
+                pick(rng, [f"Planta {rng.choice(CITIES)}"], 0.7),
+                pick(rng, ["Alta", "Media", "Baja"], 0.6),
+                rng.choice(OWNERS),
+                pick(rng, [sentence(rng, 8)], 0.8),
+                pick(rng, ["Libre", "Ocupado"], 0.5),
+                created,
+                updated,
+            ]
+        else:
+            yield [
+                external_id,
+                ref(rng, counts["organizations"], 0.4),
+                ref(rng, counts["people"], 0.5),
+                ref(rng, counts["deals"], 0.4),
+                f"<div>{sentence(rng, rng.randint(20, 120))}<br>{sentence(rng, 15)} &nbsp;&amp;</div>",
+                rng.choice(OWNERS),
+                pick(rng, ["Sí", "No"]),
+                pick(rng, ["Sí", "No"], 0.5),
+                created,
+                updated,
+            ]
+
+
+def write_export(path, header, rows):
+    tmp_path = path.with_name(path.name + ".tmp")
+    if path.suffix == ".csv":
+        with tmp_path.open("w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(header)
+            writer.writerows(rows)
+    else:
+        from openpyxl import Workbook
+
+        book = Workbook(write_only=True)
+        sheet = book.create_sheet()
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+        book.save(tmp_path)
+    tmp_path.replace(path)
+
+
+def ensure_exports(scale, fmt="xlsx", seed=0):
+    # Generated exports are deterministic for (scale, format, seed) and are
+    # kept between runs so every commit is measured on the same files.
+    data_dir = BENCH_DIR / "data" / f"{fmt}-{scale}-{seed}"
+    counts = {entity: max(1, int(scale * share)) for entity, share in PROPORTIONS.items()}
+    for entity in HEADERS:
+        path = data_dir / f"{entity}-bench.{fmt}"
+        if path.exists():
+            continue
+        data_dir.mkdir(parents=True, exist_ok=True)
+        print(f"Generando {path.name} ({counts[entity]} filas)...")
+        rng = random.Random(f"{seed}-{entity}")
+        write_export(path, HEADERS[entity], generate_rows(entity, counts, rng))
+    return data_dir, counts
+
+
+class FakePostgrest(ThreadingHTTPServer):
+    """In-process stand-in for Supabase's /rest/v1/ endpoint.
+
+    Only the generated uuid, the conflict key and deleted_at of each row are
+    kept, which is enough to honour on_conflict with
+    resolution=merge-duplicates, ?columns=, the id lookups the importer makes
+    and the PATCH requests of --reconcile. stats also counts the TCP
+    connections opened and the peak number of requests answered at once.
+    Statuses queued in failures answer the next POSTs instead, and a POST of
+    more than max_rows rows is answered 413. With record=True the last
+    payload stored for each row is kept in rows, for parity checks.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, accept_gzip=True, record=False):
+        super().__init__(("127.0.0.1", 0), PostgrestHandler)
+        self.latency = latency
+        # PostgREST itself does not decode gzip bodies; a proxy in front may.
+        self.accept_gzip = accept_gzip
+        self.record = record
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self):
+        self.tables = defaultdict(dict)
+        self.rows = defaultdict(dict)
+        self.stats = Counter()
+        self.in_flight = 0
+        self.failures = deque()
+        self.max_rows = None
+
+    def process_request(self, request, client_address):
+        # One per TCP connection, so keep-alive reuse shows up as few connections.
+        with self.lock:
+            self.stats["connections"] += 1
+        super().process_request(request, client_address)
+
+    def serve_latency(self):
+        with self.lock:
+            self.in_flight += 1
+            self.stats["peak in flight"] = max(self.stats["peak in flight"], self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def failure(self, rows):
+        # (status, headers) to answer a POST with, or None to store it.
+        with self.lock:
+            if self.failures:
+                return self.failures.popleft()
+        if self.max_rows is not None and len(rows) > self.max_rows:
+            return 413, {}
+        return None
+
+    def upsert(self, table, rows, conflict, merge):
+        keys = [str(row.get(conflict)) for row in rows]
+        if len(set(keys)) != len(keys):
+            # What Postgres reports for ON CONFLICT DO UPDATE hitting a row twice.
+            return 500, {"code": "21000", "message": "ON CONFLICT DO UPDATE command cannot affect row a second time"}
+        with self.lock:
+            stored = self.tables[table]
+            if not merge and any(key in stored for key in keys):
+                return 409, {"code": "23505", "message": "duplicate key value violates unique constraint"}
+            out = []
+            for key, row in zip(keys, rows):
+                if key in stored:
+                    self.stats[f"{table} updated"] += 1
+                else:
+                    stored[key] = {"id": str(uuid.uuid4()), conflict: row.get(conflict), "deleted_at": None}
+                    self.stats[f"{table} inserted"] += 1
+                if self.record:
+                    self.rows[table][key] = dict(row)
+                out.append(dict(row, **stored[key]))
+        return 201, out
+
+    def update(self, table, filters, values):
+        with self.lock:
+            rows = matching(self.tables[table].values(), filters)
+            for row in rows:
+                row.update((column, value) for column, value in values.items() if column in row)
+            self.stats[f"{table} patched"] += len(rows)
+        return [dict(row) for row in rows]
+
+    def select(self, table, filters, order=None, limit=None, offset=0):
+        with self.lock:
+            rows = [dict(row) for row in matching(self.tables[table].values(), filters)]
+        if order:
+            rows.sort(key=lambda row: row.get(order))
+        rows = rows[offset:]
+        return rows[:limit] if limit is not None else rows
+
+
+def matches(row, column, op, value):
+    if op == "not":
+        return not matches(row, column, *value.split(".", 1))
+    if op == "is":
+        return row.get(column) is None if value == "null" else str(row.get(column)).lower() == value
+    if op == "in":
+        return str(row.get(column)) in {item.strip().strip('"') for item in value.strip("()").split(",")}
+    if op == "eq":
+        return str(row.get(column)) == value
+    if op == "gt":
+        # ids are uuid text, compared as text like the importer's keyset pages.
+        return row.get(column) is not None and str(row[column]) > value
+    raise ValueError(f"filtro no soportado: {op}")
+
+
+def matching(rows, filters):
+    return [row for row in rows if all(matches(row, column, op, value) for column, (op, value) in filters.items())]
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _target(self):
+        parts = urlsplit(self.path)
+        table = parts.path.rsplit("/", 1)[-1]
+        return table, {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+    def _send(self, status, payload=None, select=None, headers=()):
+        if isinstance(payload, list) and select and select != "*":
+            columns = select.split(",")
+            payload = [{column: row.get(column) for column in columns} for row in payload]
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.stats["bytes_received"] += len(raw)
+        if self.headers.get("Content-Encoding") == "gzip":
+            if not self.server.accept_gzip:
+                return None
+            raw = gzip.decompress(raw)
+        return json.loads(raw or b"null")
+
+    def do_POST(self):
+        table, params = self._target()
+        rows = self._body()
+        if rows is None:
+            self.server.stats["POST rejected"] += 1
+            self._send(400, {"code": "PGRST102", "details": None, "hint": None, "message": "Empty or invalid json"})
+            return
+        rows = rows if isinstance(rows, list) else [rows]
+        if "columns" in params:
+            # PostgREST only inserts the listed keys and sets missing ones to NULL.
+            columns = params["columns"].split(",")
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        prefer = self.headers.get("Prefer", "")
+        self.server.serve_latency()
+        failure = self.server.failure(rows)
+        if failure:
+            status, headers = failure
+            self.server.stats[f"POST {status}"] += 1
+            self._send(status, {"code": "PGRST000", "message": "respuesta simulada"}, headers=headers.items())
+            return
+        self.server.stats["POST"] += 1
+        status, payload = self.server.upsert(
+            table, rows, params.get("on_conflict", "id"), "resolution=merge-duplicates" in prefer
+        )
+        if status >= 400 or "return=representation" in prefer:
+            self._send(status, payload, params.get("select"))
+        else:
+            self._send(status)
+
+    def _filters(self, params):
+        reserved = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+        return {key: tuple(value.split(".", 1)) for key, value in params.items() if key not in reserved}
+
+    def do_PATCH(self):
+        table, params = self._target()
+        values = self._body()
+        self.server.serve_latency()
+        self.server.stats["PATCH"] += 1
+        rows = self.server.update(table, self._filters(params), values)
+        if "return=representation" in self.headers.get("Prefer", ""):
+            self._send(200, rows, params.get("select"))
+        else:
+            self._send(204)
+
+    def do_GET(self):
+        table, params = self._target()
+        self.server.serve_latency()
+        self.server.stats["GET"] += 1
+        filters = self._filters(params)
+        rows = self.server.select(
+            table,
+            filters,
+            order=params.get("order", "").split(".")[0] or None,
+            limit=int(params["limit"]) if "limit" in params else None,
+            offset=int(params.get("offset", 0)),
+        )
+        self._send(200, rows, params.get("select", "*"))
+
+
+def git_label():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        # The shim and the package it runs; a change in either moves the numbers.
+        paths = [str(path.relative_to(ROOT)) for path in (IMPORTER, IMPORTER.with_name("pipedrive_import"))]
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--", *paths],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "local"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run_import(server, data_dir, work_dir, extra_args=()):
+    env = dict(
+        os.environ,
+        SUPABASE_URL=server.url,
+        SUPABASE_SERVICE_ROLE_KEY="bench",
+        PIPEDRIVE_INPUT_DIR=str(data_dir),
+        PIPEDRIVE_CACHE_DIR=str(work_dir / "cache"),
+        PIPEDRIVE_STATE=str(work_dir / "state.json"),
+        PIPEDRIVE_DEAD_LETTER=str(work_dir / "dead_letter.jsonl"),
+        PIPEDRIVE_REJECTS=str(work_dir / "rejects.jsonl"),
+        PIPEDRIVE_REPORT=str(work_dir / "report.json"),
+        PIPEDRIVE_STAGING=str(work_dir / "staging.sqlite"),
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(IMPORTER), *extra_args], env=env, capture_output=True, text=True
+    )
+    seconds = time.perf_counter() - started
+    if result.returncode != 0:
+        raise SystemExit(f"El import fallo ({result.returncode}):\n{result.stdout}\n{result.stderr}")
+    report = json.loads((work_dir / "report.json").read_text(encoding="utf-8"))
+    report["wall_seconds"] = seconds
+    return report
+
+
+def summarize(reports):
+    stages = defaultdict(list)
+    for report in reports:
+        for name, entry in report["stages"].items():
+            stages[name].append(entry["seconds"])
+    last = reports[-1]
+    return {
+        "seconds": round(statistics.median(report["wall_seconds"] for report in reports), 3),
+        "stages": {
+            name: {
+                "seconds": round(statistics.median(values), 3),
+                "rows": last["stages"][name]["rows"],
+            }
+            for name, values in stages.items()
+        },
+        "peak_rss_mb": {
+            key: max((report["peak_rss_mb"][key] or 0) for report in reports) for key in last["peak_rss_mb"]
+        },
+        "counters": last["counters"],
+    }
+
+
+def run_benchmark(scale, args):
+    data_dir, counts = ensure_exports(scale, args.format, args.seed)
+    cold, warm = [], []
+    server = FakePostgrest(latency=args.latency / 1000)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        for attempt in range(args.repeat):
+            work_dir = BENCH_DIR / "work" / f"{args.format}-{scale}"
+            shutil.rmtree(work_dir, ignore_errors=True)
+            work_dir.mkdir(parents=True)
+            server.reset()
+            print(f"[{scale}] corrida {attempt + 1}/{args.repeat}: import completo...")
+            cold.append(run_import(server, data_dir, work_dir, args.importer_args))
+            print(f"[{scale}] corrida {attempt + 1}/{args.repeat}: import incremental...")
+            warm.append(run_import(server, data_dir, work_dir, args.importer_args))
+        server_stats = dict(server.stats)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "rows": counts,
+        "cold": summarize(cold),
+        "warm": summarize(warm),
+        "server": server_stats,
+    }
+
+
+def print_summary(results):
+    for scale, result in results["scales"].items():
+        for mode in ("cold", "warm"):
+            run = result[mode]
+            rss = run["peak_rss_mb"]
+            print(f"[{scale}] {mode}: {run['seconds']:.2f} s, RSS principal {rss['main']} MB, workers {rss['workers']} MB")
+            for name, entry in run["stages"].items():
+                rate = f" ({entry['rows'] / entry['seconds']:.0f} filas/s)" if entry["rows"] and entry["seconds"] else ""
+                print(f"    {name}: {entry['seconds']:.3f} s{rate}")
+
+
+def compare(base_path, other_path, threshold):
+    base = json.loads(Path(base_path).read_text(encoding="utf-8"))
+    other = json.loads(Path(other_path).read_text(encoding="utf-8"))
+    regressions = 0
+    print(f"{base['label']} -> {other['label']}")
+    for scale in sorted(set(base["scales"]) & set(other["scales"]), key=int):
+        for mode in ("cold", "warm"):
+            before = base["scales"][scale][mode]
+            after = other["scales"][scale][mode]
+            rows = [("total", before["seconds"], after["seconds"])]
+            rows += [
+                (name, entry["seconds"], after["stages"][name]["seconds"])
+                for name, entry in before["stages"].items()
+                if name in after["stages"]
+            ]
+            print(f"[{scale}] {mode}")
+            for name, old, new in rows:
+                change = (new - old) / old if old else 0.0
+                flag = ""
+                # Sub-50ms stages are mostly noise.
+                if change > threshold and new - old > 0.05:
+                    flag = "  REGRESION"
+                    regressions += 1
+                print(f"    {name}: {old:.3f} s -> {new:.3f} s ({change:+.1%}){flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Mide el import de Pipedrive con exportaciones sinteticas contra un PostgREST local."
+    )
+    parser.add_argument("--scale", type=int, nargs="+", default=[10000], help="Filas de actividades por escenario (10000 a 1000000).")
+    parser.add_argument("--format", choices=("xlsx", "csv"), default="xlsx", help="Formato de las exportaciones generadas.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los datos sinteticos.")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas por escenario; se reporta la mediana.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia simulada por peticion HTTP, en milisegundos.")
+    parser.add_argument("--label", help="Nombre del resultado (por defecto el commit actual).")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASE", "OTRO"),
+        help="Compara dos resultados guardados y marca las etapas que empeoran.",
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento relativo que cuenta como regresion.")
+    parser.add_argument(
+        "importer_args",
+        nargs="*",
+        help="Argumentos extra para el import, despues de -- (por ejemplo -- --stream o -- --reconcile).",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        raise SystemExit(1 if regressions else 0)
+
+    label = args.label or git_label()
+    results = {
+        "label": label,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "format": args.format,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "latency_ms": args.latency,
+        "importer_args": args.importer_args,
+        "scales": {},
+    }
+    for scale in args.scale:
+        results["scales"][str(scale)] = run_benchmark(scale, args)
+    print_summary(results)
+    out_path = BENCH_DIR / "results" / f"{label}-{args.format}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Resultado: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
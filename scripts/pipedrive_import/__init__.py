@@ -0,0 +1,23 @@
+"""Pipedrive export importer for Supabase's crm_* tables.
+
+extract/transform/load/run are imported on first use so the CLI and callers
+that only need the configuration do not pay for pandas at startup.
+"""
+
+_EXPORTS = {
+    "extract": "pipeline",
+    "load": "pipeline",
+    "run": "pipeline",
+    "transform": "entities",
+    "main": "cli",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    return getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
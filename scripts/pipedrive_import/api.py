@@ -0,0 +1,381 @@
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from . import config
+from .stats import STATS
+from .supabase import ConnectionPool, loads, retry_delay
+
+PAGE_SIZE = 500
+# Entity -> (list endpoint, fields endpoint used for custom field names).
+ENDPOINTS = {
+    "organizations": ("/api/v2/organizations", "/api/v1/organizationFields"),
+    "people": ("/api/v2/persons", "/api/v1/personFields"),
+    "deals": ("/api/v2/deals", "/api/v1/dealFields"),
+    "activities": ("/api/v2/activities", "/api/v1/activityFields"),
+    "notes": ("/api/v1/notes", None),
+}
+# Labels the Spanish exports use for values the API returns as codes.
+DEAL_STATUS = {"open": "Abierto", "won": "Ganado", "lost": "Perdido", "deleted": "Eliminado"}
+PHONE_HEADERS = {"mobile": "Telefono - Movil", "work": "Telefono - Trabajo", "home": "Telefono - Personal", "other": "Telefono - Otro"}
+EMAIL_HEADERS = {"work": "Correo electronico - Trabajo", "home": "Correo electronico - Personal", "other": "Correo electronico - Otro"}
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class PipedriveError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimiter:
+    """Holds requests back once Pipedrive's x-ratelimit-remaining runs out."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining = None
+        self.reset_at = 0.0
+
+    def wait(self):
+        with self._lock:
+            delay = 0.0
+            if self.remaining is not None:
+                if self.remaining <= 0:
+                    delay = max(0.0, self.reset_at - time.monotonic())
+                self.remaining -= 1
+        if delay:
+            STATS.count(rate_limit_waits=1)
+            time.sleep(delay)
+
+    def update(self, headers):
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        with self._lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = time.monotonic() + float(reset)
+
+
+LIMITER = RateLimiter()
+
+
+def api_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ConnectionPool(config.PIPEDRIVE_API_URL, size=config.API_CONCURRENCY)
+        return _POOL
+
+
+def close_api_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+
+
+def api_request(path, params=None):
+    query = urlencode({key: value for key, value in (params or {}).items() if value is not None})
+    target = f"{path}?{query}" if query else path
+    headers = {
+        "x-api-token": config.PIPEDRIVE_API_TOKEN,
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+    }
+    for attempt in range(config.MAX_RETRIES + 1):
+        LIMITER.wait()
+        started = time.perf_counter()
+        try:
+            status, response_headers, raw = api_pool().request("GET", target, headers=headers)
+        except (http.client.HTTPException, OSError) as exc:
+            if attempt == config.MAX_RETRIES:
+                raise PipedriveError(f"GET {path} -> {exc}") from exc
+            time.sleep(retry_delay(attempt))
+            continue
+        STATS.observe_request(f"GET pipedrive {path.rsplit('/', 1)[-1]}", time.perf_counter() - started)
+        STATS.count(api_requests=1, api_bytes_received=len(raw))
+        LIMITER.update(response_headers)
+        if (status == 429 or status >= 500) and attempt < config.MAX_RETRIES:
+            STATS.count(api_retries=1)
+            wait = response_headers.get("Retry-After") or response_headers.get("x-ratelimit-reset")
+            time.sleep(retry_delay(attempt, wait))
+            continue
+        break
+    if status >= 400:
+        detail = raw.decode("utf-8", errors="ignore")
+        raise PipedriveError(f"GET {path} -> {status}: {detail}", status=status)
+    return loads(raw)
+
+
+def paginate(path, params=None):
+    # v2 endpoints page with an opaque cursor, v1 ones with start offsets.
+    params = dict(params or {}, limit=PAGE_SIZE)
+    while True:
+        body = api_request(path, params)
+        yield from body.get("data") or []
+        extra = body.get("additional_data") or {}
+        if path.startswith("/api/v2/"):
+            cursor = extra.get("next_cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+        else:
+            pagination = extra.get("pagination") or {}
+            if not pagination.get("more_items_in_collection"):
+                return
+            params["start"] = pagination.get("next_start")
+
+
+def local_time(value):
+    # The API answers in UTC; exports use the account's time zone.
+    if not value:
+        return None
+    text = str(value).strip().replace(" ", "T", 1)
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        return value
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(ZoneInfo(config.PIPEDRIVE_TIMEZONE)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def since_param(path, since):
+    # v2 takes RFC 3339, v1 "YYYY-MM-DD HH:MM:SS", both in UTC.
+    if not since:
+        return None
+    moment = datetime.fromisoformat(since.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=ZoneInfo(config.PIPEDRIVE_TIMEZONE))
+    moment = moment.astimezone(timezone.utc)
+    if path.startswith("/api/v2/"):
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def name_map(path, key="id", label="name"):
+    return {item[key]: item.get(label) for item in paginate(path) if item.get(key) is not None}
+
+
+def load_references():
+    # Names the exports print where the API returns ids.
+    jobs = {
+        "users": ("/api/v1/users",),
+        "stages": ("/api/v2/stages",),
+        "pipelines": ("/api/v2/pipelines",),
+        "activity_types": ("/api/v1/activityTypes", "key_string"),
+    }
+    jobs.update({entity: (fields,) for entity, (_, fields) in ENDPOINTS.items() if fields})
+    with ThreadPoolExecutor(max_workers=config.API_CONCURRENCY) as executor:
+        futures = {
+            name: executor.submit(list, paginate(args[0])) if name in ENDPOINTS else executor.submit(name_map, *args)
+            for name, args in jobs.items()
+        }
+        refs = {name: future.result() for name, future in futures.items()}
+    refs["fields"] = {entity: refs.pop(entity) for entity in ENDPOINTS if entity in refs}
+    return refs
+
+
+def option_labels(field):
+    return {option.get("id"): option.get("label") for option in field.get("options") or []}
+
+
+def field_value(value, field):
+    if value is None or value == "":
+        return None
+    if isinstance(value, dict):
+        value = value.get("value", value.get("formatted_address"))
+    options = option_labels(field)
+    if options:
+        if isinstance(value, list):
+            return ", ".join(str(options.get(item, item)) for item in value)
+        if isinstance(value, str) and "," in value:
+            return ", ".join(str(options.get(int(item) if item.isdigit() else item, item)) for item in value.split(","))
+        return options.get(value, value)
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+def custom_fields(record, fields):
+    # Custom fields come back under their hash key; the exports name the
+    # column after the field, which is what the entity specs match on.
+    values = {}
+    nested = record.get("custom_fields") or {}
+    for field in fields:
+        key = field.get("key")
+        if not key or len(key) != 40:
+            continue
+        value = nested.get(key, record.get(key))
+        values[field.get("name")] = field_value(value, field)
+    return values
+
+
+def labels(record, fields):
+    for field in fields:
+        if field.get("key") in ("label_ids", "label"):
+            options = option_labels(field)
+            break
+    else:
+        options = {}
+    ids = record.get("label_ids") or ([record["label"]] if record.get("label") else [])
+    return ", ".join(str(options.get(item, item)) for item in ids) or None
+
+
+def address_columns(address, suffix):
+    address = address if isinstance(address, dict) else {"value": address}
+    return {
+        suffix: address.get("value"),
+        f"Direccion completa/combinada de {suffix}": address.get("formatted_address"),
+        f"Ciudad/pueblo/poblacion/localidad de {suffix}": address.get("locality"),
+        f"Estado/municipio de {suffix}": address.get("admin_area_level_1"),
+        f"Pais de {suffix}": address.get("country"),
+        f"Codigo postal de {suffix}": address.get("postal_code"),
+    }
+
+
+def organization_row(record, refs):
+    fields = refs["fields"].get("organizations", [])
+    return {
+        "ID": record.get("id"),
+        "Nombre": record.get("name"),
+        "Propietario": refs["users"].get(record.get("owner_id")),
+        "Etiquetas": labels(record, fields),
+        **address_columns(record.get("address") or {}, "Direccion"),
+        "Organizacion creada": local_time(record.get("add_time")),
+        "Hora de actualizacion": local_time(record.get("update_time")),
+        **custom_fields(record, fields),
+    }
+
+
+def person_row(record, refs):
+    fields = refs["fields"].get("people", [])
+    row = {
+        "ID": record.get("id"),
+        "ID de la organizacion": record.get("org_id"),
+        "Nombre": record.get("name"),
+        "Cargo": record.get("job_title"),
+        "Etiquetas": labels(record, fields),
+        "Persona creada": local_time(record.get("add_time")),
+        "Hora de actualizacion": local_time(record.get("update_time")),
+        **custom_fields(record, fields),
+    }
+    for kind, headers in (("phones", PHONE_HEADERS), ("emails", EMAIL_HEADERS)):
+        for item in record.get(kind) or []:
+            header = headers.get(item.get("label"), headers["other"])
+            if item.get("value") and not row.get(header):
+                row[header] = item["value"]
+    return row
+
+
+def deal_row(record, refs):
+    fields = refs["fields"].get("deals", [])
+    channel = next((field for field in fields if field.get("key") == "channel"), {})
+    return {
+        "ID": record.get("id"),
+        "Titulo": record.get("title"),
+        "ID de la organizacion": record.get("org_id"),
+        "ID de la persona de contacto": record.get("person_id"),
+        "Valor": record.get("value"),
+        "Moneda de Valor": record.get("currency"),
+        "Etapa": refs["stages"].get(record.get("stage_id")),
+        "Estado": DEAL_STATUS.get(record.get("status"), record.get("status")),
+        "Probabilidad": record.get("probability"),
+        "Embudo": refs["pipelines"].get(record.get("pipeline_id")),
+        "Propietario": refs["users"].get(record.get("owner_id")),
+        "Origen de la fuente": record.get("origin"),
+        "Canal de la fuente": field_value(record.get("channel"), channel),
+        "Motivo de la perdida": record.get("lost_reason"),
+        "Fecha prevista de cierre": record.get("expected_close_date"),
+        "Trato cerrado el": local_time(record.get("close_time")),
+        "Ultimo cambio de la etapa": local_time(record.get("stage_change_time")),
+        "Trato creado": local_time(record.get("add_time")),
+        "Hora de actualizacion": local_time(record.get("update_time")),
+        **custom_fields(record, fields),
+    }
+
+
+def activity_row(record, refs):
+    fields = refs["fields"].get("activities", [])
+    due = None
+    if record.get("due_date"):
+        due = record["due_date"]
+        if record.get("due_time"):
+            due = local_time(f"{record['due_date']} {record['due_time']}")
+    date, _, clock = (due or "").partition(" ")
+    busy = record.get("busy")
+    return {
+        "ID": record.get("id"),
+        "Asunto": record.get("subject"),
+        "Tipo": refs["activity_types"].get(record.get("type"), record.get("type")),
+        "Finalizada": record.get("done"),
+        "Nota": record.get("note"),
+        "Fecha de vencimiento": date or None,
+        "Hora de vencimiento": clock or None,
+        "Hora en que se marco como completada": local_time(record.get("marked_as_done_time")),
+        "Duracion": record.get("duration"),
+        **address_columns(record.get("location") or {}, "Ubicacion"),
+        "Prioridad": record.get("priority"),
+        "Asignada al usuario": refs["users"].get(record.get("owner_id")),
+        "Descripcion publica": record.get("public_description"),
+        "Libre/ocupado": None if busy is None else ("Ocupado" if busy else "Libre"),
+        "Proyecto": record.get("project_id"),
+        "ID de la organizacion": record.get("org_id"),
+        "ID de la persona de contacto": record.get("person_id"),
+        "ID del trato": record.get("deal_id"),
+        "Hora de adicion": local_time(record.get("add_time")),
+        "Hora de actualizacion": local_time(record.get("update_time")),
+        **custom_fields(record, fields),
+    }
+
+
+def note_row(record, refs):
+    return {
+        "ID": record.get("id"),
+        "Contenido": record.get("content"),
+        "Usuario": refs["users"].get(record.get("user_id")),
+        "ID de la organizacion": record.get("org_id"),
+        "ID de la persona de contacto": record.get("person_id"),
+        "ID del trato": record.get("deal_id"),
+        "La nota esta anclada al trato": record.get("pinned_to_deal_flag"),
+        "La nota esta anclada a la organizacion": record.get("pinned_to_organization_flag"),
+        "La nota esta anclada a la persona": record.get("pinned_to_person_flag"),
+        "Hora de adicion": local_time(record.get("add_time")),
+        "Hora de actualizacion": local_time(record.get("update_time")),
+    }
+
+
+ROW_MAPPERS = {
+    "organizations": organization_row,
+    "people": person_row,
+    "deals": deal_row,
+    "activities": activity_row,
+    "notes": note_row,
+}
+
+
+def fetch_entity(entity, refs, since=None):
+    path = ENDPOINTS[entity][0]
+    with STATS.stage(f"fetch {entity}") as entry:
+        rows = [ROW_MAPPERS[entity](record, refs) for record in paginate(path, {"updated_since": since_param(path, since)})]
+        entry["rows"] = len(rows)
+    return pd.DataFrame(rows)
+
+
+def fetch_frames(entities, since=None):
+    # Export-shaped frames (same headers as the xlsx files) so the API path
+    # goes through the same transform. since maps entity -> updated_since.
+    since = since or {}
+    refs = load_references()
+    with ThreadPoolExecutor(max_workers=config.API_CONCURRENCY) as executor:
+        futures = {entity: executor.submit(fetch_entity, entity, refs, since.get(entity)) for entity in entities}
+        return {entity: future.result() for entity, future in futures.items()}
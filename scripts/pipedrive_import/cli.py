@@ -0,0 +1,237 @@
+import argparse
+import cProfile
+import json
+from datetime import datetime
+
+from . import config
+
+# Kept in sync with entities.ENTITY_SPECS; listed here so --help does not
+# need to import pandas.
+ENTITIES = ("organizations", "people", "deals", "activities", "notes")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Importa las exportaciones de Pipedrive a las tablas crm_* de Supabase.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Reenvia todas las filas aunque no hayan cambiado desde la ultima importacion.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Lee las exportaciones originales sin usar ni actualizar la cache Arrow.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos para leer y transformar las exportaciones (por defecto uno por archivo, hasta los nucleos disponibles).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Procesa actividades y notas por ventanas de PIPEDRIVE_STREAM_ROWS filas para acotar la memoria.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("cprofile", "pyinstrument"),
+        help="Perfila el proceso principal y guarda el resultado junto al reporte (.prof o .html).",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=ENTITIES,
+        help="Importa solo estas entidades (las que aportan datos de respaldo se leen igualmente).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Lee y transforma las exportaciones e informa los cambios sin escribir en Supabase.",
+    )
+    parser.add_argument(
+        "--since",
+        help="Solo considera filas actualizadas (o creadas) desde esta fecha ISO, p. ej. 2024-01-31.",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=("rest", "copy"),
+        help=(
+            "Como se escriben las filas: rest (PostgREST por lotes) o copy (COPY a una tabla temporal y un "
+            "INSERT ... ON CONFLICT por conexion directa a SUPABASE_DB_URL, para cargas iniciales o --full). "
+            "Por defecto PIPEDRIVE_TRANSPORT o rest."
+        ),
+    )
+    parser.add_argument(
+        "--source",
+        choices=("files", "api"),
+        help=(
+            "De donde se leen los datos: files (exportaciones xlsx/csv) o api (API de Pipedrive con "
+            "PIPEDRIVE_API_TOKEN, pidiendo solo lo actualizado desde la ultima importacion). "
+            "Por defecto PIPEDRIVE_SOURCE o files."
+        ),
+    )
+    parser.add_argument(
+        "--duplicates",
+        choices=("report", "merge"),
+        help=(
+            "report: busca organizaciones y personas casi duplicadas y escribe los pares candidatos "
+            "(PIPEDRIVE_DUPLICATES) y un mapa de fusion propuesto (PIPEDRIVE_MERGE_MAP). merge: aplica ese "
+            "mapa, ya revisado, al cargar: los duplicados no se cargan, sus referencias apuntan al registro que queda y los que ya "
+            "estaban en Supabase se marcan con deleted_at (requiere supabase/crm_deletions.sql)."
+        ),
+    )
+    parser.add_argument(
+        "--reconcile",
+        action="store_true",
+        help=(
+            "Marca con deleted_at las filas importadas antes que ya no estan en la exportacion (eliminadas en "
+            "Pipedrive) y restaura las que vuelven. Solo con exportaciones completas: con --source api, en la "
+            "primera carga o con --full. Por defecto PIPEDRIVE_RECONCILE. Requiere supabase/crm_deletions.sql."
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Queda en ejecucion vigilando la carpeta de entrada: cada PIPEDRIVE_WATCH_INTERVAL segundos toma la "
+            "exportacion mas reciente de cada entidad e importa solo las que cambiaron. Publica el estado y el "
+            "ultimo reporte en http://127.0.0.1:PIPEDRIVE_STATUS_PORT/status (0 lo desactiva)."
+        ),
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Descarta una importacion interrumpida en vez de reanudarla desde el ultimo lote confirmado.",
+    )
+    parser.add_argument(
+        "--input-dir",
+        help="Carpeta con las exportaciones (por defecto PIPEDRIVE_INPUT_DIR o la raiz del repo).",
+    )
+    return parser.parse_args(argv)
+
+
+def profile_call(kind, path, func, **kwargs):
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise SystemExit("pyinstrument no esta instalado (pip install pyinstrument).")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return func(**kwargs)
+        finally:
+            profiler.stop()
+            path.write_text(profiler.output_html(), encoding="utf-8")
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+
+
+def write_report(args, started, status, summary=None):
+    from .stats import STATS
+
+    report = {
+        "started_at": started.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "seconds": round((datetime.now() - started).total_seconds(), 3),
+        "status": status,
+        "options": {
+            "full": args.full,
+            "stream": args.stream,
+            "workers": args.workers,
+            "no_cache": args.no_cache,
+            "only": args.only,
+            "dry_run": args.dry_run,
+            "since": args.since,
+            "input_dir": args.input_dir,
+            "restart": args.restart,
+            "transport": args.transport,
+            "source": args.source,
+            "duplicates": args.duplicates,
+            "reconcile": args.reconcile,
+            "watch": args.watch,
+        },
+        "entities": summary or {},
+        **STATS.report(),
+    }
+    config.REPORT_PATH.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return report
+
+
+def print_report(report, dry_run=False):
+    for name, entry in report["stages"].items():
+        rate = f", {entry['rows_per_second']:.0f} filas/s" if entry["rows"] and entry["rows_per_second"] else ""
+        print(f"  {name}: {entry['seconds']:.2f} s{rate}")
+    print(f"Reporte: {config.REPORT_PATH}")
+    print("Simulacion finalizada." if dry_run else "Import finalizado.")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config.load()
+    args.transport = args.transport or config.TRANSPORT
+    if args.transport not in ("rest", "copy"):
+        raise SystemExit(f"Transporte desconocido: {args.transport} (usa rest o copy).")
+    args.source = args.source or config.SOURCE
+    args.reconcile = args.reconcile or config.RECONCILE
+    if args.source not in ("files", "api"):
+        raise SystemExit(f"Origen desconocido: {args.source} (usa files o api).")
+    if args.watch and args.source != "files":
+        raise SystemExit("--watch vigila exportaciones; no se combina con --source api.")
+    if args.watch and args.profile:
+        raise SystemExit("--watch no se combina con --profile.")
+    if args.source == "api" and not config.PIPEDRIVE_API_TOKEN:
+        raise SystemExit("Falta PIPEDRIVE_API_TOKEN en el entorno para --source api.")
+    if not args.dry_run:
+        if args.transport == "copy":
+            from .postgres import require
+
+            require()
+        if args.transport == "rest" and (not config.SUPABASE_URL or not config.SUPABASE_KEY):
+            raise SystemExit("Faltan SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY en el entorno.")
+
+    options = {
+        "only": args.only,
+        "input_dir": args.input_dir,
+        "since": args.since,
+        "dry_run": args.dry_run,
+        "full": args.full,
+        "stream": args.stream,
+        "workers": args.workers,
+        "use_cache": not args.no_cache,
+        "resume": not args.restart,
+        "transport": args.transport,
+        "source": args.source,
+        "duplicates": args.duplicates,
+        "reconcile_deletions": args.reconcile,
+    }
+    if args.watch:
+        from .watch import watch
+
+        # Transforms run in this process so the normalizer caches stay warm
+        # between imports.
+        options["workers"] = 1 if args.workers is None else args.workers
+        watch(args, options)
+        return
+
+    # pandas and the transform specs load only once the arguments are valid.
+    from .pipeline import run
+
+    started = datetime.now()
+    status = "error"
+    summary = None
+    try:
+        if args.profile:
+            suffix = ".html" if args.profile == "pyinstrument" else ".prof"
+            summary = profile_call(args.profile, config.REPORT_PATH.with_suffix(suffix), run, **options)
+            print(f"Perfil: {config.REPORT_PATH.with_suffix(suffix)}")
+        else:
+            summary = run(**options)
+        status = "ok"
+    finally:
+        report = write_report(args, started, status, summary)
+    print_report(report, args.dry_run)
@@ -0,0 +1,68 @@
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def load_env():
+    env_path = ROOT / ".env.local"
+    if env_path.exists():
+        for line in env_path.read_text(encoding="utf-8").splitlines():
+            if not line or line.strip().startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            value = value.strip().strip('"').strip("'")
+            if key and key not in os.environ:
+                os.environ[key] = value
+
+
+def load(env_file=True):
+    # Settings are read into module globals so long-lived callers can change
+    # the environment and call load() again between runs.
+    global SUPABASE_URL, SUPABASE_KEY, BATCH_SIZE, CONCURRENCY, MAX_BATCH_SIZE, TARGET_LATENCY, MAX_RETRIES
+    global INPUT_DIR, CACHE_DIR, STATE_PATH, DEAD_LETTER_PATH, STREAM_ROWS, REPORT_PATH
+    global STAGING_PATH, GZIP, DATABASE_URL, TRANSPORT, SUMMARIES, SEARCH, RECONCILE, RECONCILE_MAX_RATIO, WATCH_INTERVAL, STATUS_PORT
+    global DUPLICATES_PATH, MERGE_MAP_PATH, REJECTS_PATH, PARALLEL_TABLES, SOURCE, PIPEDRIVE_API_TOKEN, PIPEDRIVE_API_URL, API_CONCURRENCY, PIPEDRIVE_TIMEZONE
+    if env_file:
+        load_env()
+    SUPABASE_URL = os.environ.get("SUPABASE_URL", "").rstrip("/")
+    SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
+    DATABASE_URL = os.environ.get("SUPABASE_DB_URL", "")
+    TRANSPORT = os.environ.get("PIPEDRIVE_TRANSPORT", "rest")
+    SOURCE = os.environ.get("PIPEDRIVE_SOURCE", "files")
+    PIPEDRIVE_API_TOKEN = os.environ.get("PIPEDRIVE_API_TOKEN", "")
+    PIPEDRIVE_API_URL = os.environ.get("PIPEDRIVE_API_URL", "https://api.pipedrive.com").rstrip("/")
+    API_CONCURRENCY = int(os.environ.get("PIPEDRIVE_API_CONCURRENCY", "4"))
+    PIPEDRIVE_TIMEZONE = os.environ.get("PIPEDRIVE_TIMEZONE", "UTC")
+
+    BATCH_SIZE = int(os.environ.get("PIPEDRIVE_BATCH_SIZE", "500"))
+    CONCURRENCY = int(os.environ.get("PIPEDRIVE_CONCURRENCY", "4"))
+    PARALLEL_TABLES = int(os.environ.get("PIPEDRIVE_PARALLEL_TABLES", "5"))
+    MAX_BATCH_SIZE = int(os.environ.get("PIPEDRIVE_MAX_BATCH_SIZE", "5000"))
+    TARGET_LATENCY = float(os.environ.get("PIPEDRIVE_TARGET_LATENCY", "2.0"))
+    MAX_RETRIES = int(os.environ.get("PIPEDRIVE_MAX_RETRIES", "5"))
+    # PostgREST does not decode gzip request bodies; only for a proxy that does.
+    GZIP = os.environ.get("PIPEDRIVE_GZIP", "0") not in ("0", "false", "no")
+    SUMMARIES = os.environ.get("PIPEDRIVE_SUMMARIES", "1") not in ("0", "false", "no")
+    # search_text/search_terms need supabase/crm_search.sql run first.
+    SEARCH = os.environ.get("PIPEDRIVE_SEARCH", "0") not in ("0", "false", "no")
+    RECONCILE = os.environ.get("PIPEDRIVE_RECONCILE", "0") not in ("0", "false", "no")
+    # A table losing more than this share of its rows at once looks like a
+    # truncated export rather than deletions.
+    RECONCILE_MAX_RATIO = float(os.environ.get("PIPEDRIVE_RECONCILE_MAX_RATIO", "0.5"))
+    INPUT_DIR = Path(os.environ.get("PIPEDRIVE_INPUT_DIR", ROOT))
+    CACHE_DIR = Path(os.environ.get("PIPEDRIVE_CACHE_DIR", ROOT / ".pipedrive_cache"))
+    STATE_PATH = Path(os.environ.get("PIPEDRIVE_STATE", ROOT / ".pipedrive_sync_state.json"))
+    DEAD_LETTER_PATH = Path(os.environ.get("PIPEDRIVE_DEAD_LETTER", ROOT / "pipedrive_dead_letter.jsonl"))
+    REJECTS_PATH = Path(os.environ.get("PIPEDRIVE_REJECTS", ROOT / "pipedrive_rejects.jsonl"))
+    STREAM_ROWS = int(os.environ.get("PIPEDRIVE_STREAM_ROWS", "5000"))
+    WATCH_INTERVAL = float(os.environ.get("PIPEDRIVE_WATCH_INTERVAL", "30"))
+    STATUS_PORT = int(os.environ.get("PIPEDRIVE_STATUS_PORT", "8765"))
+    REPORT_PATH = Path(os.environ.get("PIPEDRIVE_REPORT", ROOT / "pipedrive_import_report.json"))
+    STAGING_PATH = Path(os.environ.get("PIPEDRIVE_STAGING", ROOT / ".pipedrive_staging.sqlite"))
+    DUPLICATES_PATH = Path(os.environ.get("PIPEDRIVE_DUPLICATES", ROOT / "pipedrive_duplicates.csv"))
+    MERGE_MAP_PATH = Path(os.environ.get("PIPEDRIVE_MERGE_MAP", ROOT / "pipedrive_merge_map.json"))
+
+
+load(env_file=False)
@@ -0,0 +1,221 @@
+import csv
+import json
+import re
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from . import config
+from .normalize import normalize_name
+from .stats import STATS
+
+# Company-form and filler words dropped from organization names before
+# comparing ("INDUSTRIAS XYZ S.A." and "Industrias XYZ" share one key).
+ORGANIZATION_STOPWORDS = {
+    "S", "A", "C", "SA", "CA", "SAS", "SC", "SCC", "CIA", "LTDA", "LTD", "CV", "RL", "SRL", "EP", "INC", "LLC",
+    "CORP", "CO", "COMPANIA", "CORPORACION", "SOCIEDAD", "ANONIMA", "LIMITADA", "DE", "DEL", "LA", "EL", "LOS",
+    "LAS", "Y", "THE", "AND",
+}
+PERSON_STOPWORDS = {"DE", "DEL", "LA", "LOS", "LAS", "Y", "SR", "SRA", "ING", "DR", "DRA", "LIC"}
+# Mail providers shared by unrelated people; their domain says nothing.
+PUBLIC_DOMAINS = {"gmail.com", "hotmail.com", "outlook.com", "yahoo.com", "yahoo.es", "live.com", "icloud.com", "msn.com"}
+# Tokens in more records than this are too common to block on.
+MAX_BLOCK = 50
+# Leading key characters that split a city block.
+CITY_PREFIX = 4
+# Following records compared in each sorted-key pass.
+WINDOW = 3
+REPORT_THRESHOLD = 0.8
+MERGE_THRESHOLD = 0.95
+DIGITS = re.compile(r"\d")
+
+
+def name_tokens(name, stopwords):
+    return tuple(sorted({token for token in normalize_name(name).split() if token not in stopwords}))
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def numbers(tokens):
+    return {token for token in tokens if DIGITS.search(token)}
+
+
+def email_domain(email):
+    _, _, domain = (email or "").strip().lower().rpartition("@")
+    return domain if domain and domain not in PUBLIC_DOMAINS else ""
+
+
+def organization_record(row, clients=None):
+    tokens = name_tokens(row.get("name"), ORGANIZATION_STOPWORDS)
+    return {
+        "id": row["external_id"],
+        "name": row.get("name") or "",
+        "tokens": tokens,
+        "key": " ".join(tokens),
+        "grams": trigrams(" ".join(tokens)),
+        "numbers": numbers(tokens),
+        "city": normalize_name(row.get("city")),
+        "domain": "",
+        "email": "",
+        "client": "",
+        "person": False,
+    }
+
+
+def person_record(row, clients=None):
+    # clients maps merged organizations to the one kept, so two contacts of
+    # duplicated organizations count as working at the same one.
+    tokens = name_tokens(row.get("name"), PERSON_STOPWORDS)
+    email = (row.get("email") or "").strip().lower()
+    client = row.get("client_external_id") or ""
+    return {
+        "id": row["external_id"],
+        "name": row.get("name") or "",
+        "tokens": tokens,
+        "key": " ".join(tokens),
+        "grams": trigrams(" ".join(tokens)),
+        "numbers": numbers(tokens),
+        "city": "",
+        "domain": email_domain(email),
+        "email": email,
+        "client": (clients or {}).get(client, client),
+        "person": True,
+    }
+
+
+def candidate_pairs(records):
+    # Blocking keeps the comparisons near-linear: records sharing their
+    # exact key, their rarest name token, their city and the start of their
+    # key (a typo in the rarest token), or a company email domain, plus
+    # their next neighbours in key order and in reversed-key order, which
+    # catches a typo near either end of the name.
+    frequency = Counter(token for record in records for token in record["tokens"])
+    blocks = defaultdict(list)
+    for index, record in enumerate(records):
+        if not record["key"]:
+            continue
+        blocks["key", record["key"]].append(index)
+        blocks["token", min(record["tokens"], key=lambda token: (frequency[token], token))].append(index)
+        if record["city"]:
+            blocks["city", record["city"], record["key"][:CITY_PREFIX]].append(index)
+        if record["domain"]:
+            blocks["domain", record["domain"]].append(index)
+    pairs = set()
+    for members in blocks.values():
+        if 1 < len(members) <= MAX_BLOCK:
+            pairs.update(combinations(members, 2))
+    named = [index for index, record in enumerate(records) if record["key"]]
+    for key in (lambda index: records[index]["key"], lambda index: records[index]["key"][::-1]):
+        order = sorted(named, key=key)
+        for position, index in enumerate(order):
+            for other in order[position + 1 : position + 1 + WINDOW]:
+                pairs.add((min(index, other), max(index, other)))
+    return pairs
+
+
+def score_pair(left, right):
+    reasons = []
+    if left["key"] == right["key"]:
+        score = 1.0
+        reasons.append("nombre")
+    else:
+        a, b = left["grams"], right["grams"]
+        score = 2 * len(a & b) / (len(a) + len(b))
+        reasons.append("nombre similar")
+    # "Bodega 2" and "Bodega 3" are different places, not typos.
+    if left["numbers"] != right["numbers"]:
+        score *= 0.5
+    if left["city"] and right["city"]:
+        if left["city"] == right["city"]:
+            reasons.append("ciudad")
+        else:
+            score *= 0.9
+    if left["client"] and left["client"] == right["client"]:
+        reasons.append("organizacion")
+    elif left["client"] and right["client"]:
+        score *= 0.9
+    # Shared inboxes (ventas@...) make the email a hint, not an identity.
+    if left["email"] and left["email"] == right["email"]:
+        reasons.append("email")
+    elif left["domain"] and left["domain"] == right["domain"]:
+        reasons.append("dominio")
+    elif left["email"] and right["email"]:
+        score *= 0.9
+    if left["person"] and len(reasons) == 1:
+        # Two people sharing only a name are worth a look, not a merge.
+        score *= 0.9
+    return score, reasons
+
+
+def find_duplicates(entity, rows, clients=None):
+    build = organization_record if entity == "organizations" else person_record
+    with STATS.stage(f"duplicates {entity}", len(rows)):
+        records = [build(row, clients) for row in rows]
+        found = []
+        for left, right in candidate_pairs(records):
+            a, b = len(records[left]["grams"]), len(records[right]["grams"])
+            if 2 * min(a, b) < REPORT_THRESHOLD * (a + b):
+                # Names this different in length cannot reach the threshold.
+                continue
+            score, reasons = score_pair(records[left], records[right])
+            if score >= REPORT_THRESHOLD:
+                found.append((score, records[left], records[right], reasons))
+    found.sort(key=lambda item: (-item[0], item[1]["key"]))
+    return found
+
+
+def external_order(external_id):
+    # Pipedrive ids are numeric; the lowest one is the oldest record.
+    return (0, int(external_id)) if external_id.isdigit() else (1, external_id)
+
+
+def merge_map(pairs):
+    # Union-find over the pairs sure enough to merge; every record in a
+    # group points at the group's oldest one.
+    parent = {}
+
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for score, left, right, _ in pairs:
+        if score >= MERGE_THRESHOLD:
+            a, b = find(left["id"]), find(right["id"])
+            if a != b:
+                keep, drop = sorted((a, b), key=external_order)
+                parent[drop] = keep
+    return {key: find(key) for key in sorted(parent, key=external_order) if find(key) != key}
+
+
+def write_duplicates(found, merges):
+    # found: entity -> pairs from find_duplicates; merges: entity -> merge_map.
+    with config.DUPLICATES_PATH.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["entity", "external_id", "name", "duplicate_external_id", "duplicate_name", "score", "reasons"])
+        for entity, pairs in found.items():
+            for score, left, right, reasons in pairs:
+                writer.writerow([entity, left["id"], left["name"], right["id"], right["name"], f"{score:.3f}", "; ".join(reasons)])
+    config.MERGE_MAP_PATH.write_text(json.dumps(merges, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_merge_map():
+    if not config.MERGE_MAP_PATH.exists():
+        raise SystemExit(f"No se encontro el mapa de fusion {config.MERGE_MAP_PATH} (generalo con --duplicates report).")
+    loaded = json.loads(config.MERGE_MAP_PATH.read_text(encoding="utf-8"))
+    merges = {}
+    for entity in ("organizations", "people"):
+        mapping = {str(key): str(value) for key, value in (loaded.get(entity) or {}).items()}
+        # A hand-edited map may chain merges (a -> b -> c); point each
+        # record straight at the survivor.
+        for key in list(mapping):
+            seen = {key}
+            while mapping[key] in mapping and mapping[key] not in seen:
+                seen.add(mapping[key])
+                mapping[key] = mapping[mapping[key]]
+        merges[entity] = {key: value for key, value in mapping.items() if key != value}
+    return merges
@@ -0,0 +1,391 @@
+from collections import namedtuple
+
+import pandas as pd
+
+from .normalize import (
+    build_column_map,
+    combine_date_time_series,
+    date_part_series,
+    first_filled,
+    get_column,
+    join_filled,
+    nested,
+    normalize_id_series,
+    normalize_text_series,
+    or_none,
+    parse_bool_series,
+    parse_duration_series,
+    parse_number_series,
+    plain_text_series,
+    records,
+    search_terms_series,
+    split_tags_series,
+    terms_of_plain_series,
+    to_iso_series,
+    _fill,
+)
+from .validation import PARSED, blank, check_rules, reasons
+
+Field = namedtuple(
+    "Field",
+    ["target", "sources", "convert", "nullable", "default", "time", "labels"],
+    defaults=("text", False, None, None, None),
+)
+Ref = namedtuple("Ref", ["field", "via"], defaults=(None,))
+Join = namedtuple("Join", ["parts"])
+
+CONVERTERS = {
+    "text": normalize_text_series,
+    "id": normalize_id_series,
+    "iso": to_iso_series,
+    "date": date_part_series,
+    "datetime": combine_date_time_series,
+    "number": parse_number_series,
+    "duration": parse_duration_series,
+    "bool": parse_bool_series,
+    "tags": split_tags_series,
+    "plain": plain_text_series,
+    "terms": search_terms_series,
+}
+
+
+def field(target, *sources, **options):
+    return Field(target, sources, **options)
+
+
+ENTITY_SPECS = {
+    "organizations": {
+        "required": ("external_id", "name"),
+        "fields": [
+            field("external_id", "ID", convert="id"),
+            field("name", "Nombre"),
+            field("industry", "Sub-sector"),
+            field("city", "Ciudad/pueblo/poblacion/localidad de Direccion"),
+            field("owner", "Propietario"),
+            field("client_type", "Tipo de cliente"),
+            field("relation", "Relacion"),
+            field("potential", "Potencial"),
+            field("tags", "Etiquetas", convert="tags"),
+            field("address", "Direccion completa/combinada de Direccion", "Direccion"),
+            field("state", "Estado/municipio de Direccion"),
+            field("country", "Pais de Direccion"),
+            field("postal_code", "Codigo postal de Direccion"),
+            field("meta.boilers", "Calderas Instaladas"),
+            field("meta.burners", "Quemadores instalados"),
+            field("meta.lat", "Latitud de Direccion"),
+            field("meta.lng", "Longitud de Direccion"),
+            field("created_at", "Organizacion creada", convert="iso", nullable=True),
+            field("updated_at", "Hora de actualizacion", Ref("created_at"), convert="iso", nullable=True),
+        ],
+    },
+    "people": {
+        "required": ("external_id", "name"),
+        "fields": [
+            field("external_id", "ID", convert="id"),
+            field("client_external_id", "ID de la organizacion", convert="id"),
+            field("name", "Nombre", Join(("Nombre.1", "Apellidos"))),
+            field("role", "Cargo"),
+            field(
+                "phone",
+                "Telefono - Movil",
+                "Telefono - Trabajo",
+                "Telefono - Personal",
+                "Telefono - Otro",
+            ),
+            field(
+                "email",
+                "Correo electronico - Trabajo",
+                "Correo electronico - Personal",
+                "Correo electronico - Otro",
+            ),
+            field("area", "Area"),
+            field("tags", "Etiquetas", convert="tags"),
+            field("meta.phones.work", "Telefono - Trabajo"),
+            field("meta.phones.personal", "Telefono - Personal"),
+            field("meta.phones.mobile", "Telefono - Movil"),
+            field("meta.phones.other", "Telefono - Otro"),
+            field("meta.emails.work", "Correo electronico - Trabajo"),
+            field("meta.emails.personal", "Correo electronico - Personal"),
+            field("meta.emails.other", "Correo electronico - Otro"),
+            field("created_at", "Persona creada", convert="iso", nullable=True),
+            field("updated_at", "Hora de actualizacion", Ref("created_at"), convert="iso", nullable=True),
+        ],
+    },
+    "deals": {
+        "required": ("external_id", "name"),
+        "fields": [
+            field("external_id", "ID", convert="id"),
+            field(
+                "client_external_id",
+                "ID de la organizacion",
+                Ref("contact_external_id", via="contact_client"),
+                convert="id",
+            ),
+            field("contact_external_id", "ID de la persona de contacto", convert="id"),
+            field("name", "Titulo"),
+            field("stage", "Etapa"),
+            field("status", "Estado"),
+            field("value", "Valor", convert="number"),
+            field("currency", "Moneda de Valor"),
+            field("weighted_value", "Valor ponderado", convert="number"),
+            field("probability", "Probabilidad", convert="number"),
+            field("pipeline", "Embudo"),
+            field("owner", "Propietario"),
+            field("source", "Origen de la fuente"),
+            field("source_channel", "Canal de la fuente"),
+            field("lost_reason", "Motivo de la perdida"),
+            field("expected_close_date", "Fecha prevista de cierre", convert="date"),
+            field("close_date", "Trato cerrado el", convert="date"),
+            field("last_stage_change_at", "Ultimo cambio de la etapa", convert="iso"),
+            field("meta.product_name", "Nombre del producto"),
+            field("meta.product_amount", "Monto del producto", convert="number"),
+            field("meta.product_qty", "Cantidad de producto", convert="number"),
+            field("created_at", "Trato creado", convert="iso", nullable=True),
+            field("updated_at", "Hora de actualizacion", Ref("created_at"), convert="iso", nullable=True),
+        ],
+    },
+    "activities": {
+        "required": ("external_id",),
+        "fields": [
+            field("external_id", "ID", convert="id"),
+            field(
+                "client_external_id",
+                "ID de la organizacion",
+                Ref("deal_external_id", via="deal_client"),
+                Ref("contact_external_id", via="contact_client"),
+                convert="id",
+            ),
+            field("contact_external_id", "ID de la persona de contacto", convert="id"),
+            field("deal_external_id", "ID del trato", convert="id"),
+            field("title", "Asunto", Ref("type"), default="Actividad"),
+            field("type", "Tipo"),
+            field("outcome", "Finalizada", convert="bool", labels=("completada", "pendiente")),
+            field("notes", "Nota"),
+            field("search_text", "Nota", convert="plain"),
+            field("search_terms", Join(("Asunto", "Tipo", "Nota")), convert="terms"),
+            field(
+                "due_at",
+                "Fecha de vencimiento",
+                convert="datetime",
+                time="Hora de vencimiento",
+                nullable=True,
+            ),
+            field("completed_at", "Hora en que se marco como completada", convert="iso", nullable=True),
+            field("duration_minutes", "Duracion", convert="duration"),
+            field("location", "Direccion completa/combinada de Ubicacion", "Ubicacion"),
+            field("priority", "Prioridad"),
+            field("owner", "Asignada al usuario"),
+            field("meta.public_description", "Descripcion publica"),
+            field("meta.free_busy", "Libre/ocupado"),
+            field("meta.prospect", "Prospecto"),
+            field("meta.project", "Proyecto"),
+            field("created_at", ("Hora de adicion", "Hora de anadicion"), convert="iso", nullable=True),
+            field("updated_at", "Hora de actualizacion", Ref("created_at"), convert="iso", nullable=True),
+        ],
+    },
+    "notes": {
+        "required": ("external_id",),
+        "fields": [
+            field("external_id", "ID", convert="id"),
+            field("client_external_id", "ID de la organizacion", convert="id"),
+            field("contact_external_id", "ID de la persona de contacto", convert="id"),
+            field("deal_external_id", "ID del trato", convert="id"),
+            field("activity_external_id", "ID de la actividad", convert="id"),
+            field("title", "Titulo"),
+            field("content", "Contenido"),
+            field("search_text", "Contenido", convert="plain"),
+            field("search_terms", Join(("Titulo", "Contenido")), convert="terms"),
+            field("owner", "Usuario"),
+            field(
+                "is_pinned",
+                "La nota esta anclada al trato",
+                "La nota esta anclada a la organizacion",
+                "La nota esta anclada a la persona",
+                convert="bool",
+            ),
+            field("created_at", "Hora de adicion", convert="iso", nullable=True),
+            field("updated_at", "Hora de actualizacion", Ref("created_at"), convert="iso", nullable=True),
+        ],
+    },
+}
+
+
+def resolve_columns(df, spec):
+    col_map = build_column_map(df)
+    headers = {}
+    for item in spec["fields"]:
+        for source in (*item.sources, item.time):
+            parts = source.parts if isinstance(source, Join) else (source,)
+            for header in parts:
+                if header is None or isinstance(header, Ref):
+                    continue
+                aliases = header if isinstance(header, tuple) else (header,)
+                headers[header] = get_column(df, col_map, *aliases)
+    return headers
+
+
+def unreadable(spec, compute, convert):
+    # Cells with a value the field's converter could not read, which would
+    # otherwise load as an empty value; only a required field drops the row.
+    for item in spec["fields"]:
+        if item.convert not in PARSED:
+            continue
+        for source in item.sources[:1] if item.time else item.sources:
+            if isinstance(source, (Ref, Join)):
+                continue
+            filled = convert(source, "text") != ""
+            values = compute(item.target) if item.time else convert(source, item.convert)
+            drop = "row" if item.target in spec["required"] else "value"
+            yield item.target, filled & blank(values), "no se pudo leer", convert(source, "text"), drop
+
+
+def transform(entity, df, lookups=None, rejects=None):
+    # Rows failing a required field or a validation rule are left out (or
+    # lose the offending value, for rules dropping only the value); with a
+    # rejects list they are added to it with their reasons.
+    spec = ENTITY_SPECS[entity]
+    fields = {item.target: item for item in spec["fields"]}
+    headers = resolve_columns(df, spec)
+    converted = {}
+    computed = {}
+
+    def raw(header):
+        column = headers[header]
+        if column is None:
+            return pd.Series([None] * len(df), index=df.index, dtype=object)
+        return df[column]
+
+    def convert(header, kind):
+        key = (header, kind)
+        if key not in converted:
+            converted[key] = CONVERTERS[kind](raw(header))
+        return converted[key]
+
+    def source_values(source, kind):
+        if isinstance(source, Ref):
+            values = compute(source.field)
+            if source.via:
+                values = values.map(lookups[source.via]).fillna("").astype(object)
+            return values
+        if isinstance(source, Join):
+            if kind == "terms":
+                # Distinct and sorted over the joined text, not per part.
+                return terms_of_plain_series(join_filled(*(convert(part, "plain") for part in source.parts)))
+            return join_filled(*(convert(part, kind) for part in source.parts))
+        return convert(source, kind)
+
+    def compute(target):
+        if target not in computed:
+            item = fields[target]
+            if item.time:
+                candidates = [CONVERTERS[item.convert](raw(item.sources[0]), raw(item.time))]
+            else:
+                # Without lookup maps the via sources are left to apply_lookups.
+                candidates = [
+                    source_values(source, item.convert)
+                    for source in item.sources
+                    if lookups is not None or not (isinstance(source, Ref) and source.via)
+                ]
+            if item.default is not None:
+                candidates.append(_fill(df.index, item.default))
+            computed[target] = first_filled(*candidates)
+        return computed[target]
+
+    tree = {}
+    for item in spec["fields"]:
+        values = compute(item.target)
+        if item.labels:
+            values = values.map(dict(zip((True, False), item.labels))).astype(object)
+        elif item.nullable:
+            values = or_none(values)
+        elif values.dtype == bool:
+            values = values.astype(object)
+        *path, leaf = item.target.split(".")
+        node = tree
+        for key in path:
+            node = node.setdefault(key, {})
+        node[leaf] = values
+
+    def build(node):
+        return {key: nested(**build(value)) if isinstance(value, dict) else value for key, value in node.items()}
+
+    problems = [(target, compute(target) == "", "vacio", None, "row") for target in spec["required"]]
+    problems.extend(unreadable(spec, compute, convert))
+    problems.extend(check_rules(entity, compute))
+    rejected = pd.Series(False, index=df.index)
+    cleared = pd.Series(False, index=df.index)
+    for target, bad, _, _, drop in problems:
+        if drop == "row":
+            rejected |= bad
+        elif bad.any():
+            cleared |= bad
+            *path, leaf = target.split(".")
+            node = tree
+            for key in path:
+                node = node[key]
+            empty = None if fields[target].nullable or fields[target].convert in PARSED else ""
+            node[leaf] = node[leaf].astype(object).where(~bad, empty)
+    columns = build(tree)
+    if rejects is not None:
+        for drop, mask in (("row", rejected), ("value", cleared & ~rejected)):
+            if mask.any():
+                for row, found in zip(records(columns, mask), reasons(problems, mask[mask].index)):
+                    rejects.append({"external_id": row["external_id"] or "", "dropped": drop, "reasons": found, "row": row})
+    return records(columns, ~rejected)
+
+
+# Lookup maps used by Ref(..., via=...) sources: name -> (entity that
+# provides it, row field mapped from external_id).
+LOOKUPS = {
+    "contact_client": ("people", "client_external_id"),
+    "deal_client": ("deals", "client_external_id"),
+}
+
+
+# Row fields holding another entity's external_id, one per FK column the
+# loader fills.
+PARENTS = {
+    "people": {"client_external_id": "organizations"},
+    "deals": {"client_external_id": "organizations", "contact_external_id": "people"},
+    "activities": {"client_external_id": "organizations", "contact_external_id": "people", "deal_external_id": "deals"},
+    "notes": {
+        "client_external_id": "organizations",
+        "contact_external_id": "people",
+        "deal_external_id": "deals",
+        "activity_external_id": "activities",
+    },
+}
+
+
+def lookup_names(entity):
+    return {
+        source.via
+        for item in ENTITY_SPECS[entity]["fields"]
+        for source in item.sources
+        if isinstance(source, Ref) and source.via
+    }
+
+
+def apply_lookups(entity, rows, lookups):
+    # Fills the Ref(..., via=...) fallbacks that transform skips when it
+    # runs without lookup maps, with the same first-filled semantics.
+    chains = []
+    for item in ENTITY_SPECS[entity]["fields"]:
+        refs = [source for source in item.sources if isinstance(source, Ref) and source.via]
+        if refs:
+            chains.append((item.target, refs))
+    for row in rows:
+        for target, refs in chains:
+            if row[target]:
+                continue
+            for ref in refs:
+                value = lookups[ref.via].get(row[ref.field], "")
+                if value:
+                    row[target] = value
+                    break
+    return rows
+
+
+def lookup_map(name, rows):
+    provider, value = LOOKUPS[name]
+    return {row["external_id"]: row.get(value) for row in rows}
@@ -0,0 +1,484 @@
+import functools
+import html
+import math
+import re
+import unicodedata
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+TRUE_VALUES = {"si", "sí", "yes", "true", "1", "x"}
+ISO_DATETIME = r"[12]\d{3}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?"
+PIPEDRIVE_DATETIME = re.compile(r"([12]\d{3})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2})(?::(\d{2}))?)?")
+PIPEDRIVE_TIME = re.compile(r"(\d{1,2}):(\d{2})(?::(\d{2}))?")
+NORMALIZE_CACHE_SIZE = 65536
+# Note and activity bodies come as HTML: block tags become line breaks,
+# other tags and comments disappear.
+HTML_BLOCK_TAG = r"(?i)<\s*(?:/?br|/?p|/?div|/?li|/?tr|/?h[1-6]|/?blockquote)\b[^>]*>"
+HTML_TAG = r"<!--[\s\S]*?-->|</?[A-Za-z][^>]*>"
+NORMALIZERS = []
+
+
+def memoized(func):
+    # Shared bounded LRU for the scalar normalizers; NaN and unhashable
+    # values bypass it.
+    cached = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE, typed=True)(func)
+    NORMALIZERS.append(cached)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if any(isinstance(arg, float) and arg != arg for arg in args):
+            return func(*args, **kwargs)
+        try:
+            return cached(*args, **kwargs)
+        except TypeError:
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def normalizer_stats():
+    stats = Counter()
+    for cached in NORMALIZERS:
+        info = cached.cache_info()
+        stats["normalizer_hits"] += info.hits
+        stats["normalizer_misses"] += info.misses
+    return stats
+
+
+def parse_datetime(value):
+    # pd.to_datetime(value, errors="coerce"), skipping pandas for datetimes
+    # and the "YYYY-MM-DD[ HH:MM[:SS]]" strings Pipedrive exports.
+    if type(value) is datetime:
+        return value
+    if isinstance(value, str):
+        match = PIPEDRIVE_DATETIME.fullmatch(value)
+        if match:
+            try:
+                return datetime(*(int(part) for part in match.groups(default="0")))
+            except ValueError:
+                return None
+    parsed = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(parsed) else parsed
+
+
+def parse_clock(value):
+    # Same as parse_datetime for "HH:MM[:SS]" strings, which pandas reads
+    # as that time today.
+    if isinstance(value, str):
+        match = PIPEDRIVE_TIME.fullmatch(value)
+        if match:
+            hour, minute, second = (int(part) for part in match.groups(default="0"))
+            if hour < 24 and minute < 60 and second < 60:
+                return datetime.now().replace(hour=hour, minute=minute, second=second, microsecond=0)
+            return None
+    return parse_datetime(value)
+
+
+def normalize_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    text = str(value)
+    text = html.unescape(text)
+    text = text.replace("\u00a0", " ")
+    return text.strip()
+
+
+def normalize_id(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value).strip()
+    if text.endswith(".0"):
+        base = text[:-2]
+        if base.isdigit():
+            return base
+    return text
+
+
+@memoized
+def to_iso(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    text = str(value).strip()
+    if not text:
+        return ""
+    dt = parse_datetime(value)
+    if dt is None:
+        return ""
+    if hasattr(dt, "to_pydatetime"):
+        dt = dt.to_pydatetime()
+    return dt.isoformat()
+
+
+@memoized
+def combine_date_time(date_value, time_value, fallback=""):
+    date = parse_datetime(date_value)
+    if date is None:
+        return fallback
+    if time_value is not None and not (isinstance(time_value, float) and math.isnan(time_value)):
+        time_val = parse_clock(time_value)
+        if time_val is not None:
+            date = datetime(
+                date.year,
+                date.month,
+                date.day,
+                time_val.hour,
+                time_val.minute,
+                time_val.second,
+            )
+    if hasattr(date, "to_pydatetime"):
+        date = date.to_pydatetime()
+    return date.isoformat()
+
+
+@memoized
+def normalize_name(value):
+    text = normalize_text(value).upper()
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    text = re.sub(r"[^A-Z0-9\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def search_terms(text):
+    # Distinct words of a text as normalize_name spells them; words repeat
+    # across notes, so each one is normalized once.
+    return " ".join(sorted({term for word in text.split() for term in normalize_name(word).split()}))
+
+
+def build_column_map(df):
+    return {normalize_name(col): col for col in df.columns}
+
+
+def get_column(df, col_map, *candidates):
+    for candidate in candidates:
+        key = normalize_name(candidate)
+        if key in col_map:
+            return col_map[key]
+    return None
+
+
+@memoized
+def _tag_parts(value):
+    # A tuple, so the cached result cannot be changed through a row.
+    text = normalize_text(value)
+    if not text:
+        return None
+    parts = tuple(dict.fromkeys(part.strip() for part in re.split(r"[;,/]+", text) if part.strip()))
+    return parts or None
+
+
+def split_tags(value):
+    parts = _tag_parts(value)
+    return list(parts) if parts else None
+
+
+def parse_number(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = normalize_text(value)
+    if not text:
+        return None
+    text = text.replace(" ", "").replace(",", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_duration_minutes(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = normalize_text(value)
+    if not text:
+        return None
+    if ":" in text:
+        parts = text.split(":")
+        try:
+            hours = int(parts[0])
+            minutes = int(parts[1]) if len(parts) > 1 else 0
+            return hours * 60 + minutes
+        except ValueError:
+            return None
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def parse_bool(value):
+    if value is None:
+        return False
+    text = normalize_text(value).lower()
+    return text in TRUE_VALUES
+
+
+# Column-wise versions of the normalizers above. Each one takes a whole
+# Series and returns exactly what mapping the scalar function over it would,
+# using vectorized paths for homogeneous columns and falling back to the
+# scalar function for mixed object columns.
+
+
+def _blank_mask(values):
+    mask = values.isna()
+    if mask.any():
+        mask[mask] = values[mask].map(lambda v: v is None or isinstance(v, float))
+    return mask
+
+
+def _only_strings(values, blank):
+    return pd.api.types.infer_dtype(values[~blank], skipna=False) in ("string", "empty")
+
+
+def _keyable(values, blank):
+    kinds = pd.api.types.infer_dtype(values[~blank], skipna=False)
+    return kinds in ("string", "empty", "datetime", "date", "time")
+
+
+def _apply(values, func):
+    # Series.map would re-infer the dtype and turn None results into NaN.
+    out = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        out[i] = func(value)
+    return pd.Series(out, index=values.index, dtype=object)
+
+
+def _unique_map(values, func):
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques), dtype=object)
+    for i, value in enumerate(uniques):
+        mapped[i] = func(value)
+    return pd.Series(mapped[codes], index=values.index, dtype=object)
+
+
+def _fill(index, value):
+    return pd.Series([value] * len(index), index=index, dtype=object)
+
+
+def _put(series, mask, values):
+    # Plain numpy assignment so None stays None instead of being cast to NaN.
+    out = series.to_numpy(dtype=object, copy=True)
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=object)
+    out[mask.to_numpy(dtype=bool)] = values
+    return pd.Series(out, index=series.index, dtype=object)
+
+
+def _isoformat_series(series):
+    # Same output as Timestamp.to_pydatetime().isoformat() for naive datetimes.
+    out = series.dt.strftime("%Y-%m-%dT%H:%M:%S").astype(object)
+    micro = series.dt.microsecond
+    with_micro = micro.fillna(0) != 0
+    if with_micro.any():
+        out[with_micro] = out[with_micro] + "." + micro[with_micro].astype("int64").astype(str).str.zfill(6)
+    return out.where(series.notna(), "")
+
+
+def _text_cells(series):
+    values = series.astype(object)
+    blank = _blank_mask(values)
+    text = _fill(values.index, "")
+    present = values[~blank]
+    if len(present):
+        if not _only_strings(values, blank):
+            present = present.map(str)
+        text[~blank] = present
+    return text
+
+
+def normalize_text_series(series):
+    text = _text_cells(series)
+    escaped = text.str.contains("&", regex=False)
+    if escaped.any():
+        text[escaped] = text[escaped].map(html.unescape)
+    return text.str.replace("\u00a0", " ", regex=False).str.strip()
+
+
+def plain_text_series(series):
+    text = _text_cells(series)
+    tagged = text.str.contains("<", regex=False)
+    if tagged.any():
+        text[tagged] = (
+            text[tagged].str.replace(HTML_BLOCK_TAG, "\n", regex=True).str.replace(HTML_TAG, " ", regex=True)
+        )
+    # Entities are decoded after the tags go, so an escaped "&lt;b&gt;" stays text.
+    escaped = text.str.contains("&", regex=False)
+    if escaped.any():
+        text[escaped] = text[escaped].map(html.unescape)
+    text = text.str.replace("\u00a0", " ", regex=False).str.replace(r"[^\S\n]+", " ", regex=True)
+    return text.str.replace(r" ?\n[\s]*", "\n", regex=True).str.strip()
+
+
+def search_terms_series(series):
+    return terms_of_plain_series(plain_text_series(series))
+
+
+def terms_of_plain_series(text):
+    return _unique_map(text, search_terms)
+
+
+def normalize_id_series(series):
+    kind = series.dtype.kind
+    if kind in "iub":
+        return series.astype(str).astype(object)
+    if kind == "f":
+        values = series.to_numpy(dtype=float)
+        whole = np.isfinite(values) & (np.trunc(values) == values) & (np.abs(values) < 2**63)
+        out = _fill(series.index, "")
+        out[whole] = series[whole].astype("int64").astype(str).astype(object)
+        rest = series.notna() & ~whole
+        if rest.any():
+            out[rest] = _apply(series[rest].astype(object), normalize_id)
+        return out
+    values = series.astype(object)
+    blank = _blank_mask(values)
+    if not _only_strings(values, blank):
+        return _apply(values, normalize_id)
+    text = values.where(~blank, "").str.strip()
+    base = text.str[:-2]
+    whole = text.str.endswith(".0") & base.str.isdigit()
+    return text.where(~whole, base)
+
+
+def to_iso_series(series):
+    if series.dtype.kind == "M" and getattr(series.dtype, "tz", None) is None:
+        return _isoformat_series(series)
+    values = series.astype(object)
+    blank = _blank_mask(values)
+    if not _only_strings(values, blank):
+        return _apply(values, to_iso)
+    out = _fill(values.index, "")
+    iso = ~blank & values.where(~blank, "").str.fullmatch(ISO_DATETIME)
+    if iso.any():
+        parsed = pd.to_datetime(values[iso], format="ISO8601", errors="coerce")
+        # ISO-shaped but impossible dates ("2021-02-30") go to the scalar
+        # path below, which leaves them blank.
+        iso[iso] = parsed.notna()
+        out[iso] = _isoformat_series(parsed[parsed.notna()])
+    rest = ~blank & ~iso
+    if rest.any():
+        out[rest] = _unique_map(values[rest], to_iso)
+    return out
+
+
+def combine_date_time_series(date_series, time_series, fallback=""):
+    dates = date_series.astype(object)
+    times = time_series.astype(object)
+    if _keyable(dates, _blank_mask(dates)) and _keyable(times, _blank_mask(times)):
+        pairs = dates.where(dates.notna(), None).map(repr) + "|" + times.where(times.notna(), None).map(repr)
+        lookup = dict(zip(pairs, zip(dates, times)))
+        return _unique_map(pairs, lambda key: combine_date_time(*lookup[key], fallback=fallback))
+    return pd.Series(
+        [combine_date_time(d, t, fallback=fallback) for d, t in zip(dates, times)],
+        index=dates.index,
+        dtype=object,
+    )
+
+
+def split_tags_series(series):
+    text = normalize_text_series(series)
+    present = text != ""
+    out = _fill(text.index, None)
+    if present.any():
+        # One list per row: equal cells share the cached tuple, not a list.
+        tags = [list(parts) if parts else None for parts in _unique_map(text[present], _tag_parts)]
+        out = _put(out, present, pd.Series(tags, dtype=object))
+    return out
+
+
+def parse_number_series(series):
+    kind = series.dtype.kind
+    if kind in "iubf":
+        return _put(series.astype(float).astype(object), series.isna(), None)
+    values = series.astype(object)
+    blank = _blank_mask(values)
+    if not _only_strings(values, blank):
+        return _apply(values, parse_number)
+    out = _fill(values.index, None)
+    if (~blank).any():
+        out = _put(out, ~blank, _unique_map(values[~blank], parse_number))
+    return out
+
+
+def parse_duration_series(series):
+    kind = series.dtype.kind
+    if kind in "iub":
+        return series.astype(int).astype(object)
+    values = series.astype(object)
+    blank = _blank_mask(values)
+    if kind == "f" or not _only_strings(values, blank):
+        return _apply(values, parse_duration_minutes)
+    out = _fill(values.index, None)
+    if (~blank).any():
+        out = _put(out, ~blank, _unique_map(values[~blank], parse_duration_minutes))
+    return out
+
+
+def parse_bool_series(series):
+    return normalize_text_series(series).str.lower().isin(TRUE_VALUES)
+
+
+def first_filled(*columns):
+    result = columns[0]
+    for column in columns[1:]:
+        filled = result if result.dtype == bool else result != ""
+        result = result.where(filled, column)
+    return result
+
+
+def join_filled(*columns):
+    result = columns[0]
+    for column in columns[1:]:
+        joined = result.where(column == "", result + " " + column)
+        result = joined.where(result != "", column)
+    return result
+
+
+def or_none(series):
+    return _put(series, series == "", None)
+
+
+def date_part_series(series):
+    # Blank and unreadable cells (NaN included) load as NULL: Postgres does
+    # not take "" for a date column.
+    dates = to_iso_series(series).str[:10]
+    return _put(dates, dates == "", None)
+
+
+def records(columns, mask=None):
+    if mask is not None:
+        columns = {key: value[mask] for key, value in columns.items()}
+    keys = list(columns)
+    values = [columns[key].tolist() for key in keys]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def nested(**columns):
+    return pd.Series(records(columns), index=next(iter(columns.values())).index, dtype=object)
+
+
+# Declarative mapping from Pipedrive export headers to crm_* row fields.
+#
+# Each field lists its sources in fallback order: the first one with a value
+# wins (for booleans, any true source wins). A source is a header, a tuple of
+# alternative spellings of one header, Ref to another field of the same row
+# (optionally translated through a lookup map passed to transform), or Join
+# of several headers concatenated with spaces. Targets with dots build the
+# nested meta dicts.
@@ -0,0 +1,847 @@
+import gc
+import json
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import partial
+
+from . import api, config
+from .duplicates import find_duplicates, load_merge_map, merge_map, write_duplicates
+from .entities import ENTITY_SPECS, LOOKUPS, PARENTS, lookup_names, transform
+from .normalize import normalizer_stats
+from .sources import FILES, find_file, iter_frames, load_frame
+from .staging import StagingStore
+from .state import commit_state, load_state, select_changed
+from .summaries import SUMMARIES, computed_at, facts, local_now, summary_rows
+from .stats import STATS, RunStats
+from . import postgres
+from .supabase import DEAD_LETTERS, close_pool, fetch_keys, mark_deleted, resolve_ids, upsert_rows
+
+STREAMED_ENTITIES = ("activities", "notes")
+ID_TABLES = ("crm_clients", "crm_contacts", "crm_opportunities", "crm_activities")
+# Loader backends: name -> (upload rows, resolve missing FK ids, fetch
+# external_id -> deleted, set deleted_at by external_id).
+TRANSPORTS = {
+    "rest": (upsert_rows, resolve_ids, fetch_keys, mark_deleted),
+    "copy": (postgres.copy_rows, postgres.resolve_ids, postgres.fetch_keys, postgres.mark_deleted),
+}
+# Entities in load order (foreign keys only point backwards), with their
+# table and the label used in progress messages.
+TABLES = {
+    "organizations": ("crm_clients", "clientes"),
+    "people": ("crm_contacts", "contactos"),
+    "deals": ("crm_opportunities", "oportunidades"),
+    "activities": ("crm_activities", "actividades"),
+    "notes": ("crm_notes", "notas"),
+}
+
+
+def extract_entity(entity, path, use_cache=True):
+    # Runs in a worker process, so timings travel back as a snapshot.
+    stats = RunStats()
+    before = normalizer_stats()
+    with stats.stage(f"load {entity}") as entry:
+        df = load_frame(path, use_cache)
+        entry["rows"] = len(df)
+    rejects = []
+    with stats.stage(f"transform {entity}", len(df)):
+        rows = transform(entity, df, rejects=rejects)
+    stats.count(**(normalizer_stats() - before))
+    return rows, rejects, stats.snapshot()
+
+
+def run_transforms(paths, store, use_cache=True, workers=None):
+    # Files are read and transformed in a process pool and staged as each
+    # one finishes; the Ref(..., via=...) fallbacks are then joined inside
+    # the store once every provider is there.
+    if not paths:
+        return
+    if workers is not None and workers <= 1:
+        executor = ThreadPoolExecutor(max_workers=1)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1))
+    with executor:
+        futures = {executor.submit(extract_entity, entity, path, use_cache): entity for entity, path in paths.items()}
+        for future in as_completed(futures):
+            rows, rejects, snapshot = future.result()
+            STATS.merge(snapshot)
+            store.stage(futures[future], rows)
+            store.reject(futures[future], rejects)
+    join_lookups(store, paths)
+
+
+def join_lookups(store, entities):
+    # Providers go first, so a lookup value filled by another lookup (a
+    # deal's client via its contact) is there for the entities after it.
+    for entity in ENTITY_SPECS:
+        if entity in entities:
+            store.apply_merges(entity)
+            if lookup_names(entity):
+                store.apply_lookups(entity)
+            store.refresh_lookups(entity)
+
+
+def run_api_transforms(entities, store, since=None):
+    # Same staging as run_transforms, from export-shaped frames fetched
+    # concurrently from the API; transform is cheap next to the requests.
+    frames = api.fetch_frames(entities, since)
+    for entity, frame in frames.items():
+        rejects = []
+        with STATS.stage(f"transform {entity}", len(frame)):
+            rows = transform(entity, frame, rejects=rejects) if len(frame) else []
+        store.stage(entity, rows)
+        store.reject(entity, rejects)
+    join_lookups(store, entities)
+
+
+def report_duplicates(store, entities):
+    found = {}
+    merges = {}
+    for entity in ("organizations", "people"):
+        if entity in entities:
+            found[entity] = find_duplicates(entity, store.rows(entity), merges.get("organizations"))
+            merges[entity] = merge_map(found[entity])
+    if not found:
+        return
+    write_duplicates(found, merges)
+    for entity, pairs in found.items():
+        print(f"  {TABLES[entity][1]}: {len(pairs)} posibles duplicados, {len(merges[entity])} para fusionar")
+    print(f"Posibles duplicados en {config.DUPLICATES_PATH}; mapa de fusion propuesto en {config.MERGE_MAP_PATH}.")
+
+
+def stream_entity(entity, path, size=5000, done=()):
+    started = time.perf_counter()
+    for window, frame in enumerate(iter_frames(path, size)):
+        STATS.add_stage(f"load {entity}", time.perf_counter() - started, len(frame))
+        if window in done:
+            started = time.perf_counter()
+            continue
+        before = normalizer_stats()
+        rejects = []
+        with STATS.stage(f"transform {entity}", len(frame)):
+            rows = transform(entity, frame, rejects=rejects)
+        STATS.count(**(normalizer_stats() - before))
+        del frame
+        # transform's memoizing closures form a reference cycle that keeps
+        # the window's columns (mostly Arrow buffers the collector does
+        # not count) alive until a full collection.
+        gc.collect()
+        yield window, rows, rejects
+        started = time.perf_counter()
+
+
+def check_references(store, entity, loaded, id_maps, resolve=None, window=0):
+    # A row pointing at a row that is neither loaded in this run nor already
+    # in Supabase is rejected instead of loading with an empty FK. --dry-run
+    # does not query Supabase and keeps the references it cannot verify.
+    found = {}
+    for column, parent in PARENTS.get(entity, {}).items():
+        table = TABLES[parent][0]
+        missing = [
+            (external_id, key)
+            for external_id, key in store.unknown_references(entity, column, parent, window, parent in loaded)
+            if key not in id_maps[table]
+        ]
+        if not missing or resolve is None:
+            continue
+        known = {}
+        resolve(table, {key for _, key in missing}, known)
+        if known:
+            id_maps[table].update(known)
+            store.save_ids(table, known)
+        for external_id, key in missing:
+            if key not in known:
+                found.setdefault(external_id, []).append(f"{column}: no existe en {TABLES[parent][1]} ({key})")
+    store.reject_staged(entity, found, window)
+
+
+def write_rejects(store):
+    # The rejects file lists this run's rejected rows and dropped values; an
+    # old one would report problems already fixed. Returns entity ->
+    # {"rejected": rows, "dropped_values": rows}.
+    rejects = store.rejects()
+    if not rejects:
+        config.REJECTS_PATH.unlink(missing_ok=True)
+        return {}
+    counts = {}
+    with config.REJECTS_PATH.open("w", encoding="utf-8") as handle:
+        for item in rejects:
+            handle.write(json.dumps(item, ensure_ascii=False) + "\n")
+            key = "rejected" if item["dropped"] == "row" else "dropped_values"
+            add_counts(counts.setdefault(item["entity"], {}), {key: 1})
+    return counts
+
+
+def client_rows(clients, id_maps, resolve=resolve_ids):
+    return clients
+
+
+def contact_rows(contacts, id_maps, resolve=resolve_ids):
+    # --dry-run builds rows from the cached id maps only.
+    if resolve:
+        resolve("crm_clients", (row.get("client_external_id") for row in contacts), id_maps["crm_clients"])
+    rows = []
+    for row in contacts:
+        client_id = id_maps["crm_clients"].get(row.get("client_external_id") or "")
+        rows.append(
+            {
+                "external_id": row["external_id"],
+                "client_id": client_id,
+                "name": row["name"],
+                "role": row.get("role"),
+                "phone": row.get("phone"),
+                "email": row.get("email"),
+                "area": row.get("area"),
+                "tags": row.get("tags"),
+                "meta": row.get("meta"),
+                "created_at": row.get("created_at"),
+                "updated_at": row.get("updated_at"),
+            }
+        )
+    return rows
+
+
+def deal_rows(deals, id_maps, resolve=resolve_ids):
+    if resolve:
+        resolve("crm_clients", (row.get("client_external_id") for row in deals), id_maps["crm_clients"])
+        resolve("crm_contacts", (row.get("contact_external_id") for row in deals), id_maps["crm_contacts"])
+    rows = []
+    for row in deals:
+        client_id = id_maps["crm_clients"].get(row.get("client_external_id") or "")
+        contact_id = id_maps["crm_contacts"].get(row.get("contact_external_id") or "")
+        rows.append(
+            {
+                "external_id": row["external_id"],
+                "client_id": client_id,
+                "contact_id": contact_id,
+                "name": row["name"],
+                "stage": row.get("stage") or None,
+                "status": row.get("status") or None,
+                "value": row.get("value"),
+                "currency": row.get("currency") or None,
+                "weighted_value": row.get("weighted_value"),
+                "probability": row.get("probability"),
+                "pipeline": row.get("pipeline") or None,
+                "owner": row.get("owner") or None,
+                "source": row.get("source") or None,
+                "source_channel": row.get("source_channel") or None,
+                "lost_reason": row.get("lost_reason") or None,
+                "expected_close_date": row.get("expected_close_date"),
+                "close_date": row.get("close_date"),
+                "last_stage_change_at": row.get("last_stage_change_at"),
+                "meta": row.get("meta"),
+                "created_at": row.get("created_at"),
+                "updated_at": row.get("updated_at"),
+            }
+        )
+    return rows
+
+
+def search_fields(row):
+    # Off until supabase/crm_search.sql has added the columns; PostgREST
+    # rejects a batch with an unknown column.
+    if not config.SEARCH:
+        return {}
+    return {"search_text": row.get("search_text") or None, "search_terms": row.get("search_terms") or None}
+
+
+def activity_rows(activities, id_maps, resolve=resolve_ids):
+    if resolve:
+        resolve("crm_clients", (row.get("client_external_id") for row in activities), id_maps["crm_clients"])
+        resolve("crm_contacts", (row.get("contact_external_id") for row in activities), id_maps["crm_contacts"])
+        resolve("crm_opportunities", (row.get("deal_external_id") for row in activities), id_maps["crm_opportunities"])
+    rows = []
+    for row in activities:
+        client_id = id_maps["crm_clients"].get(row.get("client_external_id") or "")
+        contact_id = id_maps["crm_contacts"].get(row.get("contact_external_id") or "")
+        opportunity_id = id_maps["crm_opportunities"].get(row.get("deal_external_id") or "")
+        rows.append(
+            {
+                "external_id": row["external_id"],
+                "client_id": client_id,
+                "contact_id": contact_id,
+                "opportunity_id": opportunity_id,
+                "title": row.get("title"),
+                "type": row.get("type") or None,
+                "outcome": row.get("outcome") or None,
+                "notes": row.get("notes") or None,
+                **search_fields(row),
+                "due_at": row.get("due_at"),
+                "completed_at": row.get("completed_at"),
+                "duration_minutes": row.get("duration_minutes"),
+                "location": row.get("location") or None,
+                "priority": row.get("priority") or None,
+                "owner": row.get("owner") or None,
+                "meta": row.get("meta"),
+                "created_at": row.get("created_at"),
+                "updated_at": row.get("updated_at"),
+            }
+        )
+    return rows
+
+
+def note_rows(notes, id_maps, resolve=resolve_ids):
+    if resolve:
+        resolve("crm_clients", (row.get("client_external_id") for row in notes), id_maps["crm_clients"])
+        resolve("crm_contacts", (row.get("contact_external_id") for row in notes), id_maps["crm_contacts"])
+        resolve("crm_opportunities", (row.get("deal_external_id") for row in notes), id_maps["crm_opportunities"])
+        resolve("crm_activities", (row.get("activity_external_id") for row in notes), id_maps["crm_activities"])
+    rows = []
+    for row in notes:
+        client_id = id_maps["crm_clients"].get(row.get("client_external_id") or "")
+        contact_id = id_maps["crm_contacts"].get(row.get("contact_external_id") or "")
+        opportunity_id = id_maps["crm_opportunities"].get(row.get("deal_external_id") or "")
+        rows.append(
+            {
+                "external_id": row["external_id"],
+                "client_id": client_id,
+                "contact_id": contact_id,
+                "opportunity_id": opportunity_id,
+                "activity_id": id_maps["crm_activities"].get(row.get("activity_external_id") or ""),
+                "title": row.get("title") or None,
+                "content": row.get("content") or None,
+                **search_fields(row),
+                "owner": row.get("owner") or None,
+                "is_pinned": bool(row.get("is_pinned")),
+                "meta": row.get("meta") or {},
+                "created_at": row.get("created_at"),
+                "updated_at": row.get("updated_at"),
+            }
+        )
+    return rows
+
+
+ROW_BUILDERS = {
+    "organizations": client_rows,
+    "people": contact_rows,
+    "deals": deal_rows,
+    "activities": activity_rows,
+    "notes": note_rows,
+}
+
+
+def required_entities(entities):
+    # Adds the entities whose rows feed another entity's lookups.
+    needed = set()
+    pending = list(entities)
+    while pending:
+        entity = pending.pop()
+        if entity not in needed:
+            needed.add(entity)
+            pending.extend(LOOKUPS[name][0] for name in lookup_names(entity))
+    return [entity for entity in ENTITY_SPECS if entity in needed]
+
+
+def since_filter(rows, since):
+    if not since:
+        return rows
+    return [row for row in rows if (row.get("updated_at") or row.get("created_at") or "") >= since]
+
+
+def run_signature(paths, **options):
+    # A run resumes only against the same exports and options.
+    files = {}
+    for entity, path in paths.items():
+        stat = path.stat()
+        files[entity] = [str(path), stat.st_size, stat.st_mtime_ns]
+    return json.dumps({"files": files, "stream_rows": config.STREAM_ROWS, **options}, sort_keys=True)
+
+
+def open_store(dry_run=False):
+    # --dry-run works on a throwaway store so it never disturbs a run
+    # waiting to be resumed.
+    return StagingStore(":memory:" if dry_run else config.STAGING_PATH)
+
+
+def open_state(store, dry_run=False):
+    state = load_state()
+    for table in ID_TABLES:
+        # Id maps used to live in the state file; the staging store keeps them now.
+        state.get(table, {}).pop("ids", None)
+    source = store
+    if dry_run and config.STAGING_PATH.exists():
+        # --dry-run resolves FKs from the ids cached by earlier runs so the
+        # row hashes it compares match what a real run would send.
+        source = StagingStore(config.STAGING_PATH)
+    try:
+        return state, {table: source.id_map(table) for table in ID_TABLES}
+    finally:
+        if source is not store:
+            source.close()
+
+
+def load_window(store, entity, state, id_maps, window=0, full=False, dry_run=False, since=None, transport="rest"):
+    table = TABLES[entity][0]
+    upload, resolve = TRANSPORTS[transport][:2]
+    rows = since_filter(store.rows(entity, window), since)
+    built = ROW_BUILDERS[entity](rows, id_maps, None if dry_run else resolve)
+    changed, hashes, counts = select_changed(table, built, state, full)
+    store.mark_changed(entity, changed, hashes)
+    if not dry_run:
+        pending = store.rows(entity, window, pending=True)
+        id_map = id_maps.get(table)
+        upload(table, pending, "external_id", id_map, on_batch=partial(store.acknowledge, entity, table, id_map))
+        store.mark_window(entity, window)
+    return {"rows": len(rows), **counts}
+
+
+def commit_entity(store, entity, state, id_maps, full=False, synced_at=None):
+    table = TABLES[entity][0]
+    hashes = store.loaded(entity)
+    if synced_at:
+        # Next --source api run asks only for what changed since this fetch.
+        state.setdefault(table, {})["api_synced_at"] = synced_at
+    commit_state(state, table, hashes, full)
+    for name, id_map in id_maps.items():
+        # Copied first: other tables may still be adding ids.
+        store.save_ids(name, dict(id_map))
+    store.mark_committed(entity)
+
+
+def add_counts(total, counts):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def print_counts(entity, counts):
+    print(
+        f"  {TABLES[entity][1]}: {counts.get('rows', 0)} filas -> {counts.get('new', 0)} nuevas, "
+        f"{counts.get('changed', 0)} modificadas, {counts.get('unchanged', 0)} sin cambios"
+    )
+
+
+def load_entity(store, entity, state, id_maps, full=False, dry_run=False, since=None, transport="rest", synced_at=None):
+    # Entities already committed by an interrupted run are only counted.
+    if store.is_committed(entity):
+        return {"rows": len(since_filter(store.rows(entity), since))}
+    if not dry_run:
+        print(f"Upsert {TABLES[entity][1]}...")
+    counts = load_window(store, entity, state, id_maps, 0, full, dry_run, since, transport)
+    if not dry_run:
+        commit_entity(store, entity, state, id_maps, full, synced_at)
+    return counts
+
+
+class LoadScheduler:
+    """Uploads each row as soon as the rows it references have ids, several tables at a time."""
+
+    def __init__(self, store, entities, state, id_maps, full=False, since=None, transport="rest", synced_at=None):
+        self.store = store
+        self.state = state
+        self.id_maps = id_maps
+        self.full = full
+        self.transport = transport
+        self.synced_at = synced_at
+        self.upload, self.resolve = TRANSPORTS[transport][:2]
+        self.events = queue.Queue()
+        self.summary = {}
+        self.rows = {}
+        self.ready = {}
+        self.blocked = {}
+        self.waiters = {}
+        self.running = set()
+        self.done = set()
+        for entity in entities:
+            if store.is_committed(entity):
+                # Committed by an interrupted run; its ids are in the id maps.
+                self.summary[entity] = {"rows": len(since_filter(store.rows(entity), since))}
+                self.done.add(entity)
+                print_counts(entity, self.summary[entity])
+            else:
+                self.rows[entity] = since_filter(store.rows(entity), since)
+                self.summary[entity] = {"rows": len(self.rows[entity])}
+        self.plan()
+
+    def plan(self):
+        # A reference to a row loaded in this run waits for that row's ack;
+        # anything else is looked up once, before the first upload.
+        keys = {entity: {row["external_id"] for row in rows} for entity, rows in self.rows.items()}
+        unknown = {}
+        for entity, rows in self.rows.items():
+            self.ready[entity] = []
+            self.blocked[entity] = {}
+            for index, row in enumerate(rows):
+                missing = 0
+                for column, parent in PARENTS.get(entity, {}).items():
+                    key = row.get(column)
+                    id_map = self.id_maps[TABLES[parent][0]]
+                    if not key or key in id_map:
+                        continue
+                    if key in keys.get(parent, ()):
+                        self.waiters.setdefault((parent, key), []).append((entity, index))
+                        missing += 1
+                    else:
+                        unknown.setdefault(parent, set()).add(key)
+                if missing:
+                    self.blocked[entity][index] = missing
+                else:
+                    self.ready[entity].append(row)
+        for parent, values in unknown.items():
+            table = TABLES[parent][0]
+            self.resolve(table, values, self.id_maps[table])
+
+    def release(self, parent, keys):
+        for key in keys:
+            for entity, index in self.waiters.pop((parent, key), ()):
+                self.blocked[entity][index] -= 1
+                if not self.blocked[entity][index]:
+                    del self.blocked[entity][index]
+                    self.ready[entity].append(self.rows[entity][index])
+
+    def dispatch(self, executor, entity):
+        # One upload per table at a time; rows released meanwhile go out
+        # together in the next one.
+        if entity in self.running or entity in self.done or not self.ready[entity]:
+            return
+        rows, self.ready[entity] = self.ready[entity], []
+        table = TABLES[entity][0]
+        built = ROW_BUILDERS[entity](rows, self.id_maps, None)
+        changed, hashes, counts = select_changed(table, built, self.state, self.full)
+        self.store.mark_changed(entity, changed, hashes)
+        add_counts(self.summary[entity], counts)
+        pending = self.store.pending_rows(entity, [row["external_id"] for row in rows])
+        sent = {row["external_id"] for row in pending}
+        settled = [row["external_id"] for row in rows if row["external_id"] not in sent]
+        # Rows not sent this time may predate the cached id map.
+        wanted = [key for key in settled if (entity, key) in self.waiters]
+        self.running.add(entity)
+        executor.submit(self.upload_rows, entity, pending, settled, wanted)
+
+    def upload_rows(self, entity, pending, settled, wanted):
+        table = TABLES[entity][0]
+        id_map = self.id_maps.get(table)
+        try:
+            if wanted:
+                self.resolve(table, wanted, id_map)
+            self.events.put(("ids", entity, settled))
+
+            def acknowledged(batch):
+                self.store.acknowledge(entity, table, id_map, batch)
+                self.events.put(("ids", entity, [row["external_id"] for row in batch]))
+
+            self.upload(table, pending, "external_id", id_map, on_batch=acknowledged)
+        except BaseException as exc:
+            self.events.put(("done", entity, exc))
+            raise
+        self.events.put(("done", entity, None))
+
+    def finish(self, entity):
+        if entity in self.done or entity in self.running or self.ready[entity] or self.blocked[entity]:
+            return False
+        commit_entity(self.store, entity, self.state, self.id_maps, self.full, self.synced_at)
+        self.done.add(entity)
+        print_counts(entity, self.summary[entity])
+        # Rows that never got an id (dead letters) stop holding back the
+        # rows that reference them; those load with an empty FK as before.
+        self.release(entity, [key for parent, key in list(self.waiters) if parent == entity])
+        return True
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=max(1, config.PARALLEL_TABLES)) as executor:
+            while True:
+                progress = True
+                while progress:
+                    progress = False
+                    for entity in self.rows:
+                        self.dispatch(executor, entity)
+                        progress = self.finish(entity) or progress
+                if all(entity in self.done for entity in self.rows):
+                    return self.summary
+                kind, entity, value = self.events.get()
+                if kind == "ids":
+                    self.release(entity, value)
+                    continue
+                self.running.discard(entity)
+                if value is not None:
+                    raise value
+
+
+def load_entities(store, entities, state, id_maps, full=False, dry_run=False, since=None, transport="rest", synced_at=None):
+    if dry_run:
+        summary = {}
+        for entity in entities:
+            summary[entity] = load_entity(store, entity, state, id_maps, full, dry_run, since, transport, synced_at)
+            print_counts(entity, summary[entity])
+        return summary
+    if entities:
+        print(f"Upsert {', '.join(TABLES[entity][1] for entity in entities)}...")
+    return LoadScheduler(store, entities, state, id_maps, full, since, transport, synced_at).run()
+
+
+def reconcile(store, entities, transport="rest"):
+    # Rows loaded by earlier runs that a full export no longer has were
+    # deleted in Pipedrive: they get deleted_at in a few in.() updates per
+    # table, and rows that come back are restored. Returns entity ->
+    # (deleted keys, restored keys).
+    fetch, mark = TRANSPORTS[transport][2:]
+    stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    found = {}
+    for entity in entities:
+        if not store.is_complete(entity):
+            continue
+        table, label = TABLES[entity]
+        remote = fetch(table)
+        present = store.present_keys(entity)
+        alive = [key for key, deleted in remote.items() if not deleted]
+        gone = sorted(key for key in alive if key not in present)
+        back = sorted(key for key, deleted in remote.items() if deleted and key in present)
+        if len(gone) > config.RECONCILE_MAX_RATIO * len(alive):
+            print(
+                f"Conciliacion {label}: faltan {len(gone)} de {len(alive)} filas en la exportacion; no se marcan "
+                f"como eliminadas (limite PIPEDRIVE_RECONCILE_MAX_RATIO={config.RECONCILE_MAX_RATIO})."
+            )
+            gone = []
+        if gone:
+            mark(table, gone, stamp)
+        if back:
+            mark(table, back, None)
+        print(f"Conciliacion {label}: {len(gone)} marcadas como eliminadas, {len(back)} restauradas")
+        found[entity] = (gone, back)
+    return found
+
+
+def retire_merged(merges, entities, transport="rest"):
+    # Merged duplicates loaded by an earlier run are still live rows in
+    # Supabase, though their references now point at the kept record; they
+    # get deleted_at like rows deleted in Pipedrive. Returns entity -> keys.
+    fetch, mark = TRANSPORTS[transport][2:]
+    stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    retired = {}
+    for entity in entities:
+        merged = merges.get(entity)
+        if not merged:
+            continue
+        table, label = TABLES[entity]
+        alive = sorted(key for key, deleted in fetch(table).items() if not deleted and key in merged)
+        if alive:
+            mark(table, alive, stamp)
+            print(f"Fusion {label}: {len(alive)} duplicados fusionados marcados como eliminados")
+        retired[entity] = alive
+    return retired
+
+
+def summary_backfill(store):
+    # Entities whose summaries have no facts yet (first run, rebuilt
+    # staging file) need every row once.
+    if not config.SUMMARIES:
+        return set()
+    pending = {summary.entity for summary in SUMMARIES.values()}
+    return pending - {summary.entity for table, summary in SUMMARIES.items() if store.has_facts(table)}
+
+
+def refresh_summaries(store, entities, transport="rest", deletions=None):
+    # Rows loaded in this run update their facts in the staging store; the
+    # groups they left or joined are aggregated again there and only groups
+    # whose values changed are upserted. deletions: reconcile()'s result.
+    upload = TRANSPORTS[transport][0]
+    now = local_now()
+    stamp = computed_at()
+    for table, summary in SUMMARIES.items():
+        dirty = set()
+        if summary.entity in entities:
+            source = store.loaded_rows if store.has_facts(table) else store.rows
+            for window in store.windows(summary.entity):
+                dirty |= store.update_facts(table, facts(summary, source(summary.entity, window)))
+        gone, back = (deletions or {}).get(summary.entity, ((), ()))
+        if gone:
+            dirty |= store.update_facts(table, ((key, None, None) for key in gone))
+        if back:
+            # Restored rows may be unchanged, so they were not loaded again.
+            dirty |= store.update_facts(table, facts(summary, store.rows_by_key(summary.entity, back)))
+        if summary.clock and store.has_facts(table):
+            dirty = None
+        elif not dirty:
+            continue
+        groups = store.summarize(table, summary.measures, dirty, now=now)
+        changed = store.stage_summaries(table, summary_rows(summary, groups))
+        pending = store.pending_summaries(table)
+        for row in pending:
+            row["computed_at"] = stamp
+        print(f"Resumen {table}: {changed} grupos actualizados")
+        upload(table, pending, "key", None, on_batch=partial(store.acknowledge_summaries, table))
+
+
+def extract(entity, input_dir=None, use_cache=True, source="files"):
+    if source == "api":
+        try:
+            return api.fetch_frames([entity])[entity]
+        finally:
+            api.close_api_pool()
+    return load_frame(find_file(FILES[entity], input_dir), use_cache)
+
+
+def load(rows_by_entity, full=False, dry_run=False, transport="rest"):
+    store = open_store(dry_run)
+    try:
+        store.begin(None, full, [TABLES[entity][0] for entity in rows_by_entity])
+        for entity, rows in rows_by_entity.items():
+            store.stage(entity, rows)
+        join_lookups(store, rows_by_entity)
+        state, id_maps = open_state(store, dry_run)
+        entities = [entity for entity in TABLES if entity in rows_by_entity]
+        for entity in entities:
+            check_references(store, entity, entities, id_maps, None if dry_run else TRANSPORTS[transport][1])
+        store.staged()
+        summary = load_entities(store, entities, state, id_maps, full, dry_run, transport=transport)
+        for entity, counts in write_rejects(store).items():
+            summary.setdefault(entity, {}).update(counts)
+        if not dry_run:
+            if config.SUMMARIES:
+                refresh_summaries(store, entities, transport)
+            store.finish()
+        return summary
+    finally:
+        close_pool()
+        postgres.close_connection()
+        store.close()
+
+
+def run(
+    only=None,
+    input_dir=None,
+    since=None,
+    dry_run=False,
+    full=False,
+    stream=False,
+    workers=None,
+    use_cache=True,
+    resume=True,
+    transport="rest",
+    source="files",
+    duplicates=None,
+    reconcile_deletions=False,
+    keep_connections=False,
+):
+    STATS.reset()
+    DEAD_LETTERS.clear()
+    selected = [entity for entity in ENTITY_SPECS if not only or entity in only]
+    needed = required_entities(selected)
+    merges = load_merge_map() if duplicates == "merge" else {}
+    if source == "api":
+        # The API is paged already, so --stream has nothing to bound.
+        paths = {}
+        streamed = []
+        signature = json.dumps(
+            {"source": "api", "only": selected, "since": since, "full": full, "duplicates": duplicates}, sort_keys=True
+        )
+    else:
+        paths = {entity: find_file(FILES[entity], input_dir) for entity in needed}
+        streamed = [entity for entity in selected if stream and entity in STREAMED_ENTITIES]
+        signature = run_signature(paths, only=selected, since=since, full=full, stream=stream, duplicates=duplicates)
+    resolve = TRANSPORTS[transport][1]
+    store = open_store(dry_run)
+    try:
+        if resume and store.resumable(signature):
+            print(f"Reanudando la importacion interrumpida desde {config.STAGING_PATH}.")
+        else:
+            store.begin(signature, full, [TABLES[entity][0] for entity in selected])
+            store.set_merges(merges)
+            if merges:
+                print(
+                    f"Fusionando duplicados segun {config.MERGE_MAP_PATH}: "
+                    f"{len(merges['organizations'])} organizaciones, {len(merges['people'])} personas."
+                )
+            with STATS.stage("extract"):
+                if source == "api":
+                    store.mark_fetched(datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+                    state = load_state()
+                    backfill = summary_backfill(store)
+                    updated_since = {
+                        entity: since
+                        or (None if full or entity in backfill else state.get(TABLES[entity][0], {}).get("api_synced_at"))
+                        for entity in needed
+                    }
+                    run_api_transforms(needed, store, updated_since)
+                    complete = [entity for entity in needed if not updated_since[entity]]
+                else:
+                    run_transforms(
+                        {entity: path for entity, path in paths.items() if entity not in streamed},
+                        store,
+                        use_cache=use_cache,
+                        workers=workers,
+                    )
+                    complete = needed
+                for entity in complete:
+                    store.mark_complete(entity)
+            if duplicates == "report":
+                report_duplicates(store, needed)
+            _, id_maps = open_state(store, dry_run)
+            with STATS.stage("check_references"):
+                for entity in selected:
+                    if entity not in streamed:
+                        check_references(store, entity, selected, id_maps, None if dry_run else resolve)
+            store.staged()
+        synced_at = store.fetched_at() if source == "api" else None
+        if streamed:
+            print(f"{' y '.join(TABLES[entity][1] for entity in streamed).capitalize()} en modo streaming (ventanas de {config.STREAM_ROWS} filas).")
+        if dry_run:
+            print("Modo --dry-run: no se escribe en Supabase ni en el estado local.")
+
+        state, id_maps = open_state(store, dry_run)
+        entities = [entity for entity in selected if entity not in streamed]
+        summary = load_entities(store, entities, state, id_maps, full, dry_run, since, transport, synced_at)
+        # Each window is staged, joined, diffed and upserted before the next
+        # one is read; windows acknowledged by an interrupted run are read
+        # but not transformed again.
+        for entity in streamed:
+            if not dry_run:
+                print(f"Upsert {TABLES[entity][1]}...")
+            counts = {}
+            if not store.is_committed(entity):
+                done = store.done_windows(entity)
+                for window, rows, rejects in stream_entity(entity, paths[entity], config.STREAM_ROWS, done):
+                    store.stage(entity, rows, window)
+                    store.reject(entity, rejects, window)
+                    store.apply_merges(entity, window)
+                    store.apply_lookups(entity, window)
+                    check_references(store, entity, selected, id_maps, None if dry_run else resolve, window)
+                    add_counts(counts, load_window(store, entity, state, id_maps, window, full, dry_run, since, transport))
+                if not dry_run:
+                    commit_entity(store, entity, state, id_maps, full)
+            summary[entity] = counts
+            print_counts(entity, counts)
+        if merges and not dry_run:
+            with STATS.stage("retire_merged"):
+                for entity, keys in retire_merged(merges, selected, transport).items():
+                    summary.setdefault(entity, {})["merged"] = len(keys)
+        deletions = {}
+        if reconcile_deletions and dry_run:
+            print("Modo --dry-run: la conciliacion de eliminados se omite (necesita consultar Supabase).")
+        elif reconcile_deletions:
+            with STATS.stage("reconcile"):
+                deletions = reconcile(store, selected, transport)
+            for entity, (gone, back) in deletions.items():
+                summary.setdefault(entity, {}).update({"deleted": len(gone), "restored": len(back)})
+        rejected = write_rejects(store)
+        for entity, counts in rejected.items():
+            summary.setdefault(entity, {}).update(counts)
+        if not dry_run:
+            if config.SUMMARIES:
+                refresh_summaries(store, selected, transport, deletions)
+            store.finish()
+    finally:
+        if not keep_connections:
+            close_pool()
+            api.close_api_pool()
+        # Connections are per loader thread, and those threads end with the
+        # run.
+        postgres.close_connection()
+        store.close()
+
+    if rejected:
+        parts = []
+        for entity, counts in rejected.items():
+            if counts.get("rejected"):
+                parts.append(f"{TABLES[entity][1]}: {counts['rejected']} filas rechazadas")
+            if counts.get("dropped_values"):
+                parts.append(f"{TABLES[entity][1]}: {counts['dropped_values']} filas con valores descartados")
+        print(f"Validacion ({', '.join(parts)}). Ver {config.REJECTS_PATH}")
+    if DEAD_LETTERS:
+        detail = ", ".join(f"{table}: {len(ids)}" for table, ids in DEAD_LETTERS.items())
+        print(f"Filas no importadas ({detail}). Ver {config.DEAD_LETTER_PATH}")
+    hits, misses = STATS.counters["normalizer_hits"], STATS.counters["normalizer_misses"]
+    print(f"Cache de normalizacion: {hits} aciertos, {misses} fallos")
+    return summary
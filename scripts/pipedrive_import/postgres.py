@@ -0,0 +1,164 @@
+import json
+import threading
+
+from . import config
+from .stats import STATS
+from .supabase import JSON_COLUMNS, compact, write_dead_letter
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+# tests/test_postgres.py runs this module against a throwaway Postgres
+# (PIPEDRIVE_TEST_DB_URL, or a local server started with pgserver).
+
+# Rows per COPY + merge transaction; each one is a resume checkpoint.
+COPY_BATCH = 50000
+# CSV lines handed to psycopg per write call.
+COPY_CHUNK = 1000
+# One connection per loader thread; tables load in parallel.
+_LOCAL = threading.local()
+_CONNS = []
+_CONNS_LOCK = threading.Lock()
+
+
+def require():
+    if psycopg is None:
+        raise SystemExit('psycopg no esta instalado (pip install "psycopg[binary]").')
+    if not config.DATABASE_URL:
+        raise SystemExit("Falta SUPABASE_DB_URL en el entorno para --transport copy.")
+
+
+def connection():
+    require()
+    conn = getattr(_LOCAL, "conn", None)
+    if conn is None or conn.closed:
+        conn = _LOCAL.conn = psycopg.connect(config.DATABASE_URL, autocommit=True)
+        with _CONNS_LOCK:
+            _CONNS.append(conn)
+    return conn
+
+
+def close_connection():
+    global _LOCAL
+    with _CONNS_LOCK:
+        for conn in _CONNS:
+            conn.close()
+        _CONNS.clear()
+        _LOCAL = threading.local()
+
+
+def column_types(cur, table):
+    cur.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s",
+        (table,),
+    )
+    return dict(cur.fetchall())
+
+
+def pg_array(values):
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        else:
+            items.append('"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+def csv_value(value, data_type):
+    # Unquoted empty fields are NULL in COPY's CSV format and quoted ones
+    # are empty strings, so every non-null value is quoted.
+    if value is None:
+        return ""
+    if data_type == "ARRAY" and isinstance(value, (list, tuple)):
+        text = pg_array(value)
+    elif isinstance(value, (dict, list, tuple)):
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    elif isinstance(value, bool):
+        text = "true" if value else "false"
+    else:
+        text = str(value)
+    return '"' + text.replace('"', '""') + '"'
+
+
+def csv_lines(rows, columns, types):
+    for row in rows:
+        yield ",".join(csv_value(row.get(column), types.get(column)) for column in columns) + "\n"
+
+
+def copy_batch(cur, table, batch, columns, types, conflict, returning=True):
+    names = ", ".join(f'"{column}"' for column in columns)
+    updates = ", ".join(f'"{column}" = excluded."{column}"' for column in columns if column != conflict)
+    cur.execute(f'CREATE TEMP TABLE pipedrive_stage (LIKE public."{table}" INCLUDING DEFAULTS) ON COMMIT DROP')
+    with cur.copy(f"COPY pipedrive_stage ({names}) FROM STDIN WITH (FORMAT csv)") as copy:
+        lines = []
+        for line in csv_lines(batch, columns, types):
+            lines.append(line)
+            if len(lines) == COPY_CHUNK:
+                copy.write("".join(lines))
+                lines = []
+        if lines:
+            copy.write("".join(lines))
+    merge = (
+        f'INSERT INTO public."{table}" ({names}) SELECT {names} FROM pipedrive_stage '
+        f'ON CONFLICT ("{conflict}") DO UPDATE SET {updates}'
+    )
+    if not returning:
+        # Summary tables have no id column.
+        cur.execute(merge)
+        return []
+    cur.execute(f'{merge} RETURNING id, "{conflict}"')
+    return cur.fetchall()
+
+
+def copy_rows(table, rows, conflict, id_map=None, on_batch=None):
+    # Same contract as supabase.upsert_rows: COPY into a temp table, then
+    # one INSERT ... ON CONFLICT per batch.
+    if not rows:
+        return
+    conn = connection()
+    rows = [{key: compact(value) if key in JSON_COLUMNS else value for key, value in row.items()} for row in rows]
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with STATS.stage(f"copy {table}", len(rows)):
+        with conn.cursor() as cur:
+            types = column_types(cur, table)
+        for start in range(0, len(rows), COPY_BATCH):
+            batch = rows[start : start + COPY_BATCH]
+            try:
+                with conn.transaction(), conn.cursor() as cur:
+                    returned = copy_batch(cur, table, batch, columns, types, conflict, id_map is not None)
+            except psycopg.Error as exc:
+                write_dead_letter(table, batch, exc)
+                continue
+            STATS.count(copy_batches=1)
+            if id_map is not None:
+                id_map.update((str(key), str(row_id)) for row_id, key in returned if key)
+            if on_batch is not None:
+                on_batch(batch)
+
+
+def resolve_ids(table, external_ids, id_map):
+    missing = sorted({key for key in external_ids if key and key not in id_map})
+    if not missing:
+        return id_map
+    with STATS.stage(f"resolve_ids {table}", len(missing)), connection().cursor() as cur:
+        cur.execute(f'SELECT external_id, id FROM public."{table}" WHERE external_id = ANY(%s)', (missing,))
+        id_map.update((str(key), str(row_id)) for key, row_id in cur)
+    return id_map
+
+
+def fetch_keys(table):
+    with STATS.stage(f"fetch_keys {table}") as entry, connection().cursor() as cur:
+        cur.execute(f'SELECT external_id, deleted_at IS NOT NULL FROM public."{table}" WHERE external_id IS NOT NULL')
+        keys = {str(key): deleted for key, deleted in cur}
+        entry["rows"] = len(keys)
+    return keys
+
+
+def mark_deleted(table, external_ids, deleted_at):
+    with STATS.stage(f"mark_deleted {table}", len(external_ids)), connection().cursor() as cur:
+        cur.execute(
+            f'UPDATE public."{table}" SET deleted_at = %s WHERE external_id = ANY(%s)', (deleted_at, sorted(external_ids))
+        )
@@ -0,0 +1,122 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = None
+
+FILES = {
+    "organizations": "organizations-*",
+    "people": "people-*",
+    "deals": "deals-*",
+    "activities": "activities-*",
+    "notes": "notes-*",
+}
+SOURCE_SUFFIXES = (".xlsx", ".csv")
+
+
+def newest_file(pattern, input_dir=None):
+    # Exports pile up in the input directory; the last one written wins.
+    matches = [path for path in Path(input_dir or config.INPUT_DIR).glob(pattern) if path.suffix.lower() in SOURCE_SUFFIXES]
+    if not matches:
+        return None
+    return max(matches, key=lambda path: (path.stat().st_mtime_ns, path.name))
+
+
+def find_file(pattern, input_dir=None):
+    path = newest_file(pattern, input_dir)
+    if path is None:
+        raise SystemExit(f"No se encontro archivo para patron {pattern}")
+    return path
+
+
+def read_source(path):
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path, float_precision="round_trip")
+    return pd.read_excel(path)
+
+
+def load_frame(path, use_cache=True):
+    # Parsed exports are cached as uncompressed Arrow IPC files keyed by
+    # path, size and mtime, and memory-mapped on later runs. Frames with
+    # mixed-type object columns that Arrow cannot represent are pickled.
+    if not use_cache or pa is None:
+        return read_source(path)
+    stat = path.stat()
+    prefix = hashlib.blake2b(str(path.resolve()).encode("utf-8"), digest_size=6).hexdigest()
+    key = hashlib.blake2b(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"), digest_size=6).hexdigest()
+    arrow_path = config.CACHE_DIR / f"{path.stem}-{prefix}-{key}.arrow"
+    pickle_path = config.CACHE_DIR / f"{path.stem}-{prefix}-{key}.pkl"
+    if arrow_path.exists():
+        return feather.read_table(arrow_path, memory_map=True).to_pandas()
+    if pickle_path.exists():
+        return pd.read_pickle(pickle_path)
+    df = read_source(path)
+    config.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for stale in config.CACHE_DIR.glob(f"{path.stem}-{prefix}-*"):
+        stale.unlink()
+    tmp_path = arrow_path.with_suffix(".tmp")
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        tmp_path.replace(arrow_path)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        tmp_path.unlink(missing_ok=True)
+        df.to_pickle(pickle_path)
+    return df
+
+
+def excel_cell(cell):
+    # Same conversion pandas applies to openpyxl cells in read_excel.
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        number = int(cell.value)
+        return number if number == cell.value else float(cell.value)
+    return cell.value
+
+
+def iter_xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    book = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()
+        for row in sheet.rows:
+            values = [excel_cell(cell) for cell in row]
+            while values and values[-1] == "":
+                values.pop()
+            yield values
+    finally:
+        book.close()
+
+
+def iter_frames(path, size=5000):
+    # Yields the export as frames of at most `size` rows without ever
+    # holding the whole sheet in memory.
+    if path.suffix.lower() == ".csv":
+        yield from pd.read_csv(path, float_precision="round_trip", chunksize=size)
+        return
+    rows = iter_xlsx_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+    window = []
+    for values in rows:
+        if not values:
+            continue
+        window.append(values + [""] * (len(header) - len(values)))
+        if len(window) >= size:
+            yield pd.io.parsers.TextParser([header, *window], header=0).read()
+            window = []
+    if window:
+        yield pd.io.parsers.TextParser([header, *window], header=0).read()
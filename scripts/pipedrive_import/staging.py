@@ -0,0 +1,544 @@
+import json
+import sqlite3
+import threading
+
+from .entities import ENTITY_SPECS, LOOKUPS, PARENTS, Ref
+from .stats import STATS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS staged_rows (
+    entity TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    payload TEXT,
+    hash TEXT,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity, external_id)
+);
+CREATE INDEX IF NOT EXISTS staged_rows_window ON staged_rows (entity, window);
+CREATE INDEX IF NOT EXISTS staged_rows_pending ON staged_rows (entity, pending) WHERE pending = 1;
+CREATE TABLE IF NOT EXISTS windows (
+    entity TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    PRIMARY KEY (entity, window)
+);
+CREATE TABLE IF NOT EXISTS id_map (
+    tbl TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (tbl, external_id)
+);
+CREATE TABLE IF NOT EXISTS lookups (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS merges (
+    entity TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    keep TEXT NOT NULL,
+    PRIMARY KEY (entity, external_id)
+);
+CREATE TABLE IF NOT EXISTS rejects (
+    entity TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    dropped TEXT NOT NULL,
+    reasons TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rejects_window ON rejects (entity, window, stage);
+CREATE TABLE IF NOT EXISTS summary_facts (
+    tbl TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (tbl, external_id)
+);
+CREATE INDEX IF NOT EXISTS summary_facts_key ON summary_facts (tbl, key);
+CREATE TABLE IF NOT EXISTS summary_rows (
+    tbl TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    pending INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tbl, key)
+);
+"""
+# Bumped whenever SCHEMA changes; staged data is disposable, so an older
+# file is simply rebuilt.
+SCHEMA_VERSION = 6
+# Rows sent per SQLite statement when acknowledging a batch.
+ACK_CHUNK = 500
+
+
+class StagingStore:
+    """SQLite file with a run's transformed rows, id maps and upload checkpoints."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript(
+                "DROP TABLE IF EXISTS run; DROP TABLE IF EXISTS staged_rows; "
+                "DROP TABLE IF EXISTS windows; DROP TABLE IF EXISTS id_map; DROP TABLE IF EXISTS lookups; DROP TABLE IF EXISTS merges; "
+                "DROP TABLE IF EXISTS rejects; DROP TABLE IF EXISTS summary_facts; DROP TABLE IF EXISTS summary_rows;"
+            )
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _get(self, key):
+        row = self._db.execute("SELECT value FROM run WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO run (key, value) VALUES (?, ?)", (key, value))
+
+    def resumable(self, signature):
+        return self._get("status") == "loading" and self._get("signature") == signature
+
+    def begin(self, signature, full=False, tables=None):
+        # --full forgets the cached ids of the tables it reloads (all of
+        # them unless given); the other tables keep theirs.
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM staged_rows")
+            self._db.execute("DELETE FROM windows")
+            self._db.execute("DELETE FROM rejects")
+            self._db.execute("DELETE FROM run")
+            if full and tables is None:
+                self._db.execute("DELETE FROM id_map")
+            elif full:
+                self._db.executemany("DELETE FROM id_map WHERE tbl = ?", ((table,) for table in tables))
+            self._set("signature", signature)
+            self._set("status", "staging")
+            self._db.execute("COMMIT")
+
+    def staged(self):
+        with self._lock:
+            self._set("status", "loading")
+
+    def finish(self):
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM staged_rows")
+            self._db.execute("DELETE FROM windows")
+            self._set("status", "done")
+            self._db.execute("COMMIT")
+
+    def fetched_at(self):
+        return self._get("fetched_at")
+
+    def mark_fetched(self, stamp):
+        with self._lock:
+            self._set("fetched_at", stamp)
+
+    def is_committed(self, entity):
+        return self._get(f"committed {entity}") is not None
+
+    def mark_committed(self, entity):
+        with self._lock:
+            self._set(f"committed {entity}", "1")
+
+    def is_complete(self, entity):
+        return self._get(f"complete {entity}") is not None
+
+    def mark_complete(self, entity):
+        # The entity was staged from a full export, so a row missing from it
+        # was deleted in Pipedrive.
+        with self._lock:
+            self._set(f"complete {entity}", "1")
+
+    def done_windows(self, entity):
+        with self._lock:
+            return {window for window, in self._db.execute("SELECT window FROM windows WHERE entity = ?", (entity,))}
+
+    def mark_window(self, entity, window):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO windows (entity, window) VALUES (?, ?)", (entity, window))
+
+    def stage(self, entity, rows, window=0):
+        with STATS.stage(f"stage {entity}", len(rows)), self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                # A resumed run stages a half-loaded window again: its rows
+                # keep what was acknowledged. A repeated external_id from
+                # another window replaces the row as before.
+                "INSERT INTO staged_rows (entity, external_id, window, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (entity, external_id) DO UPDATE SET data = excluded.data, "
+                "payload = iif(window = excluded.window, payload, NULL), hash = iif(window = excluded.window, hash, NULL), "
+                "pending = iif(window = excluded.window, pending, 0), window = excluded.window",
+                (
+                    (entity, row["external_id"], window, json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+                    for row in rows
+                ),
+            )
+            self._db.execute("COMMIT")
+
+    def reject(self, entity, rejects, window=0, stage="rules"):
+        # rejects: {"external_id", "dropped", "reasons", "row"} per row kept
+        # out of the load or loaded without a value. A window transformed
+        # again on resume replaces its rejects.
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM rejects WHERE entity = ? AND window = ? AND stage = ?", (entity, window, stage))
+            self._db.executemany(
+                "INSERT INTO rejects (entity, window, stage, external_id, dropped, reasons, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        entity,
+                        window,
+                        stage,
+                        item["external_id"],
+                        item["dropped"],
+                        json.dumps(item["reasons"], ensure_ascii=False),
+                        json.dumps(item["row"], ensure_ascii=False, separators=(",", ":")),
+                    )
+                    for item in rejects
+                ),
+            )
+            self._db.execute("COMMIT")
+        STATS.count(rejected_rows=sum(item["dropped"] == "row" for item in rejects))
+
+    def unknown_references(self, entity, column, parent, window=0, staged=True):
+        # (external_id, key) of the rows whose column points at a parent row
+        # not staged in this run (any row, when staged is False).
+        query = f"""
+            SELECT r.external_id, json_extract(r.data, '$.{column}') FROM staged_rows AS r
+            WHERE r.entity = ? AND r.window = ? AND coalesce(json_extract(r.data, '$.{column}'), '') != ''
+        """
+        params = (entity, window)
+        if staged:
+            query += (
+                "AND NOT EXISTS (SELECT 1 FROM staged_rows AS p "
+                f"WHERE p.entity = ? AND p.external_id = json_extract(r.data, '$.{column}'))"
+            )
+            params += (parent,)
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def reject_staged(self, entity, found, window=0):
+        # found: external_id -> reasons. The rows move from the load to the
+        # rejects.
+        rejects = []
+        with self._lock:
+            for external_id, reasons in found.items():
+                row = self._db.execute(
+                    "SELECT data FROM staged_rows WHERE entity = ? AND external_id = ?", (entity, external_id)
+                ).fetchone()
+                rejects.append({"external_id": external_id, "dropped": "row", "reasons": reasons, "row": json.loads(row[0])})
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "DELETE FROM staged_rows WHERE entity = ? AND external_id = ?", ((entity, key) for key in found)
+            )
+            self._db.execute("COMMIT")
+        self.reject(entity, rejects, window, "references")
+
+    def rejects(self):
+        with self._lock:
+            cursor = self._db.execute("SELECT entity, external_id, dropped, reasons, data FROM rejects ORDER BY rowid")
+            return [
+                {
+                    "entity": entity,
+                    "external_id": external_id,
+                    "dropped": dropped,
+                    "reasons": json.loads(reasons),
+                    "row": json.loads(data),
+                }
+                for entity, external_id, dropped, reasons, data in cursor
+            ]
+
+    def set_merges(self, merges):
+        # merges: entity -> {duplicate external_id: surviving external_id}.
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM merges")
+            self._db.executemany(
+                "INSERT INTO merges (entity, external_id, keep) VALUES (?, ?, ?)",
+                ((entity, key, keep) for entity, mapping in merges.items() for key, keep in mapping.items()),
+            )
+            self._db.execute("COMMIT")
+
+    def apply_merges(self, entity, window=0):
+        # Merged duplicates are not loaded and references to them point at
+        # the surviving row.
+        with self._lock:
+            if not self._db.execute("SELECT 1 FROM merges LIMIT 1").fetchone():
+                return
+        with STATS.stage(f"merges {entity}"), self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "DELETE FROM staged_rows WHERE entity = ? AND window = ? "
+                "AND external_id IN (SELECT external_id FROM merges WHERE entity = ?)",
+                (entity, window, entity),
+            )
+            for column, parent in PARENTS.get(entity, {}).items():
+                self._db.execute(
+                    f"""
+                    UPDATE staged_rows AS r
+                    SET data = json_set(r.data, '$.{column}', m.keep)
+                    FROM merges AS m
+                    WHERE r.entity = ? AND r.window = ?
+                      AND m.entity = ? AND m.external_id = json_extract(r.data, '$.{column}')
+                    """,
+                    (entity, window, parent),
+                )
+            self._db.execute("COMMIT")
+
+    def refresh_lookups(self, entity):
+        # Lookup values outlive the run: an incremental API fetch only
+        # stages the providers that changed, so the rest come from here.
+        provided = {name: value for name, (provider, value) in LOOKUPS.items() if provider == entity}
+        if not provided:
+            return
+        with STATS.stage(f"refresh_lookups {entity}"), self._lock:
+            self._db.execute("BEGIN")
+            for name, value in provided.items():
+                self._db.execute(
+                    f"""
+                    INSERT OR REPLACE INTO lookups (name, key, value)
+                    SELECT ?, external_id, json_extract(data, '$.{value}') FROM staged_rows WHERE entity = ?
+                    """,
+                    (name, entity),
+                )
+            self._db.execute("COMMIT")
+
+    def apply_lookups(self, entity, window=0):
+        # Same first-filled semantics as entities.apply_lookups: each Ref via
+        # a lookup only fills targets still empty after the previous ones,
+        # joined against the lookup values by external_id.
+        with STATS.stage(f"lookups {entity}"), self._lock:
+            self._db.execute("BEGIN")
+            for item in ENTITY_SPECS[entity]["fields"]:
+                for source in item.sources:
+                    if not (isinstance(source, Ref) and source.via):
+                        continue
+                    self._db.execute(
+                        f"""
+                        UPDATE staged_rows AS r
+                        SET data = json_set(r.data, '$.{item.target}', l.value)
+                        FROM lookups AS l
+                        WHERE r.entity = ? AND r.window = ?
+                          AND coalesce(json_extract(r.data, '$.{item.target}'), '') = ''
+                          AND l.name = ? AND l.key = json_extract(r.data, '$.{source.field}')
+                          AND coalesce(l.value, '') != ''
+                        """,
+                        (entity, window, source.via),
+                    )
+            self._db.execute("COMMIT")
+
+    def rows(self, entity, window=0, pending=False):
+        # Pending rows come back as the final payload, FK ids included.
+        query = "SELECT data FROM staged_rows WHERE entity = ? AND window = ?"
+        if pending:
+            query = "SELECT payload FROM staged_rows WHERE entity = ? AND window = ? AND pending = 1"
+        with self._lock:
+            cursor = self._db.execute(query + " ORDER BY rowid", (entity, window))
+            return [json.loads(data) for data, in cursor]
+
+    def pending_rows(self, entity, external_ids):
+        # Final payloads still waiting for upload among these rows.
+        rows = []
+        with self._lock:
+            for start in range(0, len(external_ids), ACK_CHUNK):
+                chunk = external_ids[start : start + ACK_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                cursor = self._db.execute(
+                    f"SELECT payload FROM staged_rows WHERE entity = ? AND pending = 1 AND external_id IN ({marks})",
+                    (entity, *chunk),
+                )
+                rows.extend(json.loads(data) for data, in cursor)
+        return rows
+
+    def rows_by_key(self, entity, external_ids):
+        rows = []
+        with self._lock:
+            for start in range(0, len(external_ids), ACK_CHUNK):
+                chunk = external_ids[start : start + ACK_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                cursor = self._db.execute(
+                    f"SELECT data FROM staged_rows WHERE entity = ? AND external_id IN ({marks})", (entity, *chunk)
+                )
+                rows.extend(json.loads(data) for data, in cursor)
+        return rows
+
+    def present_keys(self, entity):
+        # Every row of the export, rejected ones included: a row that failed
+        # validation is still there in Pipedrive. Merged duplicates are not:
+        # they stay deleted (see pipeline.retire_merged).
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT external_id FROM staged_rows WHERE entity = ? UNION SELECT external_id FROM rejects WHERE entity = ?",
+                (entity, entity),
+            )
+            return {key for key, in cursor}
+
+    def mark_changed(self, entity, rows, hashes):
+        # Rows marked by an interrupted run keep their pending flag, so a
+        # resumed run does not resend what was already acknowledged.
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE staged_rows SET payload = ?, hash = ?, pending = 1 "
+                "WHERE entity = ? AND external_id = ? AND hash IS NULL",
+                (
+                    (
+                        json.dumps(row, ensure_ascii=False, separators=(",", ":")),
+                        hashes[row["external_id"]],
+                        entity,
+                        row["external_id"],
+                    )
+                    for row in rows
+                ),
+            )
+            self._db.execute("COMMIT")
+
+    def acknowledge(self, entity, table, id_map, batch):
+        external_ids = [row["external_id"] for row in batch]
+        with self._lock:
+            self._db.execute("BEGIN")
+            for start in range(0, len(external_ids), ACK_CHUNK):
+                chunk = external_ids[start : start + ACK_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                self._db.execute(
+                    f"UPDATE staged_rows SET pending = 0 WHERE entity = ? AND external_id IN ({marks})",
+                    (entity, *chunk),
+                )
+            if id_map is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO id_map (tbl, external_id, id) VALUES (?, ?, ?)",
+                    ((table, key, id_map[key]) for key in external_ids if key in id_map),
+                )
+            self._db.execute("COMMIT")
+        STATS.count(checkpoints=1)
+
+    def loaded(self, entity):
+        # Hashes of the rows acknowledged in this run.
+        query = "SELECT external_id, hash FROM staged_rows WHERE entity = ? AND hash IS NOT NULL AND pending = 0"
+        with self._lock:
+            return dict(self._db.execute(query, (entity,)))
+
+    def id_map(self, table):
+        with self._lock:
+            cursor = self._db.execute("SELECT external_id, id FROM id_map WHERE tbl = ?", (table,))
+            return dict(cursor)
+
+    def save_ids(self, table, id_map):
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO id_map (tbl, external_id, id) VALUES (?, ?, ?)",
+                ((table, key, value) for key, value in id_map.items()),
+            )
+            self._db.execute("COMMIT")
+
+    def windows(self, entity):
+        with self._lock:
+            cursor = self._db.execute("SELECT DISTINCT window FROM staged_rows WHERE entity = ? ORDER BY window", (entity,))
+            return [window for window, in cursor]
+
+    def loaded_rows(self, entity, window=0):
+        # Transformed rows acknowledged in this run, merges and lookups applied.
+        query = (
+            "SELECT data FROM staged_rows WHERE entity = ? AND window = ? "
+            "AND hash IS NOT NULL AND pending = 0 ORDER BY rowid"
+        )
+        with self._lock:
+            return [json.loads(data) for data, in self._db.execute(query, (entity, window))]
+
+    def has_facts(self, table):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM summary_facts WHERE tbl = ? LIMIT 1", (table,)).fetchone() is not None
+
+    def update_facts(self, table, facts):
+        # facts: (external_id, group key or None, data) per row. Facts outlive
+        # the run, so each one only changes when its row does; returns the
+        # groups the rows left or joined.
+        facts = list(facts)
+        dirty = {key for _, key, _ in facts if key is not None}
+        with STATS.stage(f"facts {table}", len(facts)), self._lock:
+            self._db.execute("BEGIN")
+            for start in range(0, len(facts), ACK_CHUNK):
+                chunk = [external_id for external_id, _, _ in facts[start : start + ACK_CHUNK]]
+                marks = ",".join("?" * len(chunk))
+                cursor = self._db.execute(
+                    f"SELECT key FROM summary_facts WHERE tbl = ? AND external_id IN ({marks})", (table, *chunk)
+                )
+                dirty.update(key for key, in cursor)
+            self._db.executemany(
+                "DELETE FROM summary_facts WHERE tbl = ? AND external_id = ?",
+                ((table, external_id) for external_id, key, _ in facts if key is None),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO summary_facts (tbl, external_id, key, data) VALUES (?, ?, ?, ?)",
+                ((table, *item) for item in facts if item[1] is not None),
+            )
+            self._db.execute("COMMIT")
+        return dirty
+
+    def summarize(self, table, measures, keys=None, **params):
+        # Aggregates the facts of the given groups (every group when keys is
+        # None); a group left without facts gets the aggregates of no rows.
+        select = ", ".join(measures.values())
+        params["tbl"] = table
+        found = []
+        with STATS.stage(f"summarize {table}"), self._lock:
+            if keys is None:
+                query = f"SELECT key, {select} FROM summary_facts WHERE tbl = :tbl GROUP BY key"
+                found.extend(self._db.execute(query, params))
+            else:
+                keys = sorted(keys)
+                for start in range(0, len(keys), ACK_CHUNK):
+                    chunk = {f"k{index}": key for index, key in enumerate(keys[start : start + ACK_CHUNK])}
+                    marks = ",".join(f":{name}" for name in chunk)
+                    query = f"SELECT key, {select} FROM summary_facts WHERE tbl = :tbl AND key IN ({marks}) GROUP BY key"
+                    found.extend(self._db.execute(query, {**params, **chunk}))
+            empty = self._db.execute(f"SELECT {select} FROM summary_facts WHERE 0", params).fetchone()
+        groups = {key: dict(zip(measures, empty)) for key in keys or ()}
+        groups.update((key, dict(zip(measures, values))) for key, *values in found)
+        return groups
+
+    def stage_summaries(self, table, rows):
+        # rows: group key -> summary row. Only groups whose values differ
+        # from the last ones staged are marked for upload.
+        with self._lock:
+            known = dict(self._db.execute("SELECT key, data FROM summary_rows WHERE tbl = ?", (table,)))
+            changed = []
+            for key, row in rows.items():
+                data = json.dumps(row, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+                if known.get(key) != data:
+                    changed.append((table, key, data))
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO summary_rows (tbl, key, data, pending) VALUES (?, ?, ?, 1)", changed
+            )
+            self._db.execute("COMMIT")
+        return len(changed)
+
+    def pending_summaries(self, table):
+        with self._lock:
+            cursor = self._db.execute("SELECT key, data FROM summary_rows WHERE tbl = ? AND pending = 1 ORDER BY key", (table,))
+            return [{"key": key, **json.loads(data)} for key, data in cursor]
+
+    def acknowledge_summaries(self, table, batch):
+        keys = [row["key"] for row in batch]
+        with self._lock:
+            self._db.execute("BEGIN")
+            for start in range(0, len(keys), ACK_CHUNK):
+                chunk = keys[start : start + ACK_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                self._db.execute(f"UPDATE summary_rows SET pending = 0 WHERE tbl = ? AND key IN ({marks})", (table, *chunk))
+            self._db.execute("COMMIT")
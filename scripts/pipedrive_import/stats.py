@@ -0,0 +1,111 @@
+import bisect
+import contextlib
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    usage = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return round(usage / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+class RunStats:
+    """Stage timers, counters and HTTP latency histograms for one import run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = Counter()
+            self.latency = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        entry = {"rows": rows}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            self.add_stage(name, time.perf_counter() - started, entry["rows"])
+
+    def add_stage(self, name, seconds, rows=0, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "rows": 0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["rows"] += rows
+            entry["calls"] += calls
+
+    def count(self, **values):
+        with self._lock:
+            self.counters.update(values)
+
+    def observe_request(self, key, seconds):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            histogram = self.latency.setdefault(
+                key, {"count": 0, "seconds": 0.0, "max": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            )
+            histogram["count"] += 1
+            histogram["seconds"] += seconds
+            histogram["max"] = max(histogram["max"], seconds)
+            histogram["buckets"][bucket] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"stages": {name: dict(entry) for name, entry in self.stages.items()}, "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        for name, entry in snapshot["stages"].items():
+            self.add_stage(name, entry["seconds"], entry["rows"], entry["calls"])
+        self.count(**snapshot["counters"])
+
+    def report(self):
+        with self._lock:
+            stages = {
+                name: {
+                    "seconds": round(entry["seconds"], 3),
+                    "rows": entry["rows"],
+                    "calls": entry["calls"],
+                    "rows_per_second": round(entry["rows"] / entry["seconds"], 1) if entry["seconds"] else None,
+                }
+                for name, entry in self.stages.items()
+            }
+            http = {
+                key: {
+                    "count": histogram["count"],
+                    "mean_ms": round(1000 * histogram["seconds"] / histogram["count"], 1),
+                    "max_ms": round(1000 * histogram["max"], 1),
+                    "buckets": dict(
+                        zip([f"le_{bound}s" for bound in LATENCY_BUCKETS] + ["inf"], histogram["buckets"])
+                    ),
+                }
+                for key, histogram in self.latency.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "stages": stages,
+            "counters": counters,
+            "http": http,
+            "peak_rss_mb": {
+                "main": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+                "workers": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            },
+        }
+
+
+STATS = RunStats()
@@ -0,0 +1,137 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from . import config
+
+# entity: staged rows it is built from; dimensions: columns of the group
+# key; fact: row -> (dimension values, measure inputs) or None to leave the
+# row out; measures: SQLite aggregates over the facts' JSON data;
+# clock: depends on the current time, so every group is recomputed each run.
+Summary = namedtuple("Summary", ["entity", "dimensions", "fact", "measures", "clock"], defaults=(False,))
+
+WON = {"ganado", "won"}
+LOST = {"perdido", "lost"}
+
+
+def month(*values):
+    for value in values:
+        if value:
+            return str(value)[:7]
+    return None
+
+
+def deal_outcome(row):
+    status = (row.get("status") or "").strip().lower()
+    if status in WON:
+        return "won"
+    if status in LOST:
+        return "lost"
+    return "open"
+
+
+def pipeline_fact(row):
+    # Open deals count in the month they are expected to close, closed ones
+    # in the month they closed.
+    closed = deal_outcome(row) != "open"
+    dimensions = (
+        row.get("pipeline") or None,
+        row.get("stage") or None,
+        row.get("status") or None,
+        row.get("owner") or None,
+        row.get("currency") or None,
+        month(row.get("close_date") if closed else row.get("expected_close_date"), row.get("created_at")),
+    )
+    return dimensions, {"value": row.get("value"), "weighted_value": row.get("weighted_value")}
+
+
+def win_loss_fact(row):
+    outcome = deal_outcome(row)
+    if outcome == "open":
+        return None
+    dimensions = (
+        row.get("owner") or None,
+        month(row.get("close_date"), row.get("updated_at")),
+        outcome,
+        (row.get("lost_reason") or None) if outcome == "lost" else None,
+        row.get("currency") or None,
+    )
+    return dimensions, {"value": row.get("value")}
+
+
+def activity_fact(row):
+    return (row.get("owner") or None,), {"done": int(row.get("outcome") == "completada"), "due_at": row.get("due_at")}
+
+
+PENDING = "json_extract(data, '$.done') = 0"
+# now is cut to the due date's length: an activity due on a day without a
+# time is overdue from the next day on.
+OVERDUE = f"{PENDING} AND json_extract(data, '$.due_at') < substr(:now, 1, length(json_extract(data, '$.due_at')))"
+
+SUMMARIES = {
+    "crm_pipeline_summary": Summary(
+        "deals",
+        ("pipeline", "stage", "status", "owner", "currency", "month"),
+        pipeline_fact,
+        {
+            "deals": "count(*)",
+            "value": "round(coalesce(sum(json_extract(data, '$.value')), 0), 2)",
+            "weighted_value": "round(coalesce(sum(json_extract(data, '$.weighted_value')), 0), 2)",
+        },
+    ),
+    "crm_win_loss_summary": Summary(
+        "deals",
+        ("owner", "month", "outcome", "lost_reason", "currency"),
+        win_loss_fact,
+        {
+            "deals": "count(*)",
+            "value": "round(coalesce(sum(json_extract(data, '$.value')), 0), 2)",
+        },
+    ),
+    "crm_activity_summary": Summary(
+        "activities",
+        ("owner",),
+        activity_fact,
+        {
+            "pending": f"coalesce(sum({PENDING}), 0)",
+            "overdue": f"coalesce(sum({OVERDUE}), 0)",
+            "completed": "coalesce(sum(json_extract(data, '$.done')), 0)",
+            "oldest_overdue_at": f"min(CASE WHEN {OVERDUE} THEN json_extract(data, '$.due_at') END)",
+        },
+        clock=True,
+    ),
+}
+
+
+def group_key(dimensions):
+    return json.dumps(dimensions, ensure_ascii=False, separators=(",", ":"))
+
+
+def facts(summary, rows):
+    # (external_id, group key or None, measure inputs as JSON) per row.
+    for row in rows:
+        item = summary.fact(row)
+        if item is None:
+            yield row["external_id"], None, None
+        else:
+            dimensions, data = item
+            yield row["external_id"], group_key(dimensions), json.dumps(data, separators=(",", ":"))
+
+
+def summary_rows(summary, groups):
+    # groups: group key -> measures; the dimension columns come back out of
+    # the key.
+    return {
+        key: {**dict(zip(summary.dimensions, json.loads(key))), **measures}
+        for key, measures in groups.items()
+    }
+
+
+def local_now():
+    # Due dates are stored in the account's time zone, without offset.
+    return datetime.now(ZoneInfo(config.PIPEDRIVE_TIMEZONE)).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def computed_at():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,421 @@
+import gzip
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+
+from . import config
+from .stats import STATS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RETRY_STATUSES = {429, 500, 502, 503}
+TIMEOUT_STATUSES = {408, 504}
+SPLIT_STATUSES = TIMEOUT_STATUSES | {413}
+ID_LOOKUP_BATCH = 200
+ID_LOOKUP_LIMIT = 20000
+# external_ids per in.() filter when marking rows deleted.
+MARK_BATCH = 200
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 60.0
+# Request bodies smaller than this are sent as is; gzip would barely help.
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+# jsonb columns whose empty leaves are dropped before sending.
+JSON_COLUMNS = ("meta",)
+DEAD_LETTERS = defaultdict(set)
+DEAD_LETTER_LOCK = threading.Lock()
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_GZIP_ACCEPTED = True
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, shared between threads."""
+
+    def __init__(self, base_url, size=4, timeout=120):
+        parts = urlsplit(base_url)
+        self.secure = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        factory = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        return factory(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method, path, body=None, headers=None):
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+        try:
+            conn.request(method, self.base_path + path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            raw = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            # The server may have dropped an idle keep-alive connection.
+            conn = self._connect()
+            conn.request(method, self.base_path + path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            raw = response.read()
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if response.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return response.status, response.headers, raw
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def http_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # Several tables upload at once, each with CONCURRENCY workers.
+            _POOL = ConnectionPool(config.SUPABASE_URL, size=config.CONCURRENCY * max(1, config.PARALLEL_TABLES))
+        return _POOL
+
+
+def close_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+
+
+class SupabaseError(RuntimeError):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def retry_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(RETRY_MAX_DELAY, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(retry_after)
+                return min(RETRY_MAX_DELAY, max(0.0, when.timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def compact(value):
+    # Drops empty strings, nulls and empty objects nested in a JSON value.
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for key, item in value.items():
+        item = compact(item)
+        if item is not None and item != "" and item != {}:
+            result[key] = item
+    return result
+
+
+def compact_rows(rows):
+    # With ?columns= PostgREST sets the keys a row omits to NULL, so null
+    # fields can be left out without every row in a batch needing the
+    # same keys, and without an upsert keeping a stale value.
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    compacted = [
+        {
+            key: compact(value) if key in JSON_COLUMNS else value
+            for key, value in row.items()
+            if value is not None
+        }
+        for row in rows
+    ]
+    return columns, compacted
+
+
+def gzip_rejected(status, raw):
+    # Proxies answer 415; PostgREST itself tries to parse the compressed
+    # bytes as JSON and answers 400.
+    return status == 415 or (status == 400 and (b"PGRST102" in raw or b"invalid json" in raw.lower()))
+
+
+def supabase_request(method, table, query="", payload=None, prefer=None, retry_timeouts=True):
+    global _GZIP_ACCEPTED
+    path = f"/rest/v1/{table}{query}"
+    url = f"{config.SUPABASE_URL}{path}"
+    headers = {
+        "apikey": config.SUPABASE_KEY,
+        "Authorization": f"Bearer {config.SUPABASE_KEY}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": "gzip",
+    }
+    data = body = None
+    if payload is not None:
+        data = body = dumps(payload)
+        STATS.count(payload_bytes=len(data))
+        if config.GZIP and _GZIP_ACCEPTED and len(data) >= GZIP_MIN_BYTES:
+            body = gzip.compress(data, GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    if prefer:
+        headers["Prefer"] = prefer
+    retry_statuses = RETRY_STATUSES | TIMEOUT_STATUSES if retry_timeouts else RETRY_STATUSES
+    attempt = -1
+    while attempt < config.MAX_RETRIES:
+        attempt += 1
+        if attempt:
+            STATS.count(retries=1)
+        started = time.perf_counter()
+        try:
+            status, response_headers, raw = http_pool().request(method, path, body=body, headers=headers)
+        except (http.client.HTTPException, OSError) as exc:
+            STATS.count(requests=1, connection_errors=1, bytes_sent=len(body or b""))
+            if isinstance(exc, TimeoutError) and not retry_timeouts:
+                raise SupabaseError(f"{method} {url} -> timeout", status=408) from exc
+            if attempt == config.MAX_RETRIES:
+                raise SupabaseError(f"{method} {url} -> {exc}") from exc
+            time.sleep(retry_delay(attempt))
+            continue
+        STATS.observe_request(f"{method} {table}", time.perf_counter() - started)
+        STATS.count(requests=1, bytes_sent=len(body or b""), bytes_received=len(raw))
+        if "Content-Encoding" in headers and gzip_rejected(status, raw):
+            # A server that does not take gzip bodies: send plain JSON from
+            # now on.
+            _GZIP_ACCEPTED = False
+            del headers["Content-Encoding"]
+            body = data
+            STATS.count(gzip_rejected=1)
+            # The plain resend is not a retry.
+            attempt -= 1
+            continue
+        if status not in retry_statuses or attempt == config.MAX_RETRIES:
+            break
+        time.sleep(retry_delay(attempt, response_headers.get("Retry-After")))
+    if status >= 400:
+        STATS.count(http_errors=1)
+        detail = raw.decode("utf-8", errors="ignore")
+        raise SupabaseError(f"{method} {url} -> {status}: {detail}", status=status)
+    if not raw:
+        return []
+    return loads(raw)
+
+
+def chunked(items, size=500):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class BatchSizer:
+    """Grows or shrinks the upsert batch size to keep each request near a target latency."""
+
+    def __init__(self, size, minimum=10, maximum=5000, target=2.0):
+        self.size = max(minimum, min(size, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self._lock = threading.Lock()
+
+    def observe(self, rows, seconds):
+        with self._lock:
+            if rows < self.size:
+                return
+            if seconds > self.target:
+                self.size = max(self.minimum, self.size // 2)
+            elif seconds < self.target / 2:
+                self.size = min(self.maximum, self.size + self.size // 4 + 1)
+
+    def shrink(self, rows):
+        # A batch of this many rows was rejected as too large or too slow; never go back up to it.
+        with self._lock:
+            self.maximum = max(self.minimum, min(self.maximum, rows - 1))
+            self.size = max(self.minimum, min(self.size, rows // 2))
+
+
+def write_dead_letter(table, rows, error):
+    with DEAD_LETTER_LOCK:
+        with config.DEAD_LETTER_PATH.open("a", encoding="utf-8") as handle:
+            handle.write(
+                json.dumps(
+                    {"table": table, "error": str(error), "at": datetime.now().isoformat(), "rows": rows},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+        DEAD_LETTERS[table].update(row.get("external_id") for row in rows)
+    STATS.count(dead_letter_rows=len(rows))
+
+
+def upsert_batch(table, batch, conflict, sizer, id_map=None, on_batch=None):
+    columns, payload = compact_rows(batch)
+    query = f"?on_conflict={conflict}&columns={','.join(columns)}"
+    prefer = "resolution=merge-duplicates"
+    if id_map is not None:
+        query += "&select=id,external_id"
+        prefer += ",return=representation"
+    started = time.monotonic()
+    try:
+        returned = supabase_request(
+            "POST",
+            table,
+            query,
+            payload=payload,
+            prefer=prefer,
+            retry_timeouts=len(batch) == 1,
+        )
+    except SupabaseError as exc:
+        if exc.status in SPLIT_STATUSES and len(batch) > 1:
+            sizer.shrink(len(batch))
+            STATS.count(batch_splits=1)
+            middle = len(batch) // 2
+            upsert_batch(table, batch[:middle], conflict, sizer, id_map, on_batch)
+            upsert_batch(table, batch[middle:], conflict, sizer, id_map, on_batch)
+            return
+        write_dead_letter(table, batch, exc)
+        return
+    sizer.observe(len(batch), time.monotonic() - started)
+    if id_map is not None:
+        id_map.update(id_pairs(returned))
+    if on_batch is not None:
+        on_batch(batch)
+
+
+def upsert_rows(table, rows, conflict, id_map=None, on_batch=None):
+    if not rows:
+        return
+    sizer = BatchSizer(config.BATCH_SIZE, maximum=config.MAX_BATCH_SIZE, target=config.TARGET_LATENCY)
+    lock = threading.Lock()
+    position = 0
+
+    def next_batch():
+        nonlocal position
+        with lock:
+            start = position
+            position += sizer.size
+            return rows[start:position]
+
+    def worker():
+        while True:
+            batch = next_batch()
+            if not batch:
+                return
+            upsert_batch(table, batch, conflict, sizer, id_map, on_batch)
+
+    with STATS.stage(f"upsert {table}", len(rows)), ThreadPoolExecutor(max_workers=config.CONCURRENCY) as executor:
+        futures = [executor.submit(worker) for _ in range(config.CONCURRENCY)]
+        for future in as_completed(futures):
+            future.result()
+
+
+def id_pairs(rows):
+    # Ids are stored as text everywhere (staging, row hashes): an int id from
+    # one response and the same id as text after a reload would hash the
+    # rows that reference it differently and send them again.
+    return ((str(row["external_id"]), str(row["id"])) for row in rows if row.get("external_id"))
+
+
+def fetch_id_map(table):
+    mapping = {}
+    last_id = None
+    with STATS.stage(f"fetch_id_map {table}") as entry:
+        while True:
+            query = "?select=id,external_id&order=id&limit=1000"
+            if last_id is not None:
+                query += f"&id=gt.{last_id}"
+            rows = supabase_request("GET", table, query)
+            if not rows:
+                break
+            mapping.update(id_pairs(rows))
+            last_id = rows[-1]["id"]
+        entry["rows"] = len(mapping)
+    return mapping
+
+
+def in_filter(values):
+    quoted = ",".join('"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"' for value in values)
+    return quote(f"in.({quoted})", safe="")
+
+
+def resolve_ids(table, external_ids, id_map):
+    missing = sorted({key for key in external_ids if key and key not in id_map})
+    if not missing:
+        return id_map
+    if len(missing) > ID_LOOKUP_LIMIT:
+        id_map.update(fetch_id_map(table))
+        return id_map
+
+    def lookup(keys):
+        return supabase_request("GET", table, f"?select=id,external_id&external_id={in_filter(keys)}")
+
+    with STATS.stage(f"resolve_ids {table}", len(missing)), ThreadPoolExecutor(max_workers=config.CONCURRENCY) as executor:
+        for rows in executor.map(lookup, chunked(missing, ID_LOOKUP_BATCH)):
+            id_map.update(id_pairs(rows))
+    return id_map
+
+
+def fetch_keys(table):
+    # external_id -> whether the row is marked deleted, for every row the
+    # importer loaded (rows created in the app have no external_id).
+    keys = {}
+    last_id = None
+    with STATS.stage(f"fetch_keys {table}") as entry:
+        while True:
+            query = "?select=id,external_id,deleted_at&external_id=not.is.null&order=id&limit=1000"
+            if last_id is not None:
+                query += f"&id=gt.{last_id}"
+            rows = supabase_request("GET", table, query)
+            if not rows:
+                break
+            for row in rows:
+                keys[str(row["external_id"])] = row.get("deleted_at") is not None
+            last_id = rows[-1]["id"]
+        entry["rows"] = len(keys)
+    return keys
+
+
+def mark_deleted(table, external_ids, deleted_at):
+    # One PATCH per MARK_BATCH keys; deleted_at None restores the rows.
+    def patch(keys):
+        supabase_request(
+            "PATCH", table, f"?external_id={in_filter(keys)}", payload={"deleted_at": deleted_at}, prefer="return=minimal"
+        )
+
+    with STATS.stage(f"mark_deleted {table}", len(external_ids)), ThreadPoolExecutor(max_workers=config.CONCURRENCY) as executor:
+        list(executor.map(patch, chunked(sorted(external_ids), MARK_BATCH)))
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from datetime import date
+
+import pandas as pd
+
+# drop: "value" only blanks the field; "row" keeps the whole row (and, through
+# check_references, every row pointing at it) out of the load, so it is only
+# for data the row is useless without. All fields checked here are optional.
+Rule = namedtuple("Rule", ["field", "check", "low", "high", "drop"], defaults=(None, None, "value"))
+
+# Converters that leave a cell blank when they cannot read it.
+PARSED = ("number", "duration", "iso", "date", "datetime")
+ADDRESS = r"[^@\s;,]+@[^@\s;,]+\.[^@\s;,.]+"
+# One address, or several split by "," or ";".
+EMAIL = rf"{ADDRESS}(?:\s*[;,]\s*{ADDRESS})*"
+# Digits with the usual separators, once extensions ("ext. 12", "x12")
+# are dropped; one cell may hold several numbers split by "/", "," or ";".
+EXTENSION = r"(?i)(?:ext|x)\.?\s*(?=\d)"
+PHONE = r"[\d\s+().\-/,;]+"
+MIN_PHONE_DIGITS = 7
+EARLIEST_DATE = "1990-01-01"
+# Expected close dates and due dates may be planned this far ahead.
+LATEST_YEARS = 20
+
+
+def dates(*fields):
+    return [Rule(name, "date") for name in fields]
+
+
+RULES = {
+    "organizations": [
+        Rule("meta.lat", "range", -90, 90),
+        Rule("meta.lng", "range", -180, 180),
+        *dates("created_at", "updated_at"),
+    ],
+    "people": [
+        Rule("email", "email"),
+        Rule("phone", "phone"),
+        *dates("created_at", "updated_at"),
+    ],
+    "deals": [
+        Rule("value", "range", 0),
+        Rule("weighted_value", "range", 0),
+        Rule("probability", "range", 0, 100),
+        Rule("meta.product_amount", "range", 0),
+        Rule("meta.product_qty", "range", 0),
+        *dates("expected_close_date", "close_date", "last_stage_change_at", "created_at", "updated_at"),
+    ],
+    "activities": [
+        Rule("duration_minutes", "range", 0, 60 * 24 * 31),
+        *dates("due_at", "completed_at", "created_at", "updated_at"),
+    ],
+    "notes": dates("created_at", "updated_at"),
+}
+
+
+def blank(values):
+    return values.isna() | values.astype(object).eq("")
+
+
+def check_range(values, rule):
+    numbers = pd.to_numeric(values, errors="coerce")
+    bad = pd.Series(False, index=values.index)
+    if rule.low is not None:
+        bad |= numbers < rule.low
+    if rule.high is not None:
+        bad |= numbers > rule.high
+    return bad, "fuera de rango"
+
+
+def check_date(values, rule):
+    text = values.where(~blank(values), "").astype(str).str[:10]
+    latest = f"{date.today().year + LATEST_YEARS}-12-31"
+    return (text != "") & ((text < EARLIEST_DATE) | (text > latest)), "fecha fuera de rango"
+
+
+def check_email(values, rule):
+    text = values.where(~blank(values), "").astype(str)
+    return (text != "") & ~text.str.fullmatch(EMAIL), "email no valido"
+
+
+def check_phone(values, rule):
+    text = values.where(~blank(values), "").astype(str)
+    digits = text.str.count(r"\d")
+    shape = text.str.replace(EXTENSION, "", regex=True).str.fullmatch(PHONE)
+    return (text != "") & (~shape | (digits < MIN_PHONE_DIGITS)), "telefono no valido"
+
+
+CHECKS = {
+    "range": check_range,
+    "date": check_date,
+    "email": check_email,
+    "phone": check_phone,
+}
+
+
+def check_rules(entity, compute):
+    # (target, failing rows, message, offending values, drop) per rule;
+    # compute returns a target's converted column.
+    for rule in RULES.get(entity, ()):
+        values = compute(rule.field)
+        bad, message = CHECKS[rule.check](values, rule)
+        yield rule.field, bad, message, values, rule.drop
+
+
+def reasons(problems, index):
+    # Reason texts per failing row, only built for the few rows that fail.
+    found = {}
+    for target, bad, message, values, _ in problems:
+        for position in bad[bad].index:
+            value = None if values is None else values[position]
+            detail = f" ({value})" if value is not None and value != "" else ""
+            found.setdefault(position, []).append(f"{target}: {message}{detail}")
+    return [found.get(position, []) for position in index]
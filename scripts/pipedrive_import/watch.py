@@ -0,0 +1,158 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import api, config
+from .cli import print_report, write_report
+from .pipeline import TABLES, run
+from .sources import FILES, newest_file
+from .supabase import close_pool
+
+# Wait before the first import, so files still being copied at startup
+# look different on the next look and are left for a later poll.
+SETTLE_SECONDS = 2.0
+
+
+class WatchStatus:
+    """Watcher state and last-run report, served as JSON on the local status endpoint."""
+
+    def __init__(self, input_dir, entities):
+        self._lock = threading.Lock()
+        self._state = {
+            "pid": os.getpid(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "input_dir": str(input_dir),
+            "entities": list(entities),
+            "interval": config.WATCH_INTERVAL,
+            "state": "starting",
+            "runs": 0,
+            "errors": 0,
+            "files": {},
+            "last_error": None,
+            "last_run": None,
+        }
+
+    def update(self, **values):
+        with self._lock:
+            self._state.update(values)
+
+    def finished(self, report, error=None):
+        with self._lock:
+            self._state["runs"] += 1
+            self._state["errors"] += error is not None
+            self._state["last_run"] = report
+            self._state["last_error"] = error
+            self._state["state"] = "idle"
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._state, ensure_ascii=False, default=str))
+
+
+def serve_status(status, port):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(status.snapshot(), ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    # Local only: the report lists file paths and error messages.
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="status", daemon=True).start()
+    return server
+
+
+def export_files(entities, input_dir=None):
+    # entity -> [path, size, mtime] of its newest export; entities without
+    # one are left out.
+    files = {}
+    for entity in entities:
+        try:
+            path = newest_file(FILES[entity], input_dir)
+            if path is not None:
+                stat = path.stat()
+                files[entity] = [str(path), stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            # Renamed or removed between the glob and the stat.
+            continue
+    return files
+
+
+def ingest(args, options, entities, status):
+    status.update(state="running", running=entities)
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S} Importando {', '.join(TABLES[entity][1] for entity in entities)}...")
+    started = datetime.now()
+    summary = None
+    error = None
+    try:
+        summary = run(**{**options, "only": entities, "keep_connections": True})
+    except (Exception, SystemExit) as exc:
+        error = str(exc)
+        print(f"Error en la importacion: {error}")
+    report = write_report(args, started, "error" if error else "ok", summary)
+    status.finished(report, error)
+    status.update(running=None)
+    if error is None:
+        print_report(report, args.dry_run)
+    return error is None
+
+
+def stop(signum, frame):
+    # A service manager stops the watcher with SIGTERM; an import cut short
+    # resumes on the next start like any interrupted run.
+    raise KeyboardInterrupt
+
+
+def watch(args, options):
+    # Long-running import: each poll picks the newest export per entity and
+    # imports only the entities whose file changed. pandas, the Arrow
+    # cache, the normalizer caches and the HTTP connections stay warm
+    # between runs; id maps and row hashes come from the staging store and
+    # the state file as in any run.
+    signal.signal(signal.SIGTERM, stop)
+    entities = args.only or list(FILES)
+    input_dir = options["input_dir"] or config.INPUT_DIR
+    status = WatchStatus(input_dir, entities)
+    server = serve_status(status, config.STATUS_PORT) if config.STATUS_PORT else None
+    print(f"Vigilando {input_dir} cada {config.WATCH_INTERVAL:g} s (Ctrl+C para salir).")
+    if server is not None:
+        print(f"Estado en http://127.0.0.1:{config.STATUS_PORT}/status")
+    ingested = {}
+    try:
+        seen = export_files(entities, options["input_dir"])
+        time.sleep(SETTLE_SECONDS)
+        while True:
+            files = export_files(entities, options["input_dir"])
+            # A file is read once it looks the same on two polls in a row,
+            # so one still being written is not imported half-way.
+            stable = {entity: item for entity, item in files.items() if seen.get(entity) == item}
+            seen = files
+            changed = [entity for entity in entities if entity in stable and ingested.get(entity) != stable[entity]]
+            if changed and ingest(args, options, changed, status):
+                # A failed import is retried on the next poll.
+                ingested.update((entity, stable[entity]) for entity in changed)
+                status.update(files={entity: item[0] for entity, item in ingested.items()})
+            else:
+                status.update(state="idle")
+            time.sleep(config.WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        print("Vigilancia detenida.")
+    finally:
+        if server is not None:
+            server.shutdown()
+        close_pool()
+        api.close_api_pool()
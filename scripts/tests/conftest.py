@@ -0,0 +1,31 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# The importer runs as scripts/pipedrive_to_supabase.py, so its package is
+# imported from scripts/ rather than installed.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bench_pipedrive_import as bench  # noqa: E402
+from pipedrive_import import config  # noqa: E402
+
+
+@pytest.fixture
+def postgrest():
+    server = bench.FakePostgrest()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fresh_config(monkeypatch):
+    # config.load() rebinds the module's settings; registering each one with
+    # monkeypatch puts the current values back after the test.
+    for name, value in list(vars(config).items()):
+        if name.isupper():
+            monkeypatch.setattr(config, name, value)
+    return config
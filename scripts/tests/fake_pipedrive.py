@@ -0,0 +1,202 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 40-character hash keys, as Pipedrive names custom fields.
+BOILERS_KEY = "a1" * 20
+PROJECT_KEY = "b2" * 20
+
+USERS = [{"id": 1, "name": "Ana Torres"}, {"id": 2, "name": "Luis Vera"}]
+STAGES = [{"id": 1, "name": "Prospecto"}, {"id": 2, "name": "Propuesta"}]
+PIPELINES = [{"id": 1, "name": "Ventas"}]
+ACTIVITY_TYPES = [{"id": 1, "key_string": "call", "name": "Llamada"}, {"id": 2, "key_string": "meeting", "name": "Reunion"}]
+FIELDS = {
+    "organizationFields": [
+        {"key": "label_ids", "name": "Etiquetas", "options": [{"id": 5, "label": "VIP"}, {"id": 6, "label": "Hotel"}]},
+        {
+            "key": BOILERS_KEY,
+            "name": "Calderas Instaladas",
+            "options": [{"id": 31, "label": "1"}, {"id": 32, "label": "2"}, {"id": 33, "label": "Ninguna"}],
+        },
+    ],
+    "personFields": [],
+    "dealFields": [{"key": "channel", "name": "Canal de la fuente", "options": [{"id": 7, "label": "Campana"}]}],
+    "activityFields": [{"key": PROJECT_KEY, "name": "Proyecto"}],
+}
+
+
+def organization(number):
+    return {
+        "id": number,
+        "name": f"Hotel Quito {number}",
+        "owner_id": 1 + number % 2,
+        "label_ids": [5, 6] if number % 2 else [],
+        "address": {"value": "Av. Amazonas N1-10", "locality": "Quito", "country": "Ecuador"},
+        "add_time": "2024-01-02T13:00:00Z",
+        "update_time": "2024-03-01T13:00:00Z",
+        "custom_fields": {BOILERS_KEY: 32 if number % 2 else None},
+    }
+
+
+def person(number):
+    return {
+        "id": number,
+        "org_id": number,
+        "name": f"Ana Perez {number}",
+        "phones": [{"label": "mobile", "value": f"09912345{number:02d}", "primary": True}],
+        "emails": [{"label": "work", "value": f"ana{number}@hotel.com.ec", "primary": True}],
+        "add_time": "2024-01-03T13:00:00Z",
+        "update_time": "2024-03-02T13:00:00Z",
+        "custom_fields": {},
+    }
+
+
+def deal(number):
+    return {
+        "id": number,
+        "title": f"Caldera {number}",
+        "org_id": number,
+        "person_id": number,
+        "value": 1000.0 * number,
+        "currency": "USD",
+        "stage_id": 2,
+        "pipeline_id": 1,
+        "status": "won" if number % 2 else "open",
+        "owner_id": 2,
+        "channel": 7,
+        "probability": 50,
+        "expected_close_date": "2024-06-30",
+        "add_time": "2024-01-04T13:00:00Z",
+        "update_time": "2024-03-03T13:00:00Z",
+        "custom_fields": {},
+    }
+
+
+def activity(number):
+    return {
+        "id": number,
+        "subject": f"Visita tecnica {number}",
+        "type": "meeting",
+        "done": bool(number % 2),
+        "note": "<p>Revisar quemador &amp; caldera</p>",
+        "due_date": "2024-04-01",
+        "due_time": "15:30",
+        "duration": "01:00",
+        "owner_id": 1,
+        "org_id": number,
+        "deal_id": number,
+        "add_time": "2024-01-05T13:00:00Z",
+        "update_time": "2024-03-04T13:00:00Z",
+        "custom_fields": {PROJECT_KEY: f"P-{number}"},
+    }
+
+
+def note(number):
+    return {
+        "id": number,
+        "content": f"<div>Cotizacion enviada {number}</div>",
+        "user_id": 2,
+        "deal_id": number,
+        "org_id": number,
+        "pinned_to_deal_flag": number == 1,
+        "add_time": "2024-01-06 13:00:00",
+        "update_time": "2024-03-05 13:00:00",
+    }
+
+
+class FakePipedrive(ThreadingHTTPServer):
+    """In-process stand-in for the Pipedrive v1/v2 API the importer reads.
+
+    v2 lists page with a cursor and v1 lists with start offsets. The first
+    throttled requests are answered 429 with Retry-After, and each response
+    carries x-ratelimit-remaining/x-ratelimit-reset like the real API.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, rows=5):
+        super().__init__(("127.0.0.1", 0), FakePipedriveHandler)
+        self.lock = threading.Lock()
+        self.records = {
+            "organizations": [organization(number) for number in range(1, rows + 1)],
+            "persons": [person(number) for number in range(1, rows + 1)],
+            "deals": [deal(number) for number in range(1, rows + 1)],
+            "activities": [activity(number) for number in range(1, rows + 1)],
+            "notes": [note(number) for number in range(1, rows + 1)],
+            "users": USERS,
+            "stages": STAGES,
+            "pipelines": PIPELINES,
+            "activityTypes": ACTIVITY_TYPES,
+            **FIELDS,
+        }
+        self.throttle = 0
+        self.remaining = None
+        self.requests = []
+        self.stats = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page(self, resource, params):
+        items = self.records[resource]
+        since = params.get("updated_since")
+        if since:
+            # v2 sends RFC 3339, v1 "YYYY-MM-DD HH:MM:SS"; both sort as text
+            # once the separators match.
+            since = since.replace("T", " ").rstrip("Z")
+            items = [item for item in items if item["update_time"].replace("T", " ").rstrip("Z") > since]
+        limit = int(params.get("limit", 100))
+        start = int(params.get("cursor") or params.get("start") or 0)
+        return items[start : start + limit], start + limit < len(items), start + limit
+
+
+class FakePipedriveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=()):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        version, resource = parts.path.split("/")[2:4]
+        with server.lock:
+            server.requests.append((parts.path, params))
+            server.stats["GET"] += 1
+            throttled = server.throttle > 0
+            server.throttle -= throttled
+            headers = []
+            if server.remaining is not None:
+                server.remaining = max(0, server.remaining - 1)
+                headers = [("x-ratelimit-remaining", str(server.remaining)), ("x-ratelimit-reset", "0.2")]
+        if self.headers.get("x-api-token") != "test":
+            self._send(401, {"success": False, "error": "unauthorized"})
+            return
+        if throttled:
+            server.stats["429"] += 1
+            self._send(429, {"success": False, "error": "Too Many Requests"}, [("Retry-After", "0"), *headers])
+            return
+        if resource not in server.records:
+            self._send(404, {"success": False, "error": "not found"})
+            return
+        items, more, after = server.page(resource, params)
+        if version == "v2":
+            extra = {"next_cursor": str(after) if more else None}
+        else:
+            extra = {"pagination": {"start": int(params.get("start", 0)), "more_items_in_collection": more, "next_start": after}}
+        self._send(200, {"success": True, "data": items, "additional_data": extra}, headers)
@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+import bench_pipedrive_import as bench
+from fake_pipedrive import FakePipedrive
+from pipedrive_import import api, config
+from pipedrive_import.entities import transform
+from pipedrive_import.stats import STATS
+
+
+@pytest.fixture
+def pipedrive(monkeypatch):
+    server = FakePipedrive()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "PIPEDRIVE_API_URL", server.url)
+    monkeypatch.setattr(config, "PIPEDRIVE_API_TOKEN", "test")
+    monkeypatch.setattr(config, "PIPEDRIVE_TIMEZONE", "America/Guayaquil")
+    monkeypatch.setattr(config, "MAX_RETRIES", 2)
+    monkeypatch.setattr(api, "PAGE_SIZE", 2)
+    monkeypatch.setattr(api, "LIMITER", api.RateLimiter())
+    api.close_api_pool()
+    STATS.reset()
+    yield server
+    api.close_api_pool()
+    server.shutdown()
+    server.server_close()
+
+
+def pages(server, path):
+    return [params for requested, params in server.requests if requested == path]
+
+
+def test_v2_pages_follow_the_cursor(pipedrive):
+    records = list(api.paginate("/api/v2/organizations"))
+    assert [record["id"] for record in records] == [1, 2, 3, 4, 5]
+    assert [params.get("cursor") for params in pages(pipedrive, "/api/v2/organizations")] == [None, "2", "4"]
+
+
+def test_v1_pages_follow_next_start(pipedrive):
+    records = list(api.paginate("/api/v1/notes"))
+    assert [record["id"] for record in records] == [1, 2, 3, 4, 5]
+    assert [params.get("start") for params in pages(pipedrive, "/api/v1/notes")] == [None, "2", "4"]
+
+
+def test_updated_since_is_sent_in_utc(pipedrive):
+    api.fetch_entity("deals", api.load_references(), since="2024-03-03 07:00:00")
+    params = pages(pipedrive, "/api/v2/deals")[0]
+    assert params["updated_since"] == "2024-03-03T12:00:00Z"
+
+
+def test_429_is_retried_after_retry_after(pipedrive):
+    pipedrive.throttle = 2
+    assert len(list(api.paginate("/api/v2/deals"))) == 5
+    assert pipedrive.stats["429"] == 2
+    assert STATS.counters["api_retries"] == 2
+
+
+def test_429_past_the_retries_fails(pipedrive):
+    pipedrive.throttle = 3
+    with pytest.raises(api.PipedriveError) as raised:
+        api.api_request("/api/v2/deals")
+    assert raised.value.status == 429
+
+
+def test_exhausted_rate_limit_waits_for_the_reset(pipedrive):
+    pipedrive.remaining = 2
+    assert len(list(api.paginate("/api/v2/activities"))) == 5
+    assert STATS.counters["rate_limit_waits"] >= 1
+
+
+def test_frames_map_custom_fields_and_references(pipedrive):
+    frames = api.fetch_frames(["organizations", "deals", "activities"])
+    organization = frames["organizations"].set_index("ID").loc[1]
+    assert organization["Calderas Instaladas"] == "2"
+    assert organization["Etiquetas"] == "VIP, Hotel"
+    assert organization["Propietario"] == "Luis Vera"
+    assert organization["Organizacion creada"] == "2024-01-02 08:00:00"
+    deal = frames["deals"].set_index("ID").loc[1]
+    assert (deal["Etapa"], deal["Embudo"], deal["Estado"]) == ("Propuesta", "Ventas", "Ganado")
+    assert deal["Canal de la fuente"] == "Campana"
+    activity = frames["activities"].set_index("ID").loc[3]
+    assert (activity["Tipo"], activity["Proyecto"]) == ("Reunion", "P-3")
+    assert (activity["Fecha de vencimiento"], activity["Hora de vencimiento"]) == ("2024-04-01", "10:30:00")
+
+
+def test_frames_go_through_the_export_transform(pipedrive):
+    frames = api.fetch_frames(["organizations", "people"])
+    organizations = transform("organizations", frames["organizations"])
+    assert organizations[0]["meta"]["boilers"] == "2"
+    assert organizations[0]["tags"] == ["VIP", "Hotel"]
+    people = transform("people", frames["people"])
+    assert (people[0]["client_external_id"], people[0]["phone"]) == ("1", "0991234501")
+
+
+def test_import_from_the_api_then_nothing_new(pipedrive, postgrest, tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPEDRIVE_API_URL", pipedrive.url)
+    monkeypatch.setenv("PIPEDRIVE_API_TOKEN", "test")
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    first = bench.run_import(postgrest, tmp_path, work_dir, ["--source", "api"])
+    assert {entity: counts["new"] for entity, counts in first["entities"].items()} == dict.fromkeys(
+        ("organizations", "people", "deals", "activities", "notes"), 5
+    )
+    postgrest.stats.clear()
+    second = bench.run_import(postgrest, tmp_path, work_dir, ["--source", "api"])
+    assert all(counts["rows"] == 0 for counts in second["entities"].values())
+    assert postgrest.stats["POST"] == 0
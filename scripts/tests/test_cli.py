@@ -0,0 +1,21 @@
+import pytest
+
+from pipedrive_import import cli, config
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(config, "load", lambda env_file=True: None)
+
+
+def test_unknown_transport_from_the_environment(monkeypatch):
+    monkeypatch.setattr(config, "TRANSPORT", "ftp")
+    with pytest.raises(SystemExit, match="Transporte desconocido"):
+        cli.main(["--dry-run"])
+
+
+def test_copy_transport_needs_a_database_url(monkeypatch):
+    monkeypatch.setattr(config, "TRANSPORT", "copy")
+    monkeypatch.setattr(config, "DATABASE_URL", "")
+    with pytest.raises(SystemExit, match="psycopg|SUPABASE_DB_URL"):
+        cli.main([])
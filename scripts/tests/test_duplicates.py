@@ -0,0 +1,76 @@
+import pytest
+
+from pipedrive_import import duplicates
+from pipedrive_import.duplicates import (
+    MERGE_THRESHOLD,
+    REPORT_THRESHOLD,
+    candidate_pairs,
+    find_duplicates,
+    merge_map,
+    organization_record,
+    person_record,
+    score_pair,
+)
+
+
+def organization(key, name, city=None):
+    return organization_record({"external_id": key, "name": name, "city": city})
+
+
+def person(key, name, email=None, client=None):
+    return person_record({"external_id": key, "name": name, "email": email, "client_external_id": client})
+
+
+def test_accent_case_and_company_form_variants_match():
+    score, reasons = score_pair(organization("1", "INDUSTRIAS ÁCIDAS S.A."), organization("2", "industrias acidas cia ltda"))
+    assert score == 1.0 and reasons == ["nombre"]
+
+
+def test_different_numbers_and_cities_lower_the_score():
+    score, _ = score_pair(organization("1", "Bodega 2"), organization("2", "Bodega 3"))
+    assert score < REPORT_THRESHOLD
+    score, _ = score_pair(organization("1", "Hotel Colon", "Quito"), organization("2", "Hotel Colon", "Guayaquil"))
+    assert REPORT_THRESHOLD <= score < MERGE_THRESHOLD
+
+
+def test_people_sharing_only_a_name_are_reported_not_merged():
+    alone, _ = score_pair(person("1", "Ana Perez"), person("2", "ana pérez"))
+    assert REPORT_THRESHOLD <= alone < MERGE_THRESHOLD
+    score, reasons = score_pair(person("1", "Ana Perez", "ana@planta.com", "9"), person("2", "Ana Pérez", "ANA@planta.com", "9"))
+    assert score == 1.0 and reasons == ["nombre", "organizacion", "email"]
+
+
+def test_city_blocks_pair_names_whose_rarest_token_has_a_typo(monkeypatch):
+    # Without the sorted-neighbour passes only the blocks pair records.
+    monkeypatch.setattr(duplicates, "WINDOW", 0)
+    records = [
+        organization("1", "Hotel Quitumbe", "Quito"),
+        organization("2", "Hotel Quitunbe", "Quito"),
+        organization("3", "Hotel Quitumba", "Guayaquil"),
+    ]
+    assert candidate_pairs(records) == {(0, 1)}
+
+
+def test_find_duplicates_reports_pairs_over_the_threshold():
+    rows = [
+        {"external_id": "1", "name": "Hotel Quitumbe", "city": "Quito"},
+        {"external_id": "2", "name": "Hotel Quitunbe", "city": "Quito"},
+        {"external_id": "3", "name": "Textiles Andinos", "city": "Quito"},
+    ]
+    found = find_duplicates("organizations", rows)
+    assert [(left["id"], right["id"]) for _, left, right, _ in found] in ([("1", "2")], [("2", "1")])
+
+
+@pytest.mark.parametrize(
+    "pairs, expected",
+    [
+        # Transitive: 5 ~ 9 and 9 ~ 2 put all three under the oldest id.
+        ([(0.97, "9", "5"), (0.96, "2", "9")], {"5": "2", "9": "2"}),
+        # Below MERGE_THRESHOLD a pair is only reported.
+        ([(0.97, "9", "5"), (0.9, "2", "9")], {"9": "5"}),
+        ([(0.99, "b", "10")], {"b": "10"}),
+    ],
+)
+def test_merge_map_points_each_group_at_its_oldest_record(pairs, expected):
+    found = [(score, {"id": left}, {"id": right}, []) for score, left, right in pairs]
+    assert merge_map(found) == expected
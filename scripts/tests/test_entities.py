@@ -0,0 +1,73 @@
+import pandas as pd
+
+from pipedrive_import.entities import transform
+
+
+def frame(*rows):
+    return pd.DataFrame(list(rows), dtype=object)
+
+
+def test_export_headers_match_with_or_without_accents():
+    rows = transform(
+        "people",
+        frame(
+            {"ID": "1", "Nombre": "Ana Perez", "Teléfono - Móvil": "0991234567", "ID de la organización": "7.0"},
+            {"ID": "2", "Nombre": "Luis Vera", "Telefono - Trabajo": "022345678", "Etiquetas": "VIP, Hotel"},
+        ),
+    )
+    assert (rows[0]["phone"], rows[0]["client_external_id"]) == ("0991234567", "7")
+    assert rows[1]["phone"] == "022345678"
+    assert rows[1]["tags"] == ["VIP", "Hotel"]
+    assert rows[0]["meta"]["phones"]["mobile"] == "0991234567"
+
+
+def test_name_falls_back_to_first_and_last_name():
+    rows = transform("people", frame({"ID": "3", "Nombre": "", "Nombre.1": "Maria", "Apellidos": "Lopez"}))
+    assert rows[0]["name"] == "Maria Lopez"
+
+
+def test_activity_fields_and_client_from_the_deal():
+    lookups = {"deal_client": {"40": "9"}, "contact_client": {}}
+    rows = transform(
+        "activities",
+        frame(
+            {
+                "ID": "1",
+                "ID del trato": "40",
+                "Tipo": "Llamada",
+                "Finalizada": "Si",
+                "Fecha de vencimiento": "2024-04-01",
+                "Hora de vencimiento": "15:30",
+                "Duracion": "01:30",
+                "Nota": "<p>Revisar &amp; cotizar</p>",
+                "Hora de actualizacion": "2024-04-02 08:00:00",
+            },
+            {"ID": "2", "Asunto": "Visita", "Finalizada": "No"},
+        ),
+        lookups,
+    )
+    first, second = rows
+    assert first["client_external_id"] == "9"
+    assert (first["title"], second["title"]) == ("Llamada", "Visita")
+    assert (first["outcome"], second["outcome"]) == ("completada", "pendiente")
+    assert first["due_at"].startswith("2024-04-01T15:30:00")
+    assert first["duration_minutes"] == 90
+    assert first["search_text"] == "Revisar & cotizar"
+    assert first["updated_at"].startswith("2024-04-02T08:00:00")
+    assert second["due_at"] is None and second["client_external_id"] == ""
+
+
+def test_updated_at_falls_back_to_created_at():
+    rows = transform("notes", frame({"ID": "5", "Hora de adicion": "2024-01-06 13:00:00", "Contenido": "Hola"}))
+    assert rows[0]["updated_at"] == rows[0]["created_at"]
+    assert rows[0]["is_pinned"] is False
+
+
+def test_search_terms_are_distinct_and_sorted_across_columns():
+    rows = transform(
+        "activities",
+        frame({"ID": "1", "Asunto": "Visita técnica", "Tipo": "Consumo", "Nota": "<p>Consumo de combustible, VISITA</p>"}),
+    )
+    assert rows[0]["search_terms"] == "COMBUSTIBLE CONSUMO DE TECNICA VISITA"
+    rows = transform("notes", frame({"ID": "2", "Titulo": "Caldera", "Contenido": "caldera &amp; quemador"}))
+    assert rows[0]["search_terms"] == "CALDERA QUEMADOR"
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import bench_pipedrive_import as bench
+
+SCALE = 200
+
+
+@pytest.fixture
+def exports(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    counts = {entity: max(1, int(SCALE * share)) for entity, share in bench.PROPORTIONS.items()}
+    for entity, header in bench.HEADERS.items():
+        rows = bench.generate_rows(entity, counts, random.Random(f"0-{entity}"))
+        bench.write_export(data_dir / f"{entity}-test.csv", header, rows)
+    return data_dir
+
+
+def test_second_identical_run_sends_nothing(postgrest, exports, tmp_path):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    first = bench.run_import(postgrest, exports, work_dir)
+    assert first["status"] == "ok"
+    assert postgrest.stats["POST"] > 0
+
+    postgrest.stats.clear()
+    second = bench.run_import(postgrest, exports, work_dir)
+    assert second["status"] == "ok"
+    assert postgrest.stats["POST"] == 0
+    assert postgrest.stats["GET"] == 0
+    for entity, counts in second["entities"].items():
+        assert counts.get("new", 0) == 0 and counts.get("changed", 0) == 0, entity
+
+
+def test_reconcile_marks_rows_missing_from_a_later_export(postgrest, exports, tmp_path):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    bench.run_import(postgrest, exports, work_dir, ["--reconcile"])
+    assert all(len(row["id"]) == 36 for row in postgrest.tables["crm_notes"].values())
+
+    path = exports / "notes-test.csv"
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    path.write_text("".join(lines[:-3]), encoding="utf-8")
+    report = bench.run_import(postgrest, exports, work_dir, ["--reconcile"])
+    assert report["entities"]["notes"]["deleted"] == 3
+    deleted = {key for key, row in postgrest.tables["crm_notes"].items() if row["deleted_at"]}
+    assert deleted == {"98", "99", "100"}
+    assert postgrest.stats["crm_notes patched"] == 3
+
+    path.write_text("".join(lines), encoding="utf-8")
+    report = bench.run_import(postgrest, exports, work_dir, ["--reconcile"])
+    assert report["entities"]["notes"]["restored"] == 3
+    assert not any(row["deleted_at"] for row in postgrest.tables["crm_notes"].values())
+
+
+def test_fake_postgrest_filters(postgrest):
+    postgrest.upsert("crm_clients", [{"external_id": str(key)} for key in range(1, 5)], "external_id", True)
+    postgrest.update("crm_clients", {"external_id": ("in", '("1","2")')}, {"deleted_at": "2024-01-01", "name": "x"})
+    alive = postgrest.select("crm_clients", {"deleted_at": ("is", "null")})
+    assert sorted(row["external_id"] for row in alive) == ["3", "4"]
+    assert len(postgrest.select("crm_clients", {"deleted_at": ("not", "is.null")})) == 2
+    assert "name" not in postgrest.select("crm_clients", {"external_id": ("eq", "1")})[0]
+    first, *rest = postgrest.select("crm_clients", {}, order="id")
+    assert [row["id"] for row in postgrest.select("crm_clients", {"id": ("gt", first["id"])}, order="id")] == [
+        row["id"] for row in rest
+    ]
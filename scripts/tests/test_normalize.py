@@ -0,0 +1,216 @@
+import html
+import math
+import re
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipedrive_import.normalize import (
+    combine_date_time_series,
+    date_part_series,
+    normalize_id_series,
+    normalizer_stats,
+    normalize_text_series,
+    parse_bool_series,
+    parse_duration_series,
+    parse_number_series,
+    split_tags,
+    split_tags_series,
+    to_iso_series,
+)
+
+# Scalar normalizers as the iterrows importer applied them to each cell.
+
+
+def legacy_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    return html.unescape(str(value)).replace("\u00a0", " ").strip()
+
+
+def legacy_id(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].isdigit():
+        return text[:-2]
+    return text
+
+
+def legacy_iso(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return ""
+    if not str(value).strip():
+        return ""
+    dt = pd.to_datetime(value, errors="coerce")
+    if pd.isna(dt):
+        return ""
+    if hasattr(dt, "to_pydatetime"):
+        dt = dt.to_pydatetime()
+    return dt.isoformat()
+
+
+def legacy_combine(date_value, time_value, fallback=""):
+    date = pd.to_datetime(date_value, errors="coerce")
+    if pd.isna(date):
+        return fallback
+    if time_value is not None and not (isinstance(time_value, float) and math.isnan(time_value)):
+        time_val = pd.to_datetime(time_value, errors="coerce")
+        if not pd.isna(time_val):
+            date = datetime(date.year, date.month, date.day, time_val.hour, time_val.minute, time_val.second)
+    if hasattr(date, "to_pydatetime"):
+        date = date.to_pydatetime()
+    return date.isoformat()
+
+
+def legacy_tags(value):
+    text = legacy_text(value)
+    if not text:
+        return None
+    parts = [part.strip() for part in re.split(r"[;,/]+", text) if part.strip()]
+    return list(dict.fromkeys(parts)) or None
+
+
+def legacy_number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = legacy_text(value)
+    if not text:
+        return None
+    try:
+        return float(text.replace(" ", "").replace(",", ""))
+    except ValueError:
+        return None
+
+
+def legacy_duration(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = legacy_text(value)
+    if not text:
+        return None
+    if ":" in text:
+        parts = text.split(":")
+        try:
+            return int(parts[0]) * 60 + (int(parts[1]) if len(parts) > 1 else 0)
+        except ValueError:
+            return None
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def legacy_bool(value):
+    if value is None:
+        return False
+    return legacy_text(value).lower() in {"si", "sí", "yes", "true", "1", "x"}
+
+
+DATES = [
+    "2021-03-01",
+    "2021-03-01 10:20",
+    "2021-03-01T10:20:30.5",
+    "2021-02-30",
+    "2021-13-01",
+    "2021-02-29 10:00",
+    "",
+    "  ",
+    None,
+    "2021-03-01T10:00:00+02:00",
+    "2021-03-01 10:00:00Z",
+    "01/02/2021",
+    "no es fecha",
+    "44197",
+]
+SERIALS = [44197, 44197.5, np.nan, 0]
+TEXTS = ["  Caldera &amp; quemador ", "a\u00a0b", "", None, np.nan, 12, 3.5, "&lt;b&gt;"]
+IDS = [1.0, 2, "3.0", " 4 ", "A-5", "", None, np.nan, 6.5, "7.0x"]
+NUMBERS = ["1,234.50", " 12 ", "", "abc", None, np.nan, 3, 4.25, "-7"]
+DURATIONS = ["01:30", "45", "2:", "x:10", "", None, np.nan, 90, 12.7]
+BOOLS = ["Si", "sí", "no", "X", "", None, np.nan, 1, "TRUE"]
+TAGS = ["a, b; a / c", "", None, np.nan, ";,", "solo"]
+
+
+def cases(values):
+    # Same cells as a string column, an object column with other types and
+    # a one-value column, so every branch of the converter runs.
+    strings = [value for value in values if isinstance(value, str) or value is None]
+    return [pd.Series(values, dtype=object), pd.Series(strings, dtype=object), pd.Series(values[:1], dtype=object)]
+
+
+@pytest.mark.parametrize(
+    "convert, legacy, values",
+    [
+        (to_iso_series, legacy_iso, DATES),
+        (to_iso_series, legacy_iso, DATES + SERIALS),
+        (normalize_text_series, legacy_text, TEXTS),
+        (normalize_id_series, legacy_id, IDS),
+        (parse_number_series, legacy_number, NUMBERS),
+        (parse_duration_series, legacy_duration, DURATIONS),
+        (parse_bool_series, legacy_bool, BOOLS),
+        (split_tags_series, legacy_tags, TAGS),
+    ],
+)
+def test_series_match_legacy_cells(convert, legacy, values):
+    with warnings.catch_warnings():
+        # Excel serials read as nanoseconds since 1970, as they always did.
+        warnings.simplefilter("ignore", UserWarning)
+        for series in cases(values):
+            assert convert(series).tolist() == [legacy(value) for value in series]
+
+
+def test_iso_series_keeps_going_past_impossible_dates():
+    values = pd.Series(["2021-02-30", "2021-03-01", "2021-13-01", "2021-03-02 08:00"])
+    assert to_iso_series(values).tolist() == ["", "2021-03-01T00:00:00", "", "2021-03-02T08:00:00"]
+
+
+def test_iso_series_datetime_column():
+    values = pd.Series(pd.to_datetime(["2021-03-01 10:00:00.25", None]))
+    assert to_iso_series(values).tolist() == ["2021-03-01T10:00:00.250000", ""]
+
+
+def test_combine_date_time_matches_legacy():
+    dates = pd.Series(["2021-03-01", "2021-03-01", "2021-02-30", "", None, "2021-03-05"], dtype=object)
+    times = pd.Series(["10:30", None, "10:30", "10:30", np.nan, "25:99"], dtype=object)
+    expected = [legacy_combine(date, time) for date, time in zip(dates, times)]
+    assert combine_date_time_series(dates, times).tolist() == expected
+
+
+def test_blank_and_unreadable_dates_are_null():
+    # read_csv leaves NaN in empty cells; "" would not load into a date column.
+    values = pd.Series(["2021-12-20 10:00", np.nan, None, "", "ayer", "2021-02-30"], dtype=object)
+    assert date_part_series(values).tolist() == ["2021-12-20", None, None, None, None, None]
+
+
+def test_cached_tags_are_not_shared():
+    tags = split_tags("VIP, Hotel")
+    tags.append("Distribuidor")
+    assert split_tags("VIP, Hotel") == ["VIP", "Hotel"]
+    rows = split_tags_series(pd.Series(["VIP; Hotel", "VIP; Hotel", None], dtype=object)).tolist()
+    rows[0].append("Distribuidor")
+    assert rows[1:] == [["VIP", "Hotel"], None]
+
+
+def test_normalizer_stats_count_hits_and_misses():
+    before = normalizer_stats()
+    for _ in range(3):
+        split_tags("Calderas / Quemadores, memo")
+    # NaN is not cached, so it counts as neither.
+    split_tags(math.nan)
+    assert normalizer_stats() - before == {"normalizer_hits": 2, "normalizer_misses": 1}
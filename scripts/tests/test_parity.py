@@ -0,0 +1,129 @@
+import os
+import random
+import subprocess
+import sys
+import threading
+from datetime import datetime
+
+import pytest
+
+import bench_pipedrive_import as bench
+from pipedrive_import.supabase import compact
+
+pytest.importorskip("openpyxl")
+
+# The per-row iterrows script the package replaced.
+BASELINE = "630993c:scripts/pipedrive_to_supabase.py"
+FOREIGN_KEYS = {
+    "client_id": "crm_clients",
+    "contact_id": "crm_contacts",
+    "opportunity_id": "crm_opportunities",
+    "activity_id": "crm_activities",
+}
+# Cells the generated exports never have: ids read as floats, padded and
+# HTML text, blank required fields, datetimes and numbers typed by Excel.
+EDGE_ROWS = {
+    "organizations": [
+        {"ID": 900.0, "Nombre": "  Hotel  &amp; Spa Quito ", "Etiquetas": " VIP ,, Hotel ", "Latitud de Dirección": 0.0},
+        {"ID": 901, "Nombre": "   "},
+        {"ID": None, "Nombre": "Sin ID"},
+        {"ID": "902", "Nombre": "Fecha Excel", "Organización creada": datetime(2024, 2, 29, 23, 59, 59)},
+    ],
+    "people": [
+        {"ID": 900, "ID de la organización": 900.0, "Nombre": "<b>Ana</b> Pérez", "Teléfono - Trabajo": 22345678},
+        {"ID": 901, "Nombre": None, "Correo electrónico - Personal": "ana@gmail.com"},
+    ],
+    "deals": [
+        {"ID": 900, "ID de la persona de contacto": 900, "Título": "Caldera", "Valor": "1.234,56", "Probabilidad": "50%"},
+        {"ID": 901, "Título": "Sin valor", "Valor": "", "Fecha prevista de cierre": datetime(2024, 6, 30)},
+    ],
+    "activities": [
+        {"ID": 900, "ID del trato": 900, "Asunto": None, "Tipo": "Llamada", "Finalizada": "Verdadero", "Duración": "1:30"},
+        {"ID": 901, "Asunto": "Visita", "Fecha de vencimiento": datetime(2024, 4, 1), "Hora de vencimiento": "7:05"},
+        {"ID": 902, "Asunto": "Sin fecha", "Hora de vencimiento": "10:00", "Duración": 45},
+    ],
+    "notes": [
+        {"ID": 900, "ID del trato": 900, "Contenido": "<p>Linea&nbsp;1<br/>Linea 2</p>", "La nota está anclada al trato": "No"},
+        {"ID": 901, "Contenido": None, "La nota está anclada a la organización": True},
+    ],
+}
+
+
+def baseline_script():
+    try:
+        source = subprocess.run(
+            ["git", "show", BASELINE], cwd=bench.ROOT, capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("el script original no esta en la historia de git")
+    return source
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def loaded_rows(server):
+    # Foreign keys are uuids local to each server; compare them by external_id.
+    keys = {table: {row["id"]: key for key, row in rows.items()} for table, rows in server.tables.items()}
+    return {
+        table: {
+            key: {
+                column: keys[FOREIGN_KEYS[column]].get(value) if column in FOREIGN_KEYS and value else value
+                for column, value in row.items()
+            }
+            for key, row in rows.items()
+        }
+        for table, rows in server.rows.items()
+    }
+
+
+def as_loaded_now(row):
+    # The two deliberate changes: empty meta leaves are not sent, and a
+    # blank date is NULL rather than "".
+    row = dict(row)
+    if "meta" in row:
+        row["meta"] = compact(row["meta"])
+    for column in ("expected_close_date", "close_date"):
+        if row.get(column) == "":
+            row[column] = None
+    return row
+
+
+@pytest.fixture
+def exports(tmp_path):
+    # The script reads <root>/<entity>-*.xlsx, root being its parent's parent.
+    script = tmp_path / "scripts" / "pipedrive_to_supabase.py"
+    script.parent.mkdir()
+    script.write_text(baseline_script(), encoding="utf-8")
+    counts = {entity: max(1, int(200 * share)) for entity, share in bench.PROPORTIONS.items()}
+    for entity, header in bench.HEADERS.items():
+        rows = list(bench.generate_rows(entity, counts, random.Random(entity)))
+        rows += [[edge.get(column) for column in header] for edge in EDGE_ROWS[entity]]
+        bench.write_export(tmp_path / f"{entity}-test.xlsx", header, rows)
+    return script
+
+
+def test_rows_match_the_original_script(exports, tmp_path):
+    before = start(bench.FakePostgrest(record=True))
+    after = start(bench.FakePostgrest(record=True))
+    try:
+        env = dict(os.environ, SUPABASE_URL=before.url, SUPABASE_SERVICE_ROLE_KEY="test")
+        subprocess.run([sys.executable, str(exports)], env=env, capture_output=True, check=True)
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        assert bench.run_import(after, exports.parents[1], work_dir)["status"] == "ok"
+    finally:
+        for server in (before, after):
+            server.shutdown()
+            server.server_close()
+
+    expected = loaded_rows(before)
+    actual = loaded_rows(after)
+    assert set(expected) == {"crm_clients", "crm_contacts", "crm_opportunities", "crm_activities", "crm_notes"}
+    assert {"900", "902"} <= set(expected["crm_clients"])
+    for table, rows in expected.items():
+        assert set(actual[table]) == set(rows), table
+        for key, row in rows.items():
+            assert actual[table][key] == as_loaded_now(row), (table, key)
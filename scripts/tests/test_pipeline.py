@@ -0,0 +1,129 @@
+import random
+import threading
+
+import pytest
+
+import bench_pipedrive_import as bench
+from pipedrive_import import config, pipeline
+from pipedrive_import.pipeline import TABLES, activity_rows, note_rows
+from pipedrive_import.staging import StagingStore
+
+ID_MAPS = {table: {} for table in ("crm_clients", "crm_contacts", "crm_opportunities", "crm_activities")}
+NOTE = {"external_id": "5", "content": "<p>Caldera</p>", "search_text": "Caldera", "search_terms": "CALDERA"}
+
+
+def test_search_columns_are_left_out_by_default(monkeypatch, fresh_config):
+    monkeypatch.delenv("PIPEDRIVE_SEARCH", raising=False)
+    fresh_config.load(env_file=False)
+    assert "search_text" not in note_rows([NOTE], ID_MAPS, None)[0]
+    assert "search_terms" not in activity_rows([NOTE], ID_MAPS, None)[0]
+
+
+def test_search_columns_once_enabled(monkeypatch):
+    monkeypatch.setattr(config, "SEARCH", True)
+    row = note_rows([NOTE], ID_MAPS, None)[0]
+    assert (row["search_text"], row["search_terms"]) == ("Caldera", "CALDERA")
+    assert activity_rows([dict(NOTE, search_terms="")], ID_MAPS, None)[0]["search_terms"] is None
+
+
+@pytest.fixture
+def scheduler_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STATE_PATH", tmp_path / "state.json")
+    monkeypatch.setattr(config, "PARALLEL_TABLES", 2)
+    store = StagingStore(tmp_path / "staging.sqlite")
+    store.begin("test")
+    store.stage("organizations", [{"external_id": key, "name": f"Cliente {key}"} for key in ("1", "2")])
+    store.stage(
+        "people", [{"external_id": f"p{key}", "name": f"Ana {key}", "client_external_id": key} for key in ("1", "2")]
+    )
+    yield store
+    store.close()
+
+
+def schedule(store, monkeypatch, upload):
+    resolve = lambda table, keys, id_map: {}  # noqa: E731
+    monkeypatch.setattr(pipeline, "TRANSPORTS", {"rest": (upload, resolve, None, None)})
+    id_maps = {TABLES[entity][0]: {} for entity in TABLES}
+    thread_result = {}
+
+    def run():
+        try:
+            thread_result["summary"] = pipeline.LoadScheduler(store, ["organizations", "people"], {}, id_maps).run()
+        except Exception as exc:
+            thread_result["error"] = exc
+
+    # A scheduler that hangs fails the test instead of blocking the suite.
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    return thread_result
+
+
+def test_children_wait_for_the_parent_batch(scheduler_store, monkeypatch):
+    contacts = []
+    first_child = threading.Event()
+
+    def upload(table, rows, conflict, id_map=None, on_batch=None):
+        if table == "crm_contacts":
+            contacts.append({row["external_id"]: row["client_id"] for row in rows})
+            first_child.set()
+            return
+        for row in rows:
+            id_map[row["external_id"]] = f"id-{row['external_id']}"
+            on_batch([row])
+            # The second client is acknowledged only once its sibling's
+            # contact is on its way.
+            assert first_child.wait(5)
+
+    assert "error" not in schedule(scheduler_store, monkeypatch, upload)
+    assert contacts == [{"p1": "id-1"}, {"p2": "id-2"}]
+
+
+def test_dead_lettered_parent_releases_its_children(scheduler_store, monkeypatch):
+    contacts = {}
+
+    def upload(table, rows, conflict, id_map=None, on_batch=None):
+        for row in rows:
+            if table == "crm_contacts":
+                contacts[row["external_id"]] = row["client_id"]
+            elif row["external_id"] == "1":
+                id_map["1"] = "id-1"
+            else:
+                # Dead-lettered: no id and no acknowledgement.
+                continue
+            on_batch([row])
+
+    result = schedule(scheduler_store, monkeypatch, upload)
+    assert result["summary"]["people"]["new"] == 2
+    assert contacts == {"p1": "id-1", "p2": None}
+
+
+def test_worker_errors_reach_run(scheduler_store, monkeypatch):
+    def upload(table, rows, conflict, id_map=None, on_batch=None):
+        raise RuntimeError("conexion perdida")
+
+    assert str(schedule(scheduler_store, monkeypatch, upload)["error"]) == "conexion perdida"
+
+
+def test_process_pool_stages_the_same_rows(tmp_path):
+    counts = {entity: max(1, int(60 * share)) for entity, share in bench.PROPORTIONS.items()}
+    paths = {}
+    for entity, header in bench.HEADERS.items():
+        paths[entity] = tmp_path / f"{entity}-test.csv"
+        bench.write_export(paths[entity], header, bench.generate_rows(entity, counts, random.Random(entity)))
+    with paths["organizations"].open("a", encoding="utf-8") as handle:
+        handle.write("99,,,Quito\n")
+    staged = []
+    for workers in (1, 3):
+        store = StagingStore(tmp_path / f"staging-{workers}.sqlite")
+        store.begin("test")
+        pipeline.run_transforms(paths, store, use_cache=False, workers=workers)
+        # Entities finish in any order in the pool.
+        rejects = sorted(store.rejects(), key=lambda reject: (reject["entity"], reject["external_id"]))
+        staged.append(({entity: store.rows(entity) for entity in paths}, rejects))
+        store.close()
+    assert staged[0] == staged[1]
+    rows, rejects = staged[0]
+    assert all(rows.values())
+    assert [(reject["entity"], reject["external_id"]) for reject in rejects] == [("organizations", "99")]
@@ -0,0 +1,176 @@
+import json
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+import bench_pipedrive_import as bench
+from pipedrive_import import config, pipeline, postgres
+from pipedrive_import.supabase import DEAD_LETTERS
+
+psycopg = pytest.importorskip("psycopg")
+
+SQL_DIR = Path(__file__).resolve().parents[2] / "supabase"
+# The columns the importer writes, as the Supabase project defines them.
+SCHEMA = """
+create table crm_clients (
+  id uuid primary key default gen_random_uuid(), external_id text unique, name text not null, industry text,
+  city text, owner text, client_type text, relation text, potential text, tags text[], address text, state text,
+  country text, postal_code text, meta jsonb, created_at timestamptz, updated_at timestamptz
+);
+create table crm_contacts (
+  id uuid primary key default gen_random_uuid(), external_id text unique,
+  client_id uuid references crm_clients(id), name text not null, role text, phone text, email text, area text,
+  tags text[], meta jsonb, created_at timestamptz, updated_at timestamptz
+);
+create table crm_opportunities (
+  id uuid primary key default gen_random_uuid(), external_id text unique,
+  client_id uuid references crm_clients(id), contact_id uuid references crm_contacts(id), name text not null,
+  stage text, status text, value numeric, currency text, weighted_value numeric, probability numeric,
+  pipeline text, owner text, source text, source_channel text, lost_reason text, expected_close_date date,
+  close_date date, last_stage_change_at timestamptz, meta jsonb, created_at timestamptz, updated_at timestamptz
+);
+create table crm_activities (
+  id uuid primary key default gen_random_uuid(), external_id text unique,
+  client_id uuid references crm_clients(id), contact_id uuid references crm_contacts(id),
+  opportunity_id uuid references crm_opportunities(id), title text, type text, outcome text, notes text,
+  due_at timestamptz, completed_at timestamptz, duration_minutes integer, location text, priority text,
+  owner text, meta jsonb, created_at timestamptz, updated_at timestamptz
+);
+create table crm_notes (
+  id uuid primary key default gen_random_uuid(), external_id text unique,
+  client_id uuid references crm_clients(id), contact_id uuid references crm_contacts(id),
+  opportunity_id uuid references crm_opportunities(id), activity_id uuid references crm_activities(id),
+  title text, content text, owner text, is_pinned boolean, meta jsonb, created_at timestamptz,
+  updated_at timestamptz
+);
+"""
+
+
+@pytest.fixture(scope="module")
+def database_url(tmp_path_factory):
+    # PIPEDRIVE_TEST_DB_URL points at a throwaway database; without it a
+    # local server is started with pgserver when installed.
+    url = os.environ.get("PIPEDRIVE_TEST_DB_URL")
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture
+def database(database_url, tmp_path, monkeypatch):
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        conn.execute("drop schema if exists public cascade")
+        conn.execute("create schema public")
+        conn.execute(SCHEMA)
+        for name in ("crm_summaries.sql", "crm_deletions.sql"):
+            conn.execute((SQL_DIR / name).read_text(encoding="utf-8"))
+    monkeypatch.setattr(config, "DATABASE_URL", database_url)
+    monkeypatch.setattr(config, "DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    DEAD_LETTERS.clear()
+    postgres.close_connection()
+    yield psycopg.connect(database_url, autocommit=True)
+    postgres.close_connection()
+    DEAD_LETTERS.clear()
+
+
+def clients(*names):
+    return [
+        {
+            "external_id": str(number),
+            "name": name,
+            "tags": ["VIP", 'Hotel "5*"', "a,b", None],
+            "meta": {"note": 'linea 1\nlinea 2, "citada"', "lat": "", "phones": {"work": None}},
+            "created_at": "2024-01-02T08:00:00-05:00",
+        }
+        for number, name in enumerate(names, 1)
+    ]
+
+
+def test_copy_upserts_and_returns_ids(database):
+    id_map = {}
+    acknowledged = []
+    postgres.copy_rows("crm_clients", clients("Hotel Quito", 'Comercial "El Sol", S.A.'), "external_id", id_map, acknowledged.extend)
+    rows = database.execute("select external_id, id::text, name, tags, meta from crm_clients order by external_id").fetchall()
+    assert {key: row_id for key, row_id, *_ in rows} == id_map
+    assert [row[2] for row in rows] == ["Hotel Quito", 'Comercial "El Sol", S.A.']
+    assert rows[0][3] == ["VIP", 'Hotel "5*"', "a,b", None]
+    # compact() drops the empty leaves of meta, as the REST transport does.
+    assert rows[0][4] == {"note": 'linea 1\nlinea 2, "citada"'}
+    assert len(acknowledged) == 2
+
+    renamed = dict(clients("Hotel Quito Norte")[0], tags=None)
+    again = {}
+    postgres.copy_rows("crm_clients", [renamed], "external_id", again)
+    assert again["1"] == id_map["1"]
+    assert database.execute("select name, tags from crm_clients where external_id = '1'").fetchone() == (
+        "Hotel Quito Norte",
+        None,
+    )
+
+
+def test_summary_tables_load_without_ids(database):
+    rows = [{"key": '["Ventas"]', "pipeline": "Ventas", "deals": 3, "value": 1500.5, "weighted_value": 750}]
+    acknowledged = []
+    postgres.copy_rows("crm_pipeline_summary", rows, "key", None, acknowledged.extend)
+    assert acknowledged == rows
+    assert database.execute("select deals, value from crm_pipeline_summary").fetchone() == (3, 1500.5)
+    assert not config.DEAD_LETTER_PATH.exists()
+
+
+def test_failed_batch_goes_to_the_dead_letter_file(database):
+    acknowledged = []
+    postgres.copy_rows("crm_clients", clients("Hotel Quito", None), "external_id", {}, acknowledged.extend)
+    assert acknowledged == []
+    assert database.execute("select count(*) from crm_clients").fetchone()[0] == 0
+    entry = json.loads(config.DEAD_LETTER_PATH.read_text(encoding="utf-8"))
+    assert entry["table"] == "crm_clients"
+    assert "name" in entry["error"]
+    assert [row["external_id"] for row in entry["rows"]] == ["1", "2"]
+    assert DEAD_LETTERS["crm_clients"] == {"1", "2"}
+
+
+def test_ids_keys_and_deletions(database):
+    id_map = {}
+    postgres.copy_rows("crm_clients", clients("A", "B", "C"), "external_id", id_map)
+    found = postgres.resolve_ids("crm_clients", ["2", "3", "9"], {"3": id_map["3"]})
+    assert found == {"2": id_map["2"], "3": id_map["3"]}
+    postgres.mark_deleted("crm_clients", ["2"], "2024-05-01T00:00:00+00:00")
+    assert postgres.fetch_keys("crm_clients") == {"1": False, "2": True, "3": False}
+    postgres.mark_deleted("crm_clients", ["2"], None)
+    assert not any(postgres.fetch_keys("crm_clients").values())
+
+
+def test_full_import_over_copy(database, tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    counts = {entity: max(1, int(200 * share)) for entity, share in bench.PROPORTIONS.items()}
+    for entity, header in bench.HEADERS.items():
+        rows = bench.generate_rows(entity, counts, random.Random(f"0-{entity}"))
+        bench.write_export(data_dir / f"{entity}-test.csv", header, rows)
+    for name, value in (
+        ("CACHE_DIR", tmp_path / "cache"),
+        ("STATE_PATH", tmp_path / "state.json"),
+        ("STAGING_PATH", tmp_path / "staging.sqlite"),
+        ("REJECTS_PATH", tmp_path / "rejects.jsonl"),
+    ):
+        monkeypatch.setattr(config, name, value)
+
+    summary = pipeline.run(input_dir=data_dir, transport="copy", workers=1)
+    assert not config.DEAD_LETTER_PATH.exists()
+    for entity, (table, _) in pipeline.TABLES.items():
+        loaded = database.execute(f"select count(*) from {table}").fetchone()[0]
+        assert loaded == summary[entity]["new"] > 0
+    orphans = database.execute(
+        "select count(*) from crm_activities a join crm_opportunities o on o.id = a.opportunity_id"
+    ).fetchone()[0]
+    assert orphans > 0
+    assert database.execute("select count(*) from crm_pipeline_summary").fetchone()[0] > 0
+
+    summary = pipeline.run(input_dir=data_dir, transport="copy", workers=1)
+    assert all(counts["new"] == counts["changed"] == 0 for counts in summary.values())
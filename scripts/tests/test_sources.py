@@ -0,0 +1,84 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+import bench_pipedrive_import as bench
+from pipedrive_import import config, sources
+from pipedrive_import.entities import transform
+from pipedrive_import.pipeline import stream_entity
+from pipedrive_import.sources import iter_frames, load_frame, read_source
+
+COUNTS = {entity: max(1, int(25 * share)) for entity, share in bench.PROPORTIONS.items()}
+
+
+def export(tmp_path, entity, fmt):
+    path = tmp_path / f"{entity}-test.{fmt}"
+    bench.write_export(path, bench.HEADERS[entity], bench.generate_rows(entity, COUNTS, random.Random(entity)))
+    return path
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx"])
+def test_frames_cover_the_export_in_bounded_windows(tmp_path, fmt):
+    if fmt == "xlsx":
+        pytest.importorskip("openpyxl")
+    path = export(tmp_path, "activities", fmt)
+    frames = list(iter_frames(path, 10))
+    assert [len(frame) for frame in frames] == [10, 10, 5]
+    assert all(list(frame.columns) == bench.HEADERS["activities"] for frame in frames)
+    assert pd.concat(frames)["ID"].tolist() == list(range(1, 26))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx"])
+def test_streamed_windows_transform_like_the_whole_file(tmp_path, fmt):
+    if fmt == "xlsx":
+        pytest.importorskip("openpyxl")
+    path = export(tmp_path, "notes", fmt)
+    rows = [row for _, window, _ in stream_entity("notes", path, 4) for row in window]
+    assert rows == transform("notes", read_source(path))
+
+
+def test_stream_skips_the_windows_already_loaded(tmp_path):
+    path = export(tmp_path, "activities", "csv")
+    windows = {window: rows for window, rows, _ in stream_entity("activities", path, 10, done={1})}
+    assert sorted(windows) == [0, 2]
+    assert [row["external_id"] for row in windows[0]] == [str(key) for key in range(1, 11)]
+    assert [row["external_id"] for row in windows[2]] == [str(key) for key in range(21, 26)]
+
+
+def test_parsed_export_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path / "cache")
+    path = export(tmp_path, "deals", "csv")
+    first = load_frame(path)
+    assert [cached.suffix for cached in config.CACHE_DIR.iterdir()] == [".arrow"]
+
+    reads = []
+    monkeypatch.setattr(sources, "read_source", lambda path: reads.append(path) or read_source(path))
+    pd.testing.assert_frame_equal(load_frame(path), first)
+    assert reads == []
+
+    # Same size, later mtime: the export was written again.
+    stat = path.stat()
+    path.write_text(path.read_text(encoding="utf-8").replace("Ventas", "VENTAS"), encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    changed = load_frame(path)
+    assert reads == [path]
+    assert "VENTAS" in set(changed["Embudo"])
+    assert len(list(config.CACHE_DIR.iterdir())) == 1
+    pd.testing.assert_frame_equal(load_frame(path), changed)
+    assert reads == [path]
+
+
+def test_frames_arrow_cannot_hold_are_pickled(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "notes-test.csv"
+    path.write_text("ID,Contenido\n1,a\n", encoding="utf-8")
+    mixed = pd.DataFrame({"ID": [1, 2], "Contenido": pd.Series([1, "dos"], dtype=object)})
+    monkeypatch.setattr(sources, "read_source", lambda path: mixed)
+    load_frame(path)
+    assert [cached.suffix for cached in config.CACHE_DIR.iterdir()] == [".pkl"]
+    monkeypatch.setattr(sources, "read_source", None)
+    pd.testing.assert_frame_equal(load_frame(path), mixed)
@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import bench_pipedrive_import as bench
+from pipedrive_import import config, pipeline
+from pipedrive_import.staging import StagingStore
+from pipedrive_import.stats import STATS
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StagingStore(tmp_path / "staging.sqlite")
+    store.begin("test")
+    yield store
+    store.close()
+
+
+def organizations(*keys):
+    return [{"external_id": key, "name": f"Cliente {key}"} for key in keys]
+
+
+def test_present_keys_keep_rejected_rows_but_not_merged_duplicates(store):
+    store.set_merges({"organizations": {"3": "1"}, "people": {}})
+    store.stage("organizations", organizations("1", "2", "3"))
+    store.apply_merges("organizations")
+    store.reject("organizations", [{"external_id": "4", "dropped": "row", "reasons": ["name: vacio"], "row": {}}])
+    assert [row["external_id"] for row in store.rows("organizations")] == ["1", "2"]
+    assert store.present_keys("organizations") == {"1", "2", "4"}
+
+
+def test_full_run_forgets_only_the_ids_of_reloaded_tables(store):
+    store.save_ids("crm_clients", {"1": "id-1"})
+    store.save_ids("crm_contacts", {"7": "id-7"})
+    store.begin("test", full=True, tables=["crm_contacts"])
+    assert store.id_map("crm_clients") == {"1": "id-1"}
+    assert store.id_map("crm_contacts") == {}
+
+
+def fake_transport(monkeypatch, remote):
+    marked = []
+
+    def mark(table, keys, stamp):
+        marked.append((table, keys))
+        remote.update(dict.fromkeys(keys, stamp is not None))
+
+    monkeypatch.setattr(pipeline, "TRANSPORTS", {"rest": (None, None, lambda table: dict(remote), mark)})
+    return marked
+
+
+def test_reconcile_marks_only_rows_missing_from_the_export(store, monkeypatch):
+    store.stage("organizations", organizations(*"123456789"))
+    store.mark_complete("organizations")
+    remote = {key: False for key in "123456789"}
+    remote.update({"10": False, "11": True, "5": True})
+    marked = fake_transport(monkeypatch, remote)
+    gone, back = pipeline.reconcile(store, ["organizations"])["organizations"]
+    assert gone == ["10"]
+    assert back == ["5"]
+    assert marked == [("crm_clients", ["10"]), ("crm_clients", ["5"])]
+
+
+def test_merged_duplicates_are_retired_once_and_stay_deleted(store, monkeypatch):
+    merges = {"organizations": {"3": "1", "7": "1"}, "people": {}}
+    store.set_merges(merges)
+    store.stage("organizations", organizations(*"1234"))
+    store.apply_merges("organizations")
+    store.mark_complete("organizations")
+    # "7" was never loaded, "3" was loaded as a live row by an earlier run.
+    remote = {key: False for key in "1234"}
+    marked = fake_transport(monkeypatch, remote)
+    assert pipeline.retire_merged(merges, ["organizations", "people"]) == {"organizations": ["3"]}
+    assert marked == [("crm_clients", ["3"])]
+    assert pipeline.retire_merged(merges, ["organizations"]) == {"organizations": []}
+    gone, back = pipeline.reconcile(store, ["organizations"])["organizations"]
+    assert gone == back == []
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def importer(postgrest, tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    counts = {entity: max(1, int(100 * share)) for entity, share in bench.PROPORTIONS.items()}
+    for entity, header in bench.HEADERS.items():
+        bench.write_export(data_dir / f"{entity}-test.csv", header, bench.generate_rows(entity, counts, random.Random(entity)))
+    for name, value in (
+        ("SUPABASE_URL", postgrest.url),
+        ("SUPABASE_KEY", "test"),
+        ("CONCURRENCY", 1),
+        ("BATCH_SIZE", 10),
+        ("MAX_BATCH_SIZE", 10),
+        ("CACHE_DIR", tmp_path / "cache"),
+        ("STATE_PATH", tmp_path / "state.json"),
+        ("STAGING_PATH", tmp_path / "staging.sqlite"),
+        ("REJECTS_PATH", tmp_path / "rejects.jsonl"),
+        ("DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl"),
+    ):
+        monkeypatch.setattr(config, name, value)
+    upload = pipeline.TRANSPORTS["rest"][0]
+
+    def run(interrupt=None, after=0, **options):
+        # With interrupt, dies once more than `after` rows of that table
+        # are acknowledged.
+        acknowledged = []
+
+        def interrupted(table, rows, conflict, id_map=None, on_batch=None):
+            def checkpoint(batch):
+                on_batch(batch)
+                acknowledged.extend(batch)
+                if len(acknowledged) > after:
+                    raise Interrupted()
+
+            upload(table, rows, conflict, id_map, checkpoint if table == interrupt else on_batch)
+
+        if interrupt is None:
+            return pipeline.run(input_dir=data_dir, workers=1, **options)
+        with monkeypatch.context() as patch:
+            patch.setattr(pipeline, "TRANSPORTS", dict(pipeline.TRANSPORTS, rest=(interrupted, *pipeline.TRANSPORTS["rest"][1:])))
+            with pytest.raises(Interrupted):
+                pipeline.run(input_dir=data_dir, workers=1, **options)
+
+    return run
+
+
+def test_interrupted_run_resumes_at_the_next_batch(importer, postgrest, capsys):
+    importer(interrupt="crm_opportunities")
+    clients = postgrest.stats["crm_clients inserted"]
+    summary = importer()
+    assert "Reanudando" in capsys.readouterr().out
+    # Clients were committed before the interruption and the acknowledged
+    # opportunities are not sent again.
+    assert postgrest.stats["crm_clients inserted"] == clients
+    assert postgrest.stats["crm_clients updated"] == postgrest.stats["crm_opportunities updated"] == 0
+    assert postgrest.stats["crm_opportunities inserted"] == summary["deals"]["rows"]
+    assert importer()["deals"]["changed"] == 0
+
+
+def test_restart_discards_the_interrupted_run(importer, postgrest, capsys):
+    importer(interrupt="crm_opportunities")
+    acknowledged = postgrest.stats["crm_opportunities inserted"]
+    assert acknowledged > 0
+    summary = importer(resume=False)
+    assert "Reanudando" not in capsys.readouterr().out
+    assert postgrest.stats["crm_opportunities updated"] == acknowledged
+    assert postgrest.stats["crm_opportunities inserted"] == summary["deals"]["rows"]
+
+
+def test_streamed_run_resumes_at_the_next_window(importer, postgrest, monkeypatch):
+    monkeypatch.setattr(config, "STREAM_ROWS", 30)
+    # Window 0 and the first batch of window 1 are acknowledged.
+    importer(interrupt="crm_activities", after=30, stream=True)
+    assert postgrest.stats["crm_activities inserted"] == 40
+    importer(stream=True)
+    # Window 0 is read but not transformed again; window 1 is redone without
+    # resending its acknowledged batch.
+    assert STATS.stages["transform activities"]["rows"] == 70
+    assert postgrest.stats["crm_activities updated"] == 0
+    assert postgrest.stats["crm_activities inserted"] == 100
@@ -0,0 +1,57 @@
+import pytest
+
+from pipedrive_import import config
+from pipedrive_import.state import commit_state, load_state, row_hash, select_changed
+from pipedrive_import.supabase import DEAD_LETTERS, id_pairs
+
+
+@pytest.fixture(autouse=True)
+def state_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STATE_PATH", tmp_path / "state.json")
+    DEAD_LETTERS.clear()
+    yield
+    DEAD_LETTERS.clear()
+
+
+def rows(*changes):
+    base = [
+        {"external_id": "1", "client_id": "7f0c", "name": "Caldera", "updated_at": "2024-03-01T10:00:00"},
+        {"external_id": "2", "client_id": None, "name": "Quemador", "updated_at": "2024-03-02T10:00:00"},
+    ]
+    return [dict(row, **change) for row, change in zip(base, changes or [{}] * len(base))]
+
+
+def test_unchanged_rows_are_skipped_after_commit():
+    state = {}
+    changed, hashes, counts = select_changed("crm_opportunities", rows(), state)
+    assert counts == {"new": 2, "changed": 0, "unchanged": 0}
+    commit_state(state, "crm_opportunities", hashes)
+    state = load_state()
+
+    changed, _, counts = select_changed("crm_opportunities", rows({}, {"name": "Quemador 2"}), state)
+    assert counts == {"new": 0, "changed": 1, "unchanged": 1}
+    assert [row["external_id"] for row in changed] == ["2"]
+
+
+def test_full_sends_everything_but_counts_against_the_hashes():
+    state = {}
+    changed, hashes, _ = select_changed("crm_opportunities", rows(), state)
+    commit_state(state, "crm_opportunities", hashes)
+    changed, _, counts = select_changed("crm_opportunities", rows(), state, full=True)
+    assert len(changed) == 2
+    assert counts["unchanged"] == 2
+
+
+def test_dead_lettered_rows_are_sent_again():
+    state = {}
+    changed, hashes, _ = select_changed("crm_opportunities", rows(), state)
+    DEAD_LETTERS["crm_opportunities"].add("2")
+    commit_state(state, "crm_opportunities", hashes)
+    assert set(state["crm_opportunities"]["hashes"]) == {"1"}
+
+
+def test_fk_ids_hash_the_same_from_a_response_or_the_staging_store():
+    # An upsert response may carry numeric ids; staging reloads them as text.
+    returned = [{"id": 42, "external_id": 7}, {"id": "9b1d", "external_id": "8"}, {"id": 5, "external_id": None}]
+    assert dict(id_pairs(returned)) == {"7": "42", "8": "9b1d"}
+    assert row_hash(rows({"client_id": 42})[0]) != row_hash(rows({"client_id": "42"})[0])
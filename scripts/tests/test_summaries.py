@@ -0,0 +1,108 @@
+import pytest
+
+from pipedrive_import import pipeline
+from pipedrive_import.staging import StagingStore
+from pipedrive_import.summaries import SUMMARIES, facts, group_key
+
+PIPELINE = SUMMARIES["crm_pipeline_summary"]
+ACTIVITIES = SUMMARIES["crm_activity_summary"]
+
+
+def deal(key, **fields):
+    row = {
+        "external_id": key,
+        "pipeline": "Ventas",
+        "stage": "Propuesta",
+        "status": "Abierto",
+        "owner": "Ana",
+        "currency": "USD",
+        "value": 100.0,
+        "weighted_value": 50.0,
+        "expected_close_date": "2024-06-30",
+        "close_date": None,
+        "created_at": "2024-01-02T08:00:00",
+    }
+    return dict(row, **fields)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StagingStore(tmp_path / "staging.sqlite")
+    store.begin("test")
+    yield store
+    store.close()
+
+
+def load(store, entity, rows):
+    # Stages rows as a run would leave them once acknowledged.
+    store.begin("test")
+    store.stage(entity, rows)
+    store.mark_changed(entity, rows, {row["external_id"]: row["external_id"] for row in rows})
+    store.acknowledge(entity, "tbl", None, rows)
+
+
+def test_deals_count_in_their_closing_month():
+    rows = [deal("1"), deal("2", status="Ganado", close_date="2024-03-15"), deal("3", expected_close_date=None)]
+    keys = [key for _, key, _ in facts(PIPELINE, rows)]
+    assert keys == [
+        group_key(["Ventas", "Propuesta", "Abierto", "Ana", "USD", "2024-06"]),
+        group_key(["Ventas", "Propuesta", "Ganado", "Ana", "USD", "2024-03"]),
+        group_key(["Ventas", "Propuesta", "Abierto", "Ana", "USD", "2024-01"]),
+    ]
+    # Open deals are left out of the win/loss summary.
+    won_lost = [key for _, key, _ in facts(SUMMARIES["crm_win_loss_summary"], rows)]
+    assert won_lost[0] is None and won_lost[1] is not None
+
+
+def test_moved_rows_dirty_the_groups_they_leave_and_join(store):
+    first = [deal("1"), deal("2", value=250.5), deal("3", stage="Prospecto")]
+    dirty = store.update_facts("crm_pipeline_summary", facts(PIPELINE, first))
+    groups = store.summarize("crm_pipeline_summary", PIPELINE.measures, dirty)
+    proposal = group_key(["Ventas", "Propuesta", "Abierto", "Ana", "USD", "2024-06"])
+    prospect = group_key(["Ventas", "Prospecto", "Abierto", "Ana", "USD", "2024-06"])
+    assert groups[proposal] == {"deals": 2, "value": 350.5, "weighted_value": 100.0}
+
+    dirty = store.update_facts("crm_pipeline_summary", facts(PIPELINE, [deal("3")]))
+    assert dirty == {proposal, prospect}
+    groups = store.summarize("crm_pipeline_summary", PIPELINE.measures, dirty)
+    assert groups[proposal]["deals"] == 3
+    # The group it left has no rows now and sums to zero.
+    assert groups[prospect] == {"deals": 0, "value": 0, "weighted_value": 0}
+
+
+def test_overdue_activities_depend_on_now(store):
+    rows = [
+        {"external_id": "1", "owner": "Ana", "outcome": "pendiente", "due_at": "2024-04-01"},
+        {"external_id": "2", "owner": "Ana", "outcome": "pendiente", "due_at": "2024-04-02T15:30:00"},
+        {"external_id": "3", "owner": "Ana", "outcome": "completada", "due_at": "2024-03-01"},
+    ]
+    store.update_facts("crm_activity_summary", facts(ACTIVITIES, rows))
+    key = group_key(["Ana"])
+    at = lambda now: store.summarize("crm_activity_summary", ACTIVITIES.measures, now=now)[key]  # noqa: E731
+    assert at("2024-04-01T23:00:00")["overdue"] == 0
+    assert at("2024-04-02T15:00:00") == {"pending": 2, "overdue": 1, "completed": 1, "oldest_overdue_at": "2024-04-01"}
+    assert at("2024-04-03T00:00:00")["overdue"] == 2
+
+
+def test_refresh_uploads_only_the_groups_that_changed(store, monkeypatch):
+    uploads = {}
+
+    def upload(table, rows, conflict, id_map=None, on_batch=None):
+        uploads.setdefault(table, []).extend(rows)
+        on_batch(rows)
+
+    monkeypatch.setattr(pipeline, "TRANSPORTS", {"rest": (upload, None, None, None)})
+    load(store, "deals", [deal("1"), deal("2", owner="Luis"), deal("3", status="Perdido", close_date="2024-02-01")])
+    pipeline.refresh_summaries(store, ["deals"])
+    assert len(uploads["crm_pipeline_summary"]) == 3
+    assert len(uploads["crm_win_loss_summary"]) == 1
+
+    # The next run loads only deal 2, now owned by Ana: its old group drops
+    # to zero, Ana's group grows, the others are not sent.
+    uploads.clear()
+    load(store, "deals", [deal("2")])
+    pipeline.refresh_summaries(store, ["deals"])
+    sent = {(row["owner"], row["deals"]) for row in uploads["crm_pipeline_summary"]}
+    assert sent == {("Luis", 0), ("Ana", 2)}
+    assert "crm_win_loss_summary" not in uploads
+    assert all(row["computed_at"] for row in uploads["crm_pipeline_summary"])
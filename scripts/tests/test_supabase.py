@@ -0,0 +1,169 @@
+import json
+import time
+
+import pytest
+
+from pipedrive_import import config, supabase
+from pipedrive_import.stats import STATS
+
+ROWS = [{"external_id": str(number), "name": f"Cliente {number}" * 20} for number in range(1, 51)]
+
+
+@pytest.fixture
+def rest(postgrest, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "SUPABASE_URL", postgrest.url)
+    monkeypatch.setattr(config, "SUPABASE_KEY", "test")
+    monkeypatch.setattr(config, "MAX_RETRIES", 0)
+    monkeypatch.setattr(supabase, "_GZIP_ACCEPTED", True)
+    monkeypatch.setattr(config, "DEAD_LETTER_PATH", tmp_path / "dead_letter.jsonl")
+    supabase.close_pool()
+    supabase.DEAD_LETTERS.clear()
+    STATS.reset()
+    yield postgrest
+    supabase.close_pool()
+    supabase.DEAD_LETTERS.clear()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(time, "sleep", delays.append)
+    return delays
+
+
+def upsert():
+    return supabase.supabase_request(
+        "POST", "crm_clients", "?on_conflict=external_id", ROWS, prefer="resolution=merge-duplicates,return=representation"
+    )
+
+
+def test_gzip_is_off_by_default(rest, monkeypatch, fresh_config):
+    monkeypatch.delenv("PIPEDRIVE_GZIP", raising=False)
+    fresh_config.load(env_file=False)
+    assert fresh_config.GZIP is False
+
+
+def test_gzip_rejected_by_postgrest_falls_back_to_plain_json(rest, monkeypatch):
+    monkeypatch.setattr(config, "GZIP", True)
+    rest.accept_gzip = False
+    assert len(upsert()) == len(ROWS)
+    assert rest.stats["POST rejected"] == 1
+    assert STATS.counters["gzip_rejected"] == 1
+    assert supabase._GZIP_ACCEPTED is False
+    # Later requests go out uncompressed straight away.
+    upsert()
+    assert rest.stats["POST rejected"] == 1
+
+
+def test_gzip_accepted_by_proxy(rest, monkeypatch):
+    monkeypatch.setattr(config, "GZIP", True)
+    upsert()
+    assert rest.stats["POST"] == 1
+    assert STATS.counters["gzip_rejected"] == 0
+    assert STATS.counters["bytes_sent"] < STATS.counters["payload_bytes"]
+
+
+def test_only_parse_errors_count_as_gzip_rejected():
+    assert not supabase.gzip_rejected(400, b'{"code":"23502","message":"null value in column \\"name\\""}')
+    assert supabase.gzip_rejected(415, b"")
+
+
+def test_pool_reuses_keep_alive_connections(rest):
+    for _ in range(5):
+        upsert()
+    assert rest.stats["POST"] == 5
+    assert rest.stats["connections"] == 1
+
+
+def test_parallel_upserts_overlap(rest, monkeypatch):
+    for name, value in (("CONCURRENCY", 4), ("BATCH_SIZE", 10), ("MAX_BATCH_SIZE", 10)):
+        monkeypatch.setattr(config, name, value)
+    rest.latency = 0.1
+    id_map = {}
+    supabase.upsert_rows("crm_clients", ROWS, "external_id", id_map)
+    assert len(id_map) == len(ROWS)
+    assert rest.stats["POST"] == 5
+    assert rest.stats["peak in flight"] > 1
+    assert rest.stats["connections"] <= 4
+
+
+def test_retry_after_is_honoured(rest, sleeps, monkeypatch):
+    monkeypatch.setattr(config, "MAX_RETRIES", 3)
+    rest.failures.extend([(429, {"Retry-After": "7"}), (503, {"Retry-After": "0.5"})])
+    assert len(upsert()) == len(ROWS)
+    assert sleeps == [7.0, 0.5]
+    assert STATS.counters["retries"] == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503])
+def test_backoff_gives_up_after_max_retries(rest, sleeps, monkeypatch, status):
+    monkeypatch.setattr(config, "MAX_RETRIES", 2)
+    rest.failures.extend([(status, {})] * 4)
+    with pytest.raises(supabase.SupabaseError) as error:
+        upsert()
+    assert error.value.status == status
+    assert rest.stats[f"POST {status}"] == 3
+    # Exponential backoff with jitter: up to 0.5 s, then 0.5 to 1 s.
+    assert len(sleeps) == 2
+    assert 0 < sleeps[0] <= supabase.RETRY_BASE_DELAY <= sleeps[1] <= 2 * supabase.RETRY_BASE_DELAY
+    assert rest.stats["POST"] == 0
+
+
+def upload(monkeypatch, batch_size):
+    for name, value in (("CONCURRENCY", 1), ("BATCH_SIZE", batch_size), ("MAX_BATCH_SIZE", batch_size)):
+        monkeypatch.setattr(config, name, value)
+    id_map = {}
+    acknowledged = []
+    supabase.upsert_rows("crm_clients", ROWS, "external_id", id_map, acknowledged.extend)
+    return id_map, acknowledged
+
+
+def test_oversized_batches_are_bisected(rest, monkeypatch):
+    rest.max_rows = 20
+    id_map, acknowledged = upload(monkeypatch, 50)
+    assert len(id_map) == len(acknowledged) == len(ROWS)
+    # 50 -> 25 + 25 -> 12 + 13 + 12 + 13.
+    assert rest.stats["POST 413"] == 3
+    assert rest.stats["POST"] == 4
+    assert not config.DEAD_LETTER_PATH.exists()
+
+
+def test_gateway_timeout_splits_the_batch(rest, sleeps, monkeypatch):
+    monkeypatch.setattr(config, "MAX_RETRIES", 3)
+    rest.failures.append((504, {}))
+    id_map, _ = upload(monkeypatch, 50)
+    assert len(id_map) == len(ROWS)
+    assert rest.stats["POST 504"] == 1
+    assert rest.stats["POST"] == 2
+    assert STATS.counters["batch_splits"] == 1
+    # A large batch is split, not retried.
+    assert sleeps == []
+
+
+def test_batch_sizer_shrinks_and_grows():
+    sizer = supabase.BatchSizer(400, minimum=10, maximum=1000, target=2.0)
+    sizer.observe(400, 0.5)
+    assert sizer.size == 501
+    sizer.observe(100, 0.1)
+    assert sizer.size == 501
+    sizer.observe(501, 3.0)
+    assert sizer.size == 250
+    sizer.shrink(250)
+    assert (sizer.size, sizer.maximum) == (125, 249)
+    for _ in range(10):
+        sizer.observe(sizer.size, 0.1)
+    assert sizer.size == 249
+    sizer.shrink(12)
+    assert (sizer.size, sizer.maximum) == (10, 11)
+
+
+def test_failed_rows_go_to_the_dead_letter_file(rest, monkeypatch):
+    rest.failures.append((400, {}))
+    id_map, acknowledged = upload(monkeypatch, 25)
+    assert len(id_map) == len(acknowledged) == 25
+    entry = json.loads(config.DEAD_LETTER_PATH.read_text(encoding="utf-8"))
+    assert entry["table"] == "crm_clients"
+    assert "400" in entry["error"] and "respuesta simulada" in entry["error"]
+    assert entry["rows"] == ROWS[:25]
+    assert supabase.DEAD_LETTERS["crm_clients"] == {row["external_id"] for row in ROWS[:25]}
+    assert STATS.counters["dead_letter_rows"] == 25
@@ -0,0 +1,79 @@
+import pandas as pd
+
+from pipedrive_import.entities import transform
+
+DEAL = {
+    "ID": "10",
+    "Titulo": "Caldera 500 BHP",
+    "Valor": "1200.50",
+    "Probabilidad": "50",
+    "Valor ponderado": "600.25",
+    "Fecha prevista de cierre": "2024-05-01",
+    "Ultimo cambio de la etapa": "2024-04-01 10:00:00",
+    "Monto del producto": "300",
+    "Trato creado": "2024-01-02 08:00:00",
+}
+
+
+def deals(*changes):
+    return pd.DataFrame([dict(DEAL, **change) for change in changes], dtype=object)
+
+
+def test_valid_row_has_no_rejects():
+    rejects = []
+    rows = transform("deals", deals({}), rejects=rejects)
+    assert [row["external_id"] for row in rows] == ["10"]
+    assert rows[0]["probability"] == 50
+    assert rows[0]["expected_close_date"] == "2024-05-01"
+    assert rejects == []
+
+
+def test_optional_fields_lose_the_value_not_the_row():
+    rejects = []
+    df = deals(
+        {"Probabilidad": "150", "Valor ponderado": "-5", "Monto del producto": "-1"},
+        {"ID": "11", "Fecha prevista de cierre": "1890-01-01", "Ultimo cambio de la etapa": "ayer"},
+        {"ID": "12", "Trato creado": "2021-02-30 08:00:00"},
+    )
+    rows = transform("deals", df, rejects=rejects)
+    assert [row["external_id"] for row in rows] == ["10", "11", "12"]
+    first, second, third = rows
+    assert first["probability"] is None and first["weighted_value"] is None
+    assert first["meta"]["product_amount"] is None
+    assert first["value"] == 1200.5
+    assert second["expected_close_date"] is None and second["last_stage_change_at"] is None
+    assert third["created_at"] is None
+    assert {entry["external_id"]: entry["dropped"] for entry in rejects} == {"10": "value", "11": "value", "12": "value"}
+    reasons = {entry["external_id"]: entry["reasons"] for entry in rejects}
+    assert "probability: fuera de rango (150.0)" in reasons["10"]
+    assert any(reason.startswith("last_stage_change_at: no se pudo leer") for reason in reasons["11"])
+
+
+def test_coordinates_out_of_range_are_blanked():
+    rejects = []
+    df = pd.DataFrame(
+        [{"ID": "1", "Nombre": "Hotel Quito", "Latitud de Direccion": "95", "Longitud de Direccion": "-78.5"}],
+        dtype=object,
+    )
+    rows = transform("organizations", df, rejects=rejects)
+    assert rows[0]["meta"]["lat"] == "" and rows[0]["meta"]["lng"] == "-78.5"
+    assert rejects[0]["dropped"] == "value"
+
+
+def test_missing_required_field_drops_the_row():
+    rejects = []
+    rows = transform("deals", deals({"Titulo": ""}), rejects=rejects)
+    assert rows == []
+    assert rejects[0]["dropped"] == "row"
+    assert rejects[0]["reasons"] == ["name: vacio"]
+
+
+def test_invalid_contact_data_keeps_the_person():
+    rejects = []
+    df = pd.DataFrame(
+        [{"ID": "7", "Nombre": "Ana Perez", "Correo electronico - Trabajo": "ana@", "Telefono - Movil": "0991234567"}],
+        dtype=object,
+    )
+    rows = transform("people", df, rejects=rejects)
+    assert rows[0]["email"] == "" and rows[0]["phone"] == "0991234567"
+    assert [entry["dropped"] for entry in rejects] == ["value"]
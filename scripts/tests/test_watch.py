@@ -0,0 +1,103 @@
+import json
+import os
+import signal
+import socket
+import time
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from pipedrive_import import config, watch
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(path):
+    with urlopen(f"http://127.0.0.1:{config.STATUS_PORT}{path}", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def touch(path, text):
+    # A later mtime even on file systems with coarse timestamps.
+    mtime = path.stat().st_mtime_ns if path.exists() else time.time_ns()
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STATUS_PORT", free_port())
+    monkeypatch.setattr(signal, "signal", lambda *args: None)
+    monkeypatch.setattr(watch, "write_report", lambda args, started, status, summary: {"status": status})
+    monkeypatch.setattr(watch, "print_report", lambda report, dry_run: None)
+    touch(tmp_path / "organizations-1.csv", "ID,Nombre\n1,Hotel\n")
+    touch(tmp_path / "people-1.csv", "ID,Nombre\n1,Ana\n")
+    return tmp_path
+
+
+def test_watch_imports_each_stable_change_once(exports, monkeypatch):
+    runs = []
+    failures = []
+    statuses = []
+
+    def run(only, **options):
+        statuses.append(get("/status"))
+        runs.append(sorted(only))
+        if failures:
+            raise RuntimeError(failures.pop())
+        return {entity: {"rows": 1} for entity in only}
+
+    # Each sleep is one poll interval; the script below changes the exports
+    # between polls and stops the watcher at the end.
+    script = iter(
+        [
+            lambda: None,  # settle
+            lambda: touch(exports / "people-1.csv", "ID,Nombre\n1,Ana\n2,Luis\n"),
+            lambda: None,  # people looks the same twice: imported
+            lambda: failures.append("conexion perdida") or touch(exports / "organizations-1.csv", "ID,Nombre\n2,Spa\n"),
+            lambda: None,  # organizations fails
+            lambda: statuses.append(get("/status")),  # and is retried
+            lambda: statuses.append(get("/status")),
+        ]
+    )
+
+    def sleep(seconds):
+        step = next(script, None)
+        if step is None:
+            raise KeyboardInterrupt
+        step()
+
+    monkeypatch.setattr(watch, "run", run)
+    monkeypatch.setattr(time, "sleep", sleep)
+    watch.watch(SimpleNamespace(only=None, dry_run=False), {"input_dir": exports})
+
+    assert runs == [["organizations", "people"], ["people"], ["organizations"], ["organizations"]]
+    assert statuses[0]["state"] == "running"
+    assert statuses[0]["running"] == ["organizations", "people"]
+    after_failure, last = statuses[3], statuses[-1]
+    assert after_failure["last_error"] == "conexion perdida"
+    assert (last["runs"], last["errors"], last["state"], last["last_error"]) == (4, 1, "idle", None)
+    assert last["last_run"] == {"status": "ok"}
+    assert last["files"] == {
+        "organizations": str(exports / "organizations-1.csv"),
+        "people": str(exports / "people-1.csv"),
+    }
+
+
+def test_status_endpoint_serves_only_the_status(exports):
+    status = watch.WatchStatus(exports, ["notes"])
+    server = watch.serve_status(status, config.STATUS_PORT)
+    try:
+        assert get("/status?pretty")["entities"] == ["notes"]
+        with pytest.raises(HTTPError) as error:
+            get("/otro")
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
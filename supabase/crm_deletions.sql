@@ -0,0 +1,19 @@
+-- Marca de eliminado para las tablas que carga el importador de Pipedrive
+-- (scripts/pipedrive_import). Con --reconcile (o PIPEDRIVE_RECONCILE=1) las filas
+-- que ya no estan en la exportacion reciben deleted_at y las que vuelven lo pierden.
+-- Ejecutar una vez en Supabase (SQL editor) antes de usar --reconcile.
+-- Los resumenes crm_*_summary ya excluyen las filas eliminadas.
+
+alter table crm_clients add column if not exists deleted_at timestamptz;
+alter table crm_contacts add column if not exists deleted_at timestamptz;
+alter table crm_opportunities add column if not exists deleted_at timestamptz;
+alter table crm_activities add column if not exists deleted_at timestamptz;
+alter table crm_notes add column if not exists deleted_at timestamptz;
+
+-- Las rutas de src/app/api/crm todavia no filtran deleted_at: la app sigue mostrando las
+-- filas marcadas hasta que sus consultas agreguen "deleted_at is null". Los indices
+-- parciales cubren ese filtro.
+create index if not exists crm_contacts_alive_idx on crm_contacts (client_id) where deleted_at is null;
+create index if not exists crm_opportunities_alive_idx on crm_opportunities (client_id) where deleted_at is null;
+create index if not exists crm_activities_alive_idx on crm_activities (opportunity_id) where deleted_at is null;
+create index if not exists crm_notes_alive_idx on crm_notes (opportunity_id) where deleted_at is null;
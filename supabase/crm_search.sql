@@ -0,0 +1,23 @@
+-- Busqueda en notas y actividades con los datos que prepara el importador de Pipedrive
+-- (scripts/pipedrive_import): search_text es el texto plano (sin HTML) del contenido o la
+-- nota y search_terms las palabras del titulo y el texto sin acentos ni signos, en mayusculas.
+-- search_vector se calcula en Postgres solo para las filas que se escriben.
+-- Ejecutar una vez en Supabase (SQL editor) y despues importar con PIPEDRIVE_SEARCH=1: esa
+-- importacion completa las columnas. Sin esta migracion el importador debe quedar con
+-- PIPEDRIVE_SEARCH=0 (por defecto), o Supabase rechaza las notas y actividades.
+--
+-- Consulta: normalizar la busqueda igual (mayusculas, sin acentos) y usar el indice:
+--   select id from crm_notes where search_vector @@ to_tsquery('simple', 'CALDERA & QUEM:*');
+
+alter table crm_notes add column if not exists search_text text;
+alter table crm_notes add column if not exists search_terms text;
+alter table crm_notes add column if not exists search_vector tsvector
+  generated always as (to_tsvector('simple', coalesce(search_terms, ''))) stored;
+
+alter table crm_activities add column if not exists search_text text;
+alter table crm_activities add column if not exists search_terms text;
+alter table crm_activities add column if not exists search_vector tsvector
+  generated always as (to_tsvector('simple', coalesce(search_terms, ''))) stored;
+
+create index if not exists crm_notes_search_idx on crm_notes using gin (search_vector);
+create index if not exists crm_activities_search_idx on crm_activities using gin (search_vector);
@@ -0,0 +1,46 @@
+-- Resumenes del CRM que precalcula el importador de Pipedrive (scripts/pipedrive_import)
+-- despues de cada carga. Cada fila es un grupo; key es la lista de dimensiones en JSON.
+-- Ejecutar una vez en Supabase (SQL editor). Sin estas tablas usar PIPEDRIVE_SUMMARIES=0.
+
+-- Valor del embudo por etapa, estado, propietario, moneda y mes
+-- (mes de cierre previsto si esta abierta, mes de cierre si esta ganada o perdida)
+create table if not exists crm_pipeline_summary (
+  key text primary key,
+  pipeline text,
+  stage text,
+  status text,
+  owner text,
+  currency text,
+  month text,
+  deals integer not null default 0,
+  value numeric not null default 0,
+  weighted_value numeric not null default 0,
+  computed_at timestamptz
+);
+
+-- Oportunidades ganadas y perdidas por propietario y mes de cierre
+create table if not exists crm_win_loss_summary (
+  key text primary key,
+  owner text,
+  month text,
+  outcome text check (outcome in ('won', 'lost')),
+  lost_reason text,
+  currency text,
+  deals integer not null default 0,
+  value numeric not null default 0,
+  computed_at timestamptz
+);
+
+-- Actividades pendientes, vencidas y completadas por propietario
+create table if not exists crm_activity_summary (
+  key text primary key,
+  owner text,
+  pending integer not null default 0,
+  overdue integer not null default 0,
+  completed integer not null default 0,
+  oldest_overdue_at timestamp,
+  computed_at timestamptz
+);
+
+create index if not exists crm_pipeline_summary_owner_month_idx on crm_pipeline_summary (owner, month);
+create index if not exists crm_win_loss_summary_owner_month_idx on crm_win_loss_summary (owner, month);